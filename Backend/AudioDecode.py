@@ -0,0 +1,216 @@
+import io
+import math
+import struct
+import subprocess
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+class AudioDecodeError(ValueError):
+    """Raised when audio bytes cannot be decoded by any in-memory path."""
+
+
+_WAVE_FORMAT_PCM = 1
+_WAVE_FORMAT_FLOAT = 3
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def is_wav(data: bytes) -> bool:
+    return len(data) >= 12 and data[:4] == b"RIFF" and data[8:12] == b"WAVE"
+
+
+def decode_wav(data: bytes) -> Tuple[np.ndarray, int]:
+    """
+    Parse a RIFF/WAVE buffer without copying the sample data: the samples are
+    a np.frombuffer view on `data` (8/16/24/32-bit PCM, 32/64-bit float).
+    Returns (samples, sample_rate) with samples shaped (frames, channels).
+    """
+    view = memoryview(data)
+    offset = 12
+    fmt = None
+    while offset + 8 <= len(data):
+        chunk_id, size = struct.unpack_from("<4sI", data, offset)
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            tag, channels, sample_rate, _, _, bits = struct.unpack_from("<HHIIHH", data, body)
+            if tag == _WAVE_FORMAT_EXTENSIBLE and size >= 26:
+                tag = struct.unpack_from("<H", data, body + 24)[0]
+            fmt = (tag, channels, sample_rate, bits)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise AudioDecodeError("WAV data chunk before fmt chunk")
+            # streaming writers leave the size as 0 / 0xFFFFFFFF: read to the end
+            end = len(data) if size in (0, 0xFFFFFFFF) else min(body + size, len(data))
+            return _wav_samples(view[body:end], *fmt), fmt[2]
+        offset = body + size + (size & 1)
+    raise AudioDecodeError("WAV file has no data chunk")
+
+
+def _wav_samples(payload: memoryview, tag: int, channels: int, sample_rate: int, bits: int) -> np.ndarray:
+    width = bits // 8
+    usable = len(payload) - len(payload) % (width * channels)
+    payload = payload[:usable]
+    if tag == _WAVE_FORMAT_FLOAT and bits in (32, 64):
+        samples = np.frombuffer(payload, dtype="<f4" if bits == 32 else "<f8")
+    elif tag == _WAVE_FORMAT_PCM and bits == 16:
+        samples = np.frombuffer(payload, dtype="<i2")
+    elif tag == _WAVE_FORMAT_PCM and bits == 32:
+        samples = np.frombuffer(payload, dtype="<i4")
+    elif tag == _WAVE_FORMAT_PCM and bits == 8:
+        samples = np.frombuffer(payload, dtype=np.uint8)
+    elif tag == _WAVE_FORMAT_PCM and bits == 24:
+        raw = np.frombuffer(payload, dtype=np.uint8).reshape(-1, 3)
+        # placed in the top 24 bits of an int32, so it scales like 32-bit PCM
+        samples = ((raw[:, 0].astype(np.int32) << 8) | (raw[:, 1].astype(np.int32) << 16)
+                   | (raw[:, 2].astype(np.int8).astype(np.int32) << 24))
+    else:
+        raise AudioDecodeError(f"Unsupported WAV encoding (format {tag}, {bits} bits)")
+    return samples.reshape(-1, channels)
+
+
+def to_mono_float32(samples: np.ndarray) -> np.ndarray:
+    """Scale integer PCM to [-1, 1] float32 and average channels."""
+    if samples.dtype == np.uint8:
+        audio = (samples.astype(np.float32) - 128.0) / 128.0
+    elif samples.dtype.kind == "i":
+        scale = float(2 ** (8 * samples.dtype.itemsize - 1))
+        audio = samples.astype(np.float32) / scale
+    else:
+        audio = samples.astype(np.float32, copy=False)
+    if audio.ndim > 1:
+        audio = audio[:, 0] if audio.shape[1] == 1 else audio.mean(axis=1)
+    return np.ascontiguousarray(audio, dtype=np.float32)
+
+
+def decode_pcm16(data: bytes, channels: int = 1) -> np.ndarray:
+    """Raw 16-bit little-endian PCM -> mono float32."""
+    usable = len(data) - len(data) % (2 * channels)
+    return to_mono_float32(np.frombuffer(data, dtype="<i2", count=usable // 2).reshape(-1, channels))
+
+
+def decode_ffmpeg(data: bytes, target_sr: int = 16000, timeout: float = 60.0) -> np.ndarray:
+    """
+    Decode any container ffmpeg understands (webm/opus from browsers, mp3,
+    m4a, ...) through stdin/stdout pipes: no temporary files.
+    """
+    try:
+        result = subprocess.run(
+            ["ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+             "-f", "s16le", "-ac", "1", "-ar", str(target_sr), "pipe:1"],
+            input=data, capture_output=True, timeout=timeout, check=True)
+    except FileNotFoundError as e:
+        raise AudioDecodeError("ffmpeg is not installed") from e
+    except subprocess.CalledProcessError as e:
+        raise AudioDecodeError(f"ffmpeg could not decode audio: {e.stderr.decode(errors='replace').strip()}") from e
+    return decode_pcm16(result.stdout)
+
+
+def decode_audio(data: bytes, target_sr: int = 16000) -> np.ndarray:
+    """
+    Decode audio bytes to mono float32 at target_sr, entirely in memory.
+
+    WAV takes the zero-copy fast path; FLAC/OGG go through soundfile on a
+    BytesIO; anything else (e.g. webm/opus) is piped through ffmpeg.
+
+    Raises:
+        AudioDecodeError: If no decoder accepts the data
+    """
+    if is_wav(data):
+        samples, sr = decode_wav(data)
+        return resample(to_mono_float32(samples), sr, target_sr)
+    try:
+        import soundfile as sf
+        samples, sr = sf.read(io.BytesIO(data), dtype="float32", always_2d=True)
+        return resample(to_mono_float32(samples), sr, target_sr)
+    except Exception:
+        pass
+    return decode_ffmpeg(data, target_sr)
+
+
+class PolyphaseResampler:
+    """
+    Rational-ratio resampler (up / down) with a Kaiser-windowed sinc filter,
+    evaluated in polyphase form: each output sample is a `taps`-long dot
+    product with one filter phase, so no zero-stuffed signal is built.
+
+    Filter banks are shared per rate pair and the gather buffers are reused
+    between calls, so repeated calls at the same rates do not allocate
+    beyond the output array.
+    """
+
+    _instances: Dict[Tuple[int, int], "PolyphaseResampler"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, orig_sr: int, target_sr: int, zero_crossings: int = 16,
+                 rolloff: float = 0.945, beta: float = 8.6, block: int = 4096):
+        g = math.gcd(orig_sr, target_sr)
+        self.orig_sr = orig_sr
+        self.target_sr = target_sr
+        self.up = target_sr // g
+        self.down = orig_sr // g
+        self.block = block
+        max_rate = max(self.up, self.down)
+        length = 2 * zero_crossings * max_rate + 1
+        center = (length - 1) / 2
+        cutoff = rolloff / (2 * max_rate)
+        n = np.arange(length) - center
+        h = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(length, beta) * self.up
+        self.taps = math.ceil(length / self.up)
+        padded = np.zeros(self.taps * self.up)
+        padded[:length] = h
+        # bank[p, k] = h[p + k * up]
+        self.bank = np.ascontiguousarray(padded.reshape(self.taps, self.up).T, dtype=np.float32)
+        self.center = int(center)
+        self._lock = threading.Lock()
+        self._gather = np.empty((block, self.taps), dtype=np.float32)
+        self._index = np.empty((block, self.taps), dtype=np.int64)
+        self._offsets = np.arange(self.taps, dtype=np.int64)
+        self._padded = np.empty(0, dtype=np.float32)
+
+    @classmethod
+    def shared(cls, orig_sr: int, target_sr: int) -> "PolyphaseResampler":
+        key = (orig_sr, target_sr)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(orig_sr, target_sr)
+            return cls._instances[key]
+
+    def output_length(self, n_input: int) -> int:
+        return -(-n_input * self.up // self.down)
+
+    def __call__(self, audio: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        audio = np.asarray(audio, dtype=np.float32).reshape(-1)
+        n_out = self.output_length(len(audio))
+        if out is None:
+            out = np.empty(n_out, dtype=np.float32)
+        pad = self.taps
+        with self._lock:
+            needed = len(audio) + 2 * pad
+            if len(self._padded) < needed:
+                self._padded = np.empty(max(needed, 2 * len(self._padded)), dtype=np.float32)
+            padded = self._padded[:needed]
+            padded[:pad] = 0.0
+            padded[pad:pad + len(audio)] = audio
+            padded[pad + len(audio):] = 0.0
+            for start in range(0, n_out, self.block):
+                stop = min(start + self.block, n_out)
+                count = stop - start
+                t = np.arange(start, stop, dtype=np.int64) * self.down + self.center
+                phase = t % self.up
+                index = self._index[:count]
+                np.subtract((t // self.up + pad)[:, None], self._offsets[None, :], out=index)
+                np.clip(index, 0, needed - 1, out=index)
+                gather = self._gather[:count]
+                np.take(padded, index, out=gather)
+                gather *= self.bank[phase]
+                gather.sum(axis=1, out=out[start:stop])
+        return out
+
+
+def resample(audio: np.ndarray, orig_sr: int, target_sr: int) -> np.ndarray:
+    """Resample mono float32 audio with the shared polyphase filter for this rate pair."""
+    if orig_sr == target_sr:
+        return np.asarray(audio, dtype=np.float32)
+    return PolyphaseResampler.shared(orig_sr, target_sr)(audio)
@@ -0,0 +1,154 @@
+import json
+import math
+import os
+import re
+from array import array
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have he her his i if in into is it its
+me my no not of on or our she so than that the their them then there these they
+this to was we were what when where which who will with you your
+""".split())
+
+# tf values are stored as uint16; a single chunk never gets close to this
+_MAX_TF = 65535
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case unicode word tokens with stopwords and 1-char tokens removed."""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Incremental Okapi BM25 inverted index over every chunk of a corpus.
+
+    Document ids are assigned sequentially by `add`, so they line up with the
+    positions of the same chunks in the FAISS index. Postings are kept per term
+    as compact `array('I')` doc ids and `array('H')` term frequencies.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab: dict[str, int] = {}
+        self.postings_docs: list[array] = []
+        self.postings_tfs: list[array] = []
+        self.doc_lengths = array("I")
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, texts: Iterable[str]) -> List[int]:
+        """Index texts and return their assigned document ids."""
+        ids = []
+        for text in texts:
+            doc_id = len(self.doc_lengths)
+            tokens = tokenize(text)
+            counts: dict[str, int] = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for term, tf in counts.items():
+                term_id = self.vocab.get(term)
+                if term_id is None:
+                    term_id = len(self.vocab)
+                    self.vocab[term] = term_id
+                    self.postings_docs.append(array("I"))
+                    self.postings_tfs.append(array("H"))
+                self.postings_docs[term_id].append(doc_id)
+                self.postings_tfs[term_id].append(min(tf, _MAX_TF))
+            self.doc_lengths.append(len(tokens))
+            self.total_length += len(tokens)
+            ids.append(doc_id)
+        return ids
+
+    def search(self, query: str, k: int = 20) -> List[Tuple[int, float]]:
+        """Return up to k (doc_id, score) pairs with a positive BM25 score, best first."""
+        n_docs = len(self.doc_lengths)
+        if n_docs == 0:
+            return []
+        term_ids = {self.vocab[t] for t in tokenize(query) if t in self.vocab}
+        if not term_ids:
+            return []
+
+        doc_lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32)
+        avgdl = max(self.total_length / n_docs, 1e-9)
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for term_id in term_ids:
+            docs = np.frombuffer(self.postings_docs[term_id], dtype=np.uint32)
+            tfs = np.frombuffer(self.postings_tfs[term_id], dtype=np.uint16).astype(np.float32)
+            df = len(docs)
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * doc_lengths[docs] / avgdl)
+            scores[docs] += idf * tfs * (self.k1 + 1.0) / (tfs + norm)
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > k:
+            top = np.argpartition(scores[candidates], -k)[-k:]
+            candidates = candidates[top]
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(i), float(scores[i])) for i in order]
+
+    def save(self, path: str) -> None:
+        """Persist as JSON metadata plus flat binary postings (no pickle)."""
+        os.makedirs(path, exist_ok=True)
+        offsets = array("Q", [0])
+        with open(os.path.join(path, "postings_docs.bin"), "wb") as fd, \
+                open(os.path.join(path, "postings_tfs.bin"), "wb") as ft:
+            for docs, tfs in zip(self.postings_docs, self.postings_tfs):
+                docs.tofile(fd)
+                tfs.tofile(ft)
+                offsets.append(offsets[-1] + len(docs))
+        with open(os.path.join(path, "offsets.bin"), "wb") as f:
+            offsets.tofile(f)
+        with open(os.path.join(path, "doc_lengths.bin"), "wb") as f:
+            self.doc_lengths.tofile(f)
+        terms = sorted(self.vocab, key=self.vocab.get)
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "b": self.b, "total_length": self.total_length,
+                       "terms": terms}, f)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        index = cls(k1=meta["k1"], b=meta["b"])
+        index.total_length = meta["total_length"]
+        index.vocab = {term: i for i, term in enumerate(meta["terms"])}
+
+        def read(name: str, typecode: str) -> array:
+            data = array(typecode)
+            with open(os.path.join(path, name), "rb") as f:
+                data.frombytes(f.read())
+            return data
+
+        offsets = read("offsets.bin", "Q")
+        docs = read("postings_docs.bin", "I")
+        tfs = read("postings_tfs.bin", "H")
+        index.doc_lengths = read("doc_lengths.bin", "I")
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            index.postings_docs.append(docs[start:end])
+            index.postings_tfs.append(tfs[start:end])
+        return index
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[int]], k: int = 60) -> List[int]:
+    """Merge ranked id lists with RRF: score(d) = sum over lists of 1 / (k + rank)."""
+    scores: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+if __name__ == "__main__":
+    index = BM25Index()
+    index.add(["my name is hashir", "the quick brown fox", "hashir likes foxes"])
+    print(index.search("who is hashir?"))
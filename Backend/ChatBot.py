@@ -1,6 +1,7 @@
 import os
 from dotenv import load_dotenv
 import asyncio
+import time
 
 load_dotenv()
 
@@ -13,58 +14,81 @@ from langchain.agents import create_tool_calling_agent, AgentExecutor
 from langchain_core.runnables import ConfigurableFieldSpec
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain.schema.runnable import RunnableLambda,RunnablePassthrough
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage
 
 from SessionManager import SessionMemoryManager
+from History import LLMSummarizer
 from Tools import MathTools
 from Prompts import ChatBotPrompts
-from Rag import RAGPipeline
-from Streaming import QueueCallbackHandler
+from Rag import IngestProgress, RAGPipeline
 from DocReader import DocumentReader
+from IntentRouter import ARITHMETIC, DIRECT, IntentRouter
+from Metrics import MetricsRegistry, span
 
 
-from typing import List, Optional, Union, BinaryIO, TextIO
+from typing import Callable, List, Optional, Union, BinaryIO, TextIO
 from pathlib import Path
 
 
 
 class ChatBot():
-    def __init__(self, temperature: float = 0.7):
-        self.callback_handler = QueueCallbackHandler()
+    def __init__(self, temperature: float = 0.7, device: Optional[str] = None,
+                 chat_id: Optional[str] = None, llm: Optional[BaseChatModel] = None,
+                 rag_pipeline: Optional[RAGPipeline] = None, router: Optional[IntentRouter] = None):
         self.document_reader = DocumentReader()
         self.tools=MathTools.get_tools()
-        self.llm = ChatGroq(
+        self.llm = llm or ChatGroq(
             model="openai/gpt-oss-20b",
             temperature=temperature,
             api_key=API_KEY,
             streaming=True,
-            callbacks=[self.callback_handler],
         )
         self.session=SessionMemoryManager
+        if os.getenv("HISTORY_SUMMARIZE", "0") == "1" and self.session.summarizer is None:
+            # turns leaving the token window are folded into a rolling summary
+            self.session.summarizer = LLMSummarizer(self.llm)
         self.chat_prompt = ChatBotPrompts.build_prompt()
-        self.rag_pipeline = RAGPipeline()
+        # embedding and reranker models come from the shared ModelRegistry;
+        # with a chat_id the index lives in that chat's own directory
+        self.chat_id = chat_id
+        self.rag_pipeline = rag_pipeline or RAGPipeline(device=device, chat_id=chat_id)
+        # arithmetic is answered locally, plain questions skip the tool loop
+        self.router = router or IntentRouter.shared()
         agent=create_tool_calling_agent(self.llm,self.tools,self.chat_prompt)
-        agent_executor=AgentExecutor(agent=agent,tools=self.tools,verbose=False,callbacks=[self.callback_handler])
+        agent_executor=AgentExecutor(agent=agent,tools=self.tools,verbose=False)
         self.executor=agent_executor
         self.pipeline=self.pipeline_config()
+        self.direct_pipeline = self.pipeline_config(
+            RunnableLambda(self.rag_pipeline._retrieve_context) | ChatBotPrompts.build_direct_prompt() | self.llm
+        )
     
     def read(self, file_input: Union[str, BinaryIO, TextIO], 
-            filename: Optional[str] = None, ) -> list[str]:
-        """Read document from path and return list of text chunks."""
+            filename: Optional[str] = None,
+            on_progress: Optional[Callable[[IngestProgress], None]] = None) -> IngestProgress:
+        """Stream a document from path or file object into the RAG pipeline.
+
+        Pages/paragraphs are parsed, split and embedded batch by batch;
+        `on_progress` receives an IngestProgress after each batch.
+        """
         file_path = os.path.abspath(file_input) if isinstance(file_input, str) else file_input
         if isinstance(file_input,str):
             if not os.path.exists(file_path):
                 raise FileNotFoundError(f"File not found: {file_path}") 
-        if filename:
-            self.rag_pipeline.ingest(self.document_reader.read(file_path, filename))
-        else:
-            self.rag_pipeline.read(self.document_reader.read(file_path))
+        texts = self.document_reader.iter_read(file_path, filename)
+        return self.rag_pipeline.ingest_stream(
+            texts,
+            save=self.chat_id is not None,
+            on_progress=on_progress,
+            source=filename or (os.path.basename(file_path) if isinstance(file_input, str) else None),
+        )
 
         
 
     
-    def pipeline_config(self):
+    def pipeline_config(self, runnable=None):
         pipeline = RunnableWithMessageHistory(
-        runnable=RunnableLambda(self.rag_pipeline._retrieve_context) | self.executor,            
+        runnable=runnable or RunnableLambda(self.rag_pipeline._retrieve_context) | self.executor,            
         get_session_history=self.session.get_session,  
         input_messages_key="question",           
         history_messages_key="chat_history",  
@@ -87,19 +111,80 @@ class ChatBot():
     )
         return pipeline
 
+    async def _remember(self, query: str, answer: str, session_id: str, k: int) -> None:
+        """Record a turn answered without the LLM in the chat history.
+
+        aadd_messages runs summarizing and reloading from the store in a thread.
+        """
+        history = self.session.get_session(session_id, k)
+        await history.aadd_messages([HumanMessage(content=query), AIMessage(content=answer)])
+
     async def ask(self, query: str,session_id:str="default",k:int=4) -> str:
-        """Send a query and return the final agent output."""
+        """Send a query and return the final output of the route the IntentRouter picks."""
+        config = {"configurable": {"session_id": session_id, "k": k}}
+        decision = self.router.route(query)
+        if decision.route == ARITHMETIC:
+            await self._remember(query, decision.answer, session_id, k)
+            return decision.answer
+        if decision.route == DIRECT:
+            message = await self.direct_pipeline.ainvoke({"question": query}, config=config)
+            return message.content
  
-        result =await  self.pipeline.ainvoke({"question": query},config={"configurable":{"session_id": session_id,"k":k}} )
+        result =await  self.pipeline.ainvoke({"question": query},config=config )
         return result["output"]
     
     async def ask_stream(self, query: str, session_id: str = "default", k: int = 4):
-        self.callback_handler.clear()
+        """Yield answer tokens. Holds no per-bot state, so concurrent calls are independent.
+
+        Records `first_token` and `answer` spans and counts tokens per route.
+        """
+        metrics = MetricsRegistry.shared()
+        started = time.perf_counter()
+        with span("route"):
+            decision = self.router.route(query)
+        tokens = 0
+        error = None
+        try:
+            async for token in self._stream_route(query, decision, session_id, k):
+                if tokens == 0:
+                    metrics.observe_stage("first_token", time.perf_counter() - started)
+                tokens += 1
+                yield token
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            metrics.observe_stage("answer", time.perf_counter() - started, error)
+            metrics.counter("answer_tokens_total", "Answer tokens streamed", ("route",)).inc(
+                tokens, route=decision.route)
+
+    async def _stream_route(self, query: str, decision, session_id: str, k: int):
+        if decision.route == ARITHMETIC:
+            await self._remember(query, decision.answer, session_id, k)
+            yield decision.answer
+            return
+        if decision.route == DIRECT:
+            async for chunk in self.direct_pipeline.astream(
+                {"question": query},
+                config={"configurable": {"session_id": session_id, "k": k}},
+            ):
+                if chunk.content:
+                    yield "".join(chunk.content) if isinstance(chunk.content, list) else chunk.content
+            return
+
+        metrics = MetricsRegistry.shared()
+        # agent loop: time every LLM round trip and tool call
+        running = {}
         async for event in self.pipeline.astream_events(
             {"question": query},
             config={"configurable": {"session_id": session_id, "k": k}},
             version="v1"
         ):
+            if event["event"] in ("on_chat_model_start", "on_tool_start"):
+                running[event["run_id"]] = time.perf_counter()
+            elif event["event"] in ("on_chat_model_end", "on_tool_end") and event["run_id"] in running:
+                stage = "llm_call" if event["event"] == "on_chat_model_end" else f"tool:{event['name']}"
+                metrics.observe_stage(stage, time.perf_counter() - running.pop(event["run_id"]))
             if event["event"] == "on_chat_model_stream":
                 chunk = event["data"]["chunk"]
                 if chunk and chunk.content:
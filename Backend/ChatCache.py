@@ -0,0 +1,234 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from SessionManager import SessionMemoryManager
+from VectorIndex import vector_bytes
+
+
+# Per-chunk overhead of a langchain Document plus its docstore / id-map entries
+_DOC_OVERHEAD_BYTES = 600
+
+
+def estimate_chatbot_bytes(chatbot: Any, chat_id: Optional[str] = None) -> int:
+    """
+    Rough resident size of a ChatBot: FAISS vectors, chunk texts and history.
+    Model weights are shared through the ModelRegistry and are not counted.
+    """
+    total = 0
+    vectorstore = getattr(getattr(chatbot, "rag_pipeline", None), "vectorstore", None)
+    if vectorstore is not None:
+        total += vector_bytes(vectorstore.index)
+        docs = getattr(vectorstore.docstore, "_dict", {})
+        total += sum(len(doc.page_content) + _DOC_OVERHEAD_BYTES for doc in docs.values())
+    if chat_id is not None:
+        total += SessionMemoryManager.estimate_bytes(chat_id)
+    return total
+
+
+@dataclass
+class CacheEntry:
+    chatbot: Any
+    last_access: float
+    size_bytes: int = 0
+    # (pipeline generation, index loaded) the size was estimated at
+    size_generation: Optional[tuple] = None
+
+
+class ChatBotCache:
+    """
+    Bounded ChatBot cache with LRU + idle-TTL eviction and a memory budget.
+    Evicted chats persist their index to the chat's ChatIndexStore directory
+    and spill their history, and are rebuilt transparently the next time their
+    chat_id is requested (the index itself reloads lazily on first query).
+    Chats that stay cached but are idle for `index_idle_seconds` only unload
+    their index.
+
+    The cache lock only guards the map: ChatBots are built outside it (one
+    builder per chat_id) and evicted chats are saved on a background thread,
+    so a cold or evicting chat never holds up lookups of other chats. A chat
+    requested again while it is still being saved waits for that save.
+    """
+
+    def __init__(self, factory: Callable[[str], Any],
+                 max_entries: int = int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "64")),
+                 ttl_seconds: float = float(os.getenv("CHAT_CACHE_TTL_SECONDS", "1800")),
+                 memory_budget_mb: float = float(os.getenv("CHAT_CACHE_MEMORY_BUDGET_MB", "1024")),
+                 index_idle_seconds: float = float(os.getenv("CHAT_INDEX_IDLE_SECONDS", "300"))):
+        self.factory = factory
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.memory_budget_bytes = int(memory_budget_mb * 1024 * 1024)
+        self.index_idle_seconds = index_idle_seconds
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.RLock()
+        # chat_id -> lock held while its ChatBot is being built
+        self._building: Dict[str, threading.Lock] = {}
+        # chat_id -> pending background save of an evicted chat
+        self._spilling: Dict[str, Future] = {}
+        self._spill_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-spill")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reloads = 0
+        self.index_unloads = 0
+
+    def __contains__(self, chat_id: str) -> bool:
+        return chat_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_create(self, chat_id: str) -> Any:
+        """Return the cached ChatBot for chat_id, reloading or creating it on a miss."""
+        chatbot = self._lookup(chat_id)
+        if chatbot is None:
+            with self._lock:
+                building = self._building.setdefault(chat_id, threading.Lock())
+            with building:
+                chatbot = self._lookup(chat_id, count=False)
+                if chatbot is None:
+                    chatbot = self._build(chat_id)
+            with self._lock:
+                if self._building.get(chat_id) is building and not building.locked():
+                    del self._building[chat_id]
+        self._run_spills(self._enforce_limits(keep=chat_id))
+        return chatbot
+
+    def _lookup(self, chat_id: str, count: bool = True) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(chat_id)
+            if entry is None:
+                return None
+            if count:
+                self.hits += 1
+            self._entries.move_to_end(chat_id)
+            entry.last_access = time.monotonic()
+            return entry.chatbot
+
+    def _build(self, chat_id: str) -> Any:
+        """Create a ChatBot outside the cache lock (caller holds the chat's build lock)."""
+        with self._lock:
+            self.misses += 1
+            pending = self._spilling.get(chat_id)
+        if pending is not None:
+            # its previous incarnation is still being saved
+            pending.result()
+        chatbot = self.factory(chat_id)
+        reloaded = self._reload(chat_id, chatbot)
+        with self._lock:
+            if reloaded:
+                self.reloads += 1
+            self._entries[chat_id] = CacheEntry(chatbot=chatbot, last_access=time.monotonic())
+        return chatbot
+
+    def evict(self, chat_id: str, wait: bool = True) -> bool:
+        """Spill a chat to disk and drop it from memory."""
+        with self._lock:
+            entry = self._entries.pop(chat_id, None)
+            if entry is None:
+                return False
+            self.evictions += 1
+        future = self._run_spills([(chat_id, entry.chatbot, False)])[0]
+        if wait:
+            future.result()
+        return True
+
+    def _run_spills(self, spills: List[tuple]) -> List[Future]:
+        """Save evicted chats / unload idle indexes on the spill thread."""
+        futures = []
+        for chat_id, chatbot, index_only in spills:
+            future = self._spill_executor.submit(self._spill_one, chat_id, chatbot, index_only)
+            if not index_only:
+                with self._lock:
+                    self._spilling[chat_id] = future
+                future.add_done_callback(lambda f, chat_id=chat_id: self._spill_done(chat_id, f))
+            futures.append(future)
+        return futures
+
+    def _spill_one(self, chat_id: str, chatbot: Any, index_only: bool) -> None:
+        try:
+            if index_only:
+                if chatbot.rag_pipeline.unload():
+                    with self._lock:
+                        self.index_unloads += 1
+                return
+            self._spill(chat_id, chatbot)
+            SessionMemoryManager.spill(chat_id)
+        except Exception as e:
+            print(f"[{chat_id}] spill failed: {e}")
+
+    def _spill_done(self, chat_id: str, future: Future) -> None:
+        with self._lock:
+            if self._spilling.get(chat_id) is future:
+                del self._spilling[chat_id]
+
+    def flush(self) -> None:
+        """Wait for every pending spill (e.g. at shutdown)."""
+        self._spill_executor.submit(lambda: None).result()
+
+    def stats(self) -> dict:
+        with self._lock:
+            sizes = {chat_id: entry.size_bytes for chat_id, entry in self._entries.items()}
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "reloads": self.reloads,
+                "index_unloads": self.index_unloads,
+                "estimated_bytes": sum(sizes.values()),
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "sessions": SessionMemoryManager.get_stats(),
+            }
+
+    def _spill(self, chat_id: str, chatbot: Any) -> None:
+        chatbot.rag_pipeline.unload()
+
+    def _reload(self, chat_id: str, chatbot: Any) -> bool:
+        # nothing to do eagerly: the pipeline opens its directory on first query
+        rag = chatbot.rag_pipeline
+        return rag.store is not None and rag.store.exists(chat_id)
+
+    def _enforce_limits(self, keep: Optional[str] = None) -> List[tuple]:
+        """Drop chats over the limits from the map; returns the spills to run outside the lock."""
+        spills = []
+        with self._lock:
+            now = time.monotonic()
+            for chat_id, entry in list(self._entries.items()):
+                if chat_id == keep:
+                    continue
+                if now - entry.last_access > self.ttl_seconds:
+                    del self._entries[chat_id]
+                    self.evictions += 1
+                    spills.append((chat_id, entry.chatbot, False))
+                elif entry.chatbot.rag_pipeline.is_loaded and \
+                        now - entry.chatbot.rag_pipeline.last_used > self.index_idle_seconds:
+                    spills.append((chat_id, entry.chatbot, True))
+
+            # sizes change as chats ingest documents: re-estimate a chat when
+            # its index changed, and the requested chat (its history grows)
+            total = 0
+            for chat_id, entry in self._entries.items():
+                rag = entry.chatbot.rag_pipeline
+                generation = (rag.generation, rag.is_loaded)
+                if chat_id == keep or entry.size_generation != generation:
+                    entry.size_bytes = estimate_chatbot_bytes(entry.chatbot, chat_id)
+                    entry.size_generation = generation
+                total += entry.size_bytes
+
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or total > self.memory_budget_bytes):
+                oldest = next(iter(self._entries))
+                if oldest == keep:
+                    break
+                entry = self._entries.pop(oldest)
+                total -= entry.size_bytes
+                self.evictions += 1
+                spills = [s for s in spills if s[0] != oldest]
+                spills.append((oldest, entry.chatbot, False))
+        return spills
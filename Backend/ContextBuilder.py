@@ -0,0 +1,252 @@
+import logging
+import math
+import os
+import re
+import threading
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import List, Optional, Sequence, Tuple
+
+from langchain.schema import Document
+
+
+_APPROX_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_WORD_RE = re.compile(r"\w+")
+# byte-level BPE averages about 4 UTF-8 bytes per token on English prose and
+# fewer on digits, code and non-Latin scripts; 3 over-counts rather than under
+_APPROX_BYTES_PER_TOKEN = 3
+
+
+class TokenCounter:
+    """
+    Prompt token counts with tiktoken's `encoding_name`. When tiktoken or the
+    encoding file is unavailable (e.g. offline), falls back to an estimate
+    that errs high: the larger of the word and punctuation runs and the
+    UTF-8 bytes / 3, so budgets sized with it cannot overflow the model's
+    context. The fallback is logged and reported as `exact = False`.
+    """
+
+    _shared: Optional["TokenCounter"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, encoding_name: str = os.getenv("CONTEXT_TOKENIZER", "o200k_base")):
+        self._encoding = None
+        self.name = "approx"
+        self.fallback_reason: Optional[str] = None
+        try:
+            import tiktoken
+            self._encoding = tiktoken.get_encoding(encoding_name)
+            self.name = encoding_name
+        except Exception as e:
+            self.fallback_reason = f"{type(e).__name__}: {e}"
+            logging.warning(f"Tokenizer {encoding_name} unavailable, estimating token counts conservatively "
+                            f"({self.fallback_reason})")
+
+    @property
+    def exact(self) -> bool:
+        return self._encoding is not None
+
+    @classmethod
+    def shared(cls) -> "TokenCounter":
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def count(self, text: str) -> int:
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return max(len(_APPROX_TOKEN_RE.findall(text)),
+                   math.ceil(len(text.encode("utf-8")) / _APPROX_BYTES_PER_TOKEN))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Longest prefix of text within max_tokens."""
+        if max_tokens <= 0:
+            return ""
+        if self._encoding is not None:
+            tokens = self._encoding.encode(text, disallowed_special=())
+            return text if len(tokens) <= max_tokens else self._encoding.decode(tokens[:max_tokens])
+        if self.count(text) <= max_tokens:
+            return text
+        matches = list(_APPROX_TOKEN_RE.finditer(text))
+        if len(matches) > max_tokens:
+            text = text[:matches[max_tokens - 1].end()]
+        # both bounds shrink with the prefix, so the shorter cut satisfies both
+        return text.encode("utf-8")[:max_tokens * _APPROX_BYTES_PER_TOKEN].decode("utf-8", errors="ignore")
+
+
+@dataclass
+class Passage:
+    text: str
+    score: float
+    source: Optional[str] = None
+    part: Optional[int] = None
+    start: Optional[int] = None
+    end: Optional[int] = None
+    chunks: int = 1
+
+
+@dataclass
+class ContextReport:
+    candidates: int = 0
+    merged: int = 0                 # chunks folded into a neighbouring chunk
+    duplicates: int = 0             # near-duplicate passages dropped
+    dropped_for_budget: int = 0
+    passages: int = 0
+    raw_tokens: int = 0             # the candidates joined as-is
+    context_tokens: int = 0
+    tokens_saved: int = 0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class ContextBuilder:
+    """
+    Turns reranked chunks into the prompt context:
+
+    1. chunks of the same source/part whose character ranges overlap or
+       touch (start_index metadata) are merged, removing the splitter overlap
+    2. passages whose word shingles are near-duplicates of a better-scored
+       passage are dropped
+    3. passages are packed by rerank score into `max_tokens`
+
+    `build` returns a ContextReport per request; `stats` sums them up.
+    """
+
+    _shared: Optional["ContextBuilder"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, max_tokens: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200")),
+                 candidates: int = int(os.getenv("CONTEXT_CANDIDATES", "6")),
+                 duplicate_threshold: float = 0.85, max_gap: int = 3,
+                 counter: Optional[TokenCounter] = None):
+        self.max_tokens = max_tokens
+        self.candidates = candidates
+        self.duplicate_threshold = duplicate_threshold
+        self.max_gap = max_gap
+        self.counter = counter or TokenCounter.shared()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.total_raw_tokens = 0
+        self.total_context_tokens = 0
+        self.recent: deque = deque(maxlen=100)
+
+    @classmethod
+    def shared(cls) -> "ContextBuilder":
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def build(self, scored_docs: Sequence[Tuple[Document, float]]) -> Tuple[str, ContextReport]:
+        report = ContextReport(candidates=len(scored_docs))
+        if not scored_docs:
+            return "", report
+        report.raw_tokens = self.counter.count("\n".join(doc.page_content for doc, _ in scored_docs))
+
+        passages = self._merge(scored_docs, report)
+        passages.sort(key=lambda p: p.score, reverse=True)
+        passages = self._dedupe(passages, report)
+        packed = self._pack(passages, report)
+
+        context = "\n".join(p.text for p in packed)
+        report.passages = len(packed)
+        report.context_tokens = self.counter.count(context)
+        report.tokens_saved = max(report.raw_tokens - report.context_tokens, 0)
+        with self._lock:
+            self.requests += 1
+            self.total_raw_tokens += report.raw_tokens
+            self.total_context_tokens += report.context_tokens
+            self.recent.append(report)
+        return context, report
+
+    def _merge(self, scored_docs, report: ContextReport) -> List[Passage]:
+        passages = []
+        for doc, score in scored_docs:
+            meta = doc.metadata or {}
+            start = meta.get("start_index")
+            passages.append(Passage(
+                text=doc.page_content, score=float(score), source=meta.get("source"), part=meta.get("part"),
+                start=start, end=start + len(doc.page_content) if start is not None else None))
+
+        positioned = sorted((p for p in passages if p.start is not None),
+                            key=lambda p: (str(p.source), p.part if p.part is not None else -1, p.start))
+        merged: List[Passage] = [p for p in passages if p.start is None]
+        current: Optional[Passage] = None
+        for passage in positioned:
+            if current is not None and passage.source == current.source and passage.part == current.part \
+                    and passage.start <= current.end + self.max_gap:
+                if passage.end > current.end:
+                    if passage.start < current.end:
+                        current.text += passage.text[current.end - passage.start:]
+                    else:
+                        current.text += " " + passage.text
+                    current.end = passage.end
+                current.score = max(current.score, passage.score)
+                current.chunks += 1
+                report.merged += 1
+                continue
+            current = passage
+            merged.append(current)
+        return merged
+
+    def _shingles(self, text: str) -> set:
+        words = _WORD_RE.findall(text.lower())
+        if len(words) < 3:
+            return {" ".join(words)}
+        return {" ".join(words[i:i + 3]) for i in range(len(words) - 2)}
+
+    def _dedupe(self, passages: List[Passage], report: ContextReport) -> List[Passage]:
+        kept, kept_shingles = [], []
+        for passage in passages:
+            shingles = self._shingles(passage.text)
+            duplicate = False
+            for other in kept_shingles:
+                union = len(shingles | other)
+                # containment also catches a short passage repeated inside a longer one
+                overlap = len(shingles & other)
+                if union and (overlap / union >= self.duplicate_threshold
+                              or overlap / max(len(shingles), 1) >= self.duplicate_threshold):
+                    duplicate = True
+                    break
+            if duplicate:
+                report.duplicates += 1
+                continue
+            kept.append(passage)
+            kept_shingles.append(shingles)
+        return kept
+
+    def _pack(self, passages: List[Passage], report: ContextReport) -> List[Passage]:
+        packed, used = [], 0
+        for passage in passages:
+            # +1 for the newline joining passages
+            tokens = self.counter.count(passage.text) + (1 if packed else 0)
+            if used + tokens <= self.max_tokens:
+                packed.append(passage)
+                used += tokens
+            elif not packed:
+                # never return an empty context: cut the best passage to fit
+                passage.text = self.counter.truncate(passage.text, self.max_tokens)
+                packed.append(passage)
+                used = self.max_tokens
+            else:
+                report.dropped_for_budget += 1
+        return packed
+
+    def stats(self) -> dict:
+        with self._lock:
+            saved = self.total_raw_tokens - self.total_context_tokens
+            return {
+                "tokenizer": self.counter.name,
+                "tokenizer_exact": self.counter.exact,
+                "tokenizer_fallback_reason": self.counter.fallback_reason,
+                "max_tokens": self.max_tokens,
+                "requests": self.requests,
+                "raw_tokens": self.total_raw_tokens,
+                "context_tokens": self.total_context_tokens,
+                "tokens_saved": saved,
+                "avg_tokens_saved": round(saved / self.requests, 2) if self.requests else 0.0,
+                "recent_tokens_saved": [r.tokens_saved for r in self.recent][-20:],
+                "last": self.recent[-1].to_dict() if self.recent else None,
+            }
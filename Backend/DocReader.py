@@ -1,7 +1,18 @@
 from pathlib import Path
-from typing import List, Optional, Union, BinaryIO, TextIO
+from typing import Iterable, Iterator, List, Optional, Union, BinaryIO, TextIO
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 import logging
 import io
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+
+from Metrics import span, timed_iter
 
 
 try:
@@ -16,6 +27,78 @@ try:
 except ImportError:
     PDF_AVAILABLE = False
 
+_pdf_executors: dict = {}
+_pdf_executors_lock = threading.Lock()
+
+
+def _get_pdf_executor(workers: int) -> ProcessPoolExecutor:
+    """Process pool shared by every DocumentReader with the same worker count."""
+    with _pdf_executors_lock:
+        if workers not in _pdf_executors:
+            # spawn: forking a server process that holds torch/FAISS threads is unsafe
+            _pdf_executors[workers] = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pdf_executors[workers]
+
+
+def _extract_page_range(path: str, start: int, end: int) -> list:
+    """
+    Worker: extract pages [start, end) from the PDF at path.
+    Returns (page_num, text or None, error or None) per page so a bad page
+    never fails its neighbours.
+    """
+    reader = PdfReader(path)
+    results = []
+    for page_num in range(start, end):
+        try:
+            page_text = reader.pages[page_num].extract_text()
+            results.append((page_num, page_text.strip() if page_text and page_text.strip() else None, None))
+        except Exception as e:
+            results.append((page_num, None, str(e)))
+    return results
+
+
+@contextmanager
+def _shared_pdf_file(source):
+    """A filesystem path to the PDF that worker processes can open themselves."""
+    if isinstance(source, (str, Path)):
+        yield str(source)
+        return
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        shutil.copyfileobj(source, tmp)
+        tmp_path = tmp.name
+    try:
+        yield tmp_path
+    finally:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+
+class TextStream:
+    """
+    Lazily produced document texts (pages for PDF, paragraphs otherwise).
+    `total` is the number of texts when known up front, else None. Empty
+    texts (blank or unreadable pages) are not yielded but counted in
+    `skipped`, so texts yielded plus skipped reaches `total`.
+    """
+
+    def __init__(self, texts: Iterable[str], total: Optional[int] = None):
+        self._texts = texts
+        self.total = total
+        self.skipped = 0
+
+    def __iter__(self) -> Iterator[str]:
+        for text in self._texts:
+            if text:
+                yield text
+            else:
+                self.skipped += 1
+
+
 class DocumentReader:
     """
     Reads text from various document types: TXT, PDF, DOCX.
@@ -23,8 +106,14 @@ class DocumentReader:
     Returns a list of strings (paragraphs/pages).
     """
     
-    def __init__(self):
-        
+    def __init__(self, pdf_workers: int = int(os.getenv("PDF_WORKERS", "1")),
+                 parallel_min_pages: int = 32):
+        """
+        pdf_workers: processes used to extract PDF pages (1 = in-process)
+        parallel_min_pages: PDFs shorter than this are always read in-process
+        """
+        self.pdf_workers = pdf_workers
+        self.parallel_min_pages = parallel_min_pages
         self.supported_extensions = [".txt"]
         if PDF_AVAILABLE:
             self.supported_extensions.append(".pdf")
@@ -63,6 +152,62 @@ class DocumentReader:
             raise ValueError("filename parameter is required when using file objects")
 
         return self._read_from_file_object(file_input, filename, encoding)
+
+    def iter_read(self, file_input: Union[str, BinaryIO, TextIO],
+                  filename: Optional[str] = None,
+                  encoding: str = "utf-8") -> TextStream:
+        """
+        Streaming variant of read(): yields one page (PDF) or paragraph
+        (DOCX/TXT) at a time so large documents never sit in memory as a list.
+
+        Args and Raises: same as read(); errors raised while iterating are
+        wrapped like read() does.
+        """
+        if isinstance(file_input, (str, Path)):
+            path = Path(file_input)
+            if not path.exists():
+                raise FileNotFoundError(f"File not found: {file_input}")
+            if not path.is_file():
+                raise ValueError(f"Path is not a file: {file_input}")
+            name, source = str(file_input), str(path)
+        else:
+            if not filename:
+                raise ValueError("filename parameter is required when using file objects")
+            name, source = filename, file_input
+
+        ext = Path(name).suffix.lower()
+        if ext not in self.supported_extensions:
+            self._check_library_availability(ext)
+            raise ValueError(f"Unsupported file type: {ext}. Supported: {self.supported_extensions}")
+
+        try:
+            if ext == ".pdf":
+                if hasattr(source, 'seek'):
+                    source.seek(0)
+                reader = PdfReader(source)
+                return TextStream(timed_iter(self._wrap_errors(self._iter_pdf_text(reader, source), name),
+                                             "parse_pdf"), len(reader.pages))
+            if ext == ".docx":
+                if hasattr(source, 'seek'):
+                    source.seek(0)
+                paragraphs = docx.Document(source).paragraphs
+                return TextStream(timed_iter(self._wrap_errors(self._iter_docx_text(paragraphs), name),
+                                             "parse_docx"), len(paragraphs))
+            # text files are small next to PDFs; decode once and stream paragraphs
+            with span("parse_text"):
+                texts = self.read(file_input, filename, encoding)
+            return TextStream(texts, len(texts))
+        except Exception as e:
+            logging.error(f"Error reading {name}: {e}")
+            raise Exception(f"Failed to read {name}: {e}")
+
+    @staticmethod
+    def _wrap_errors(texts: Iterator[str], name: str) -> Iterator[str]:
+        try:
+            yield from texts
+        except Exception as e:
+            logging.error(f"Error reading {name}: {e}")
+            raise Exception(f"Failed to read {name}: {e}")
     
     def _read_from_path(self, file_path: str, encoding: str) -> List[str]:
         """Read from file path (original functionality)."""
@@ -147,7 +292,7 @@ class DocumentReader:
             raise ValueError("PDF support requires PyPDF2 library")
             
         reader = PdfReader(str(path))
-        return self._extract_pdf_text(reader)
+        return self._extract_pdf_text(reader, str(path))
     
     def _read_docx_from_path(self, path: Path) -> List[str]:
         """Read DOCX file from path and extract text from each paragraph."""
@@ -202,7 +347,7 @@ class DocumentReader:
                 file_obj.seek(0)
             
             reader = PdfReader(file_obj)
-            return self._extract_pdf_text(reader)
+            return self._extract_pdf_text(reader, file_obj)
             
         except Exception as e:
             raise Exception(f"Failed to read PDF from file object: {e}")
@@ -222,26 +367,65 @@ class DocumentReader:
         except Exception as e:
             raise Exception(f"Failed to read DOCX from file object: {e}")
     
-    def _extract_pdf_text(self, reader) -> List[str]:
+    def _extract_pdf_text(self, reader, source=None) -> List[str]:
         """Extract text from PDF reader object."""
-        texts = []
+        return [text for text in self._iter_pdf_text(reader, source) if text]
+
+    def _iter_pdf_text(self, reader, source=None) -> Iterator[str]:
+        """Yield the text of each PDF page; pages that are blank or fail (logged) yield "".
+
+        With pdf_workers > 1 and a long enough PDF, page ranges are extracted
+        in a process pool from `source` (path or file object) and yielded back
+        in page order.
+        """
+        n_pages = len(reader.pages)
+        if source is not None and self.pdf_workers > 1 and n_pages >= self.parallel_min_pages:
+            yield from self._iter_pdf_text_parallel(source, n_pages)
+            return
         for page_num, page in enumerate(reader.pages):
             try:
                 page_text = page.extract_text()
-                if page_text and page_text.strip():
-                    texts.append(page_text.strip())
             except Exception as e:
                 logging.warning(f"Could not extract text from page {page_num + 1}: {e}")
-                continue
-        return texts
+                page_text = None
+            yield page_text.strip() if page_text else ""
     
+    def _iter_pdf_text_parallel(self, source, n_pages: int) -> Iterator[str]:
+        # several ranges per worker keeps the pool busy when pages vary in cost
+        step = max(1, math.ceil(n_pages / (self.pdf_workers * 4)))
+        starts = list(range(0, n_pages, step))
+        with _shared_pdf_file(source) as path:
+            executor = _get_pdf_executor(self.pdf_workers)
+            # at most 2 ranges per worker in flight, so extracted pages wait in
+            # memory only until the consumer catches up; yielded in page order
+            pending: deque = deque()
+            try:
+                for start in starts:
+                    pending.append(executor.submit(_extract_page_range, path, start, min(start + step, n_pages)))
+                    if len(pending) >= 2 * self.pdf_workers:
+                        yield from self._page_texts(pending.popleft().result())
+                while pending:
+                    yield from self._page_texts(pending.popleft().result())
+            finally:
+                # the consumer stopped early: drop ranges not started yet
+                for future in pending:
+                    future.cancel()
+
+    @staticmethod
+    def _page_texts(results) -> Iterator[str]:
+        for page_num, page_text, error in results:
+            if error is not None:
+                logging.warning(f"Could not extract text from page {page_num + 1}: {error}")
+            yield page_text or ""
+
     def _extract_docx_text(self, doc) -> List[str]:
         """Extract text from DOCX document object."""
-        texts = []
-        for para in doc.paragraphs:
-            if para.text and para.text.strip():
-                texts.append(para.text.strip())
-        return texts
+        return [text for text in self._iter_docx_text(doc.paragraphs) if text]
+
+    def _iter_docx_text(self, paragraphs) -> Iterator[str]:
+        """Yield each paragraph's text, "" for blank ones."""
+        for para in paragraphs:
+            yield para.text.strip() if para.text else ""
 
 if __name__ == "__main__":
     from pathlib import Path
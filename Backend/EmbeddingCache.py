@@ -0,0 +1,301 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import fcntl
+except ImportError:  # Windows: locks only cover this process
+    fcntl = None
+
+
+_DIGEST_SIZE = 16
+
+
+def content_key(model_name: str, text: str) -> bytes:
+    """Content address of a chunk vector: hash of (model name, chunk text)."""
+    return hashlib.blake2b(f"{model_name}\0{text}".encode("utf-8"), digest_size=_DIGEST_SIZE).digest()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed, append-only on-disk store of embedding vectors.
+
+    Layout under `<root>/<model slug>/`:
+      - vectors.f32  float32 rows, read through a numpy memmap
+      - keys.bin     16-byte content digests, one per row in the same order
+      - meta.json    dim, model name and a generation bumped by compaction
+
+    When the vector file grows past `max_bytes` it is compacted down to the
+    most recently used half. Appends and compaction hold an exclusive flock
+    and lookups a shared one, so several worker processes can share one
+    cache directory and a lookup never maps a file mid-compaction.
+    """
+
+    _instances: Dict[tuple, "EmbeddingCache"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, model_name: str,
+                 root: Optional[str] = None,
+                 max_mb: float = float(os.getenv("EMBEDDING_CACHE_MAX_MB", "512"))):
+        self.model_name = model_name
+        root = root or os.getenv("EMBEDDING_CACHE_DIR", "embedding_cache")
+        self.path = os.path.join(root, re.sub(r"[^\w.-]+", "_", model_name))
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        os.makedirs(self.path, exist_ok=True)
+        self._vectors_path = os.path.join(self.path, "vectors.f32")
+        self._keys_path = os.path.join(self.path, "keys.bin")
+        self._meta_path = os.path.join(self.path, "meta.json")
+        self._lock_path = os.path.join(self.path, ".lock")
+        self._lock = threading.RLock()
+        self.dim: Optional[int] = None
+        self.generation = 0
+        self._rows: Dict[bytes, int] = {}
+        self._last_used: List[int] = []
+        self._tick = 0
+        self._keys_offset = 0
+        self._mmap: Optional[np.memmap] = None
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        with self._lock, self._file_lock(shared=True):
+            self._refresh()
+
+    @classmethod
+    def shared(cls, model_name: str, **kwargs) -> "EmbeddingCache":
+        """One cache object per model and directory in this process."""
+        key = (model_name, kwargs.get("root") or os.getenv("EMBEDDING_CACHE_DIR", "embedding_cache"))
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(model_name, **kwargs)
+            return cls._instances[key]
+
+    @classmethod
+    def all_stats(cls) -> dict:
+        """Stats of every shared cache in this process keyed by model name."""
+        with cls._instances_lock:
+            caches = list(cls._instances.values())
+        return {cache.model_name: cache.stats() for cache in caches}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @contextmanager
+    def _file_lock(self, shared: bool = False):
+        with open(self._lock_path, "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_meta(self) -> dict:
+        if not os.path.exists(self._meta_path):
+            return {}
+        with open(self._meta_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_meta(self) -> None:
+        tmp = self._meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"model_name": self.model_name, "dim": self.dim, "generation": self.generation}, f)
+        os.replace(tmp, self._meta_path)
+
+    def _refresh(self) -> None:
+        """Pick up rows appended (or a compaction done) by other processes."""
+        meta = self._read_meta()
+        if meta.get("generation", 0) != self.generation:
+            self._rows.clear()
+            self._last_used.clear()
+            self._keys_offset = 0
+            self._mmap = None
+            self.generation = meta.get("generation", 0)
+        if self.dim is None:
+            self.dim = meta.get("dim")
+        if not os.path.exists(self._keys_path) or self.dim is None:
+            return
+        row_bytes = self.dim * 4
+        n_vectors = os.path.getsize(self._vectors_path) // row_bytes if os.path.exists(self._vectors_path) else 0
+        if os.path.getsize(self._keys_path) > self._keys_offset:
+            with open(self._keys_path, "rb") as f:
+                f.seek(self._keys_offset)
+                data = f.read()
+            n_new = len(data) // _DIGEST_SIZE
+            row = self._keys_offset // _DIGEST_SIZE
+            for i in range(n_new):
+                # a row is only valid once its vector has been written too
+                if row >= n_vectors:
+                    break
+                self._rows[data[i * _DIGEST_SIZE:(i + 1) * _DIGEST_SIZE]] = row
+                self._last_used.append(0)
+                row += 1
+            self._keys_offset = row * _DIGEST_SIZE
+        n_rows = self._keys_offset // _DIGEST_SIZE
+        if n_rows and (self._mmap is None or self._mmap.shape[0] != n_rows):
+            self._mmap = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(n_rows, self.dim))
+
+    def get_many(self, keys: List[bytes]) -> Dict[int, np.ndarray]:
+        """Return {position in keys: vector} for every cached key."""
+        found = {}
+        with self._lock, self._file_lock(shared=True):
+            self._refresh()
+            for i, key in enumerate(keys):
+                row = self._rows.get(key)
+                if row is None:
+                    self.misses += 1
+                    continue
+                self.hits += 1
+                self._tick += 1
+                self._last_used[row] = self._tick
+                found[i] = np.array(self._mmap[row])
+        return found
+
+    def put_many(self, keys: List[bytes], vectors: np.ndarray) -> None:
+        """Append new vectors; keys already present are skipped."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if not len(keys):
+            return
+        with self._lock, self._file_lock():
+            self._refresh()
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._write_meta()
+            self._repair()
+            fresh = [i for i, key in enumerate(keys) if key not in self._rows]
+            fresh = list({keys[i]: i for i in fresh}.values())
+            if not fresh:
+                return
+            with open(self._vectors_path, "ab") as f:
+                f.write(vectors[fresh].tobytes())
+            with open(self._keys_path, "ab") as f:
+                f.write(b"".join(keys[i] for i in fresh))
+            self._refresh()
+            self._tick += 1
+            for i in fresh:
+                self._last_used[self._rows[keys[i]]] = self._tick
+            if os.path.getsize(self._vectors_path) > self.max_bytes:
+                self._compact()
+
+    def _repair(self) -> None:
+        """
+        Cut both files back to the rows they have in common (caller holds
+        the exclusive flock). A writer that died between the vector and the
+        key append, or part-way through either, leaves extra or torn rows;
+        appending after them would shift every later key onto the wrong
+        vector.
+        """
+        row_bytes = self.dim * 4
+        n_vectors = os.path.getsize(self._vectors_path) // row_bytes if os.path.exists(self._vectors_path) else 0
+        n_keys = os.path.getsize(self._keys_path) // _DIGEST_SIZE if os.path.exists(self._keys_path) else 0
+        rows = min(n_vectors, n_keys)
+        for path, size in ((self._vectors_path, rows * row_bytes), (self._keys_path, rows * _DIGEST_SIZE)):
+            if os.path.exists(path) and os.path.getsize(path) != size:
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+        if self._keys_offset > rows * _DIGEST_SIZE:
+            # rows this process had mapped are gone: start over from the files
+            self._rows.clear()
+            self._last_used.clear()
+            self._keys_offset = 0
+            self._mmap = None
+            self._refresh()
+
+    def _compact(self) -> None:
+        """Keep the most recently used half of the rows (caller holds both locks)."""
+        order = sorted(self._rows.items(), key=lambda item: self._last_used[item[1]], reverse=True)
+        keep = order[: len(order) // 2]
+        rows = np.array([row for _, row in keep], dtype=np.int64)
+        vectors = np.array(self._mmap[np.sort(rows)]) if len(rows) else np.zeros((0, self.dim), np.float32)
+        keys_in_order = [key for key, _ in sorted(keep, key=lambda item: item[1])]
+        last_used = [self._last_used[row] for row in np.sort(rows)]
+        for path, payload in ((self._vectors_path, vectors.tobytes()), (self._keys_path, b"".join(keys_in_order))):
+            with open(path + ".tmp", "wb") as f:
+                f.write(payload)
+            os.replace(path + ".tmp", path)
+        self.evicted += len(order) - len(keep)
+        self.generation += 1
+        self._write_meta()
+        self._mmap = None
+        self._rows = {key: i for i, key in enumerate(keys_in_order)}
+        self._last_used = last_used
+        self._keys_offset = len(keys_in_order) * _DIGEST_SIZE
+        if keys_in_order:
+            self._mmap = np.memmap(self._vectors_path, dtype=np.float32, mode="r",
+                                   shape=(len(keys_in_order), self.dim))
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+            return {
+                "model_name": self.model_name,
+                "entries": len(self._rows),
+                "bytes": size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evicted": self.evicted,
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves chunk vectors from an EmbeddingCache and
+    only runs the underlying model on misses, in batches of `batch_size`.
+    Query embeddings pass straight through.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, batch_size: int = 64):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [content_key(self.cache.model_name, text) for text in texts]
+        found = self.cache.get_many(keys)
+        # repeated texts inside one call are embedded once
+        missing: Dict[bytes, List[int]] = {}
+        for i in range(len(texts)):
+            if i not in found:
+                missing.setdefault(keys[i], []).append(i)
+        unique = list(missing.values())
+        for start in range(0, len(unique), self.batch_size):
+            batch = unique[start:start + self.batch_size]
+            vectors = np.asarray(self.embeddings.embed_documents([texts[group[0]] for group in batch]),
+                                 dtype=np.float32)
+            self.cache.put_many([keys[group[0]] for group in batch], vectors)
+            for group, vector in zip(batch, vectors):
+                for i in group:
+                    found[i] = vector
+        return [found[i].tolist() for i in range(len(texts))]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    class _Fake(Embeddings):
+        calls = 0
+
+        def embed_documents(self, texts):
+            _Fake.calls += len(texts)
+            return [[float(len(t)), 1.0, 0.0] for t in texts]
+
+        def embed_query(self, text):
+            return [float(len(text)), 1.0, 0.0]
+
+    cached = CachedEmbeddings(_Fake(), EmbeddingCache("fake", root=tempfile.mkdtemp()))
+    cached.embed_documents(["a", "bb", "a"])
+    cached.embed_documents(["a", "bb", "ccc"])
+    print(f"model calls: {_Fake.calls}", cached.cache.stats())
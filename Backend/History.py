@@ -1,26 +1,160 @@
+import asyncio
+import os
+import threading
+from collections import deque
+from typing import Callable, Iterable, Optional
+
 from langchain_core.chat_history import BaseChatMessageHistory
-from langchain_core.messages import BaseMessage
+from langchain_core.messages import BaseMessage, SystemMessage, get_buffer_string
+
+from ContextBuilder import TokenCounter
+
+
+# (previous summary or None, evicted messages) -> new summary
+Summarizer = Callable[[Optional[str], list[BaseMessage]], str]
+
+
+class LLMSummarizer:
+    """Rolling summary of evicted turns written by a chat model."""
+
+    def __init__(self, llm, max_words: int = 120):
+        self.llm = llm
+        self.max_words = max_words
+
+    def __call__(self, summary: Optional[str], evicted: list[BaseMessage]) -> str:
+        prompt = (
+            f"Update the summary of a conversation with the new lines below. "
+            f"Keep names, facts and open questions; at most {self.max_words} words. "
+            f"Reply with the summary only.\n\n"
+            f"Current summary:\n{summary or '(empty)'}\n\nNew lines:\n{get_buffer_string(evicted)}"
+        )
+        return str(self.llm.invoke(prompt).content).strip()
+
 
 class BufferWindowMessageHistory(BaseChatMessageHistory):
-    def __init__(self, k: int = 4):
-     
-        self.messages: list[BaseMessage] = []
+    """
+    Chat history windowed by tokens: the newest messages whose tokens fit in
+    `max_tokens` (and at most `k` messages, when set) are kept in a deque, so
+    appending never copies the window. The newest message is always kept.
+
+    With a `summarizer`, evicted messages are folded into a rolling summary
+    that is prepended as a system message. With a `store`, every appended
+    message and summary is queued for the durable write-behind store.
+
+    `mark_stale(refresh)` defers reloading the window: `refresh(self)` runs
+    before the next read or append, in a worker thread on the async path,
+    so whoever hands out the history never touches the store itself.
+    """
+
+    def __init__(self, k: Optional[int] = 4,
+                 max_tokens: int = int(os.getenv("HISTORY_MAX_TOKENS", "2000")),
+                 summarizer: Optional[Summarizer] = None, store=None, session_id: Optional[str] = None,
+                 summary: Optional[str] = None, counter: Optional[TokenCounter] = None):
         self.k = k
+        self.max_tokens = max_tokens
+        self.summarizer = summarizer
+        self.store = store
+        self.session_id = session_id
+        self.summary = summary
+        self.counter = counter or TokenCounter.shared()
+        # (message, tokens) pairs, oldest first
+        self._window: deque = deque()
+        self.tokens = 0
+        self.evicted = 0
+        self._refresh: Optional[Callable[["BufferWindowMessageHistory"], None]] = None
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def messages(self) -> list[BaseMessage]:
+        self._ensure_fresh()
+        return self.cached_messages
+
+    @property
+    def cached_messages(self) -> list[BaseMessage]:
+        """The window as it is in memory, without refreshing it first."""
+        window = [message for message, _ in self._window]
+        if self.summary:
+            return [SystemMessage(content=f"Summary of the earlier conversation: {self.summary}")] + window
+        return window
+
+    async def aget_messages(self) -> list[BaseMessage]:
+        """Async version: a pending refresh reads the store, so it runs in a thread."""
+        if self._refresh is not None:
+            await asyncio.to_thread(self._ensure_fresh)
+        return self.cached_messages
+
+    def mark_stale(self, refresh: Callable[["BufferWindowMessageHistory"], None]) -> None:
+        """Call `refresh(self)` before the window is next read or appended to."""
+        self._refresh = refresh
+
+    def _ensure_fresh(self) -> None:
+        if self._refresh is None:
+            return
+        with self._refresh_lock:
+            refresh, self._refresh = self._refresh, None
+            if refresh is not None:
+                try:
+                    refresh(self)
+                except BaseException:
+                    self._refresh = refresh
+                    raise
+
+    def _count(self, message: BaseMessage) -> int:
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        # a few tokens of role/formatting overhead per message
+        return self.counter.count(content) + 4
+
+    def _append(self, messages: Iterable[BaseMessage]) -> list[BaseMessage]:
+        """Add to the window and return the messages evicted from it."""
+        for message in messages:
+            tokens = self._count(message)
+            self._window.append((message, tokens))
+            self.tokens += tokens
+        evicted = []
+        while len(self._window) > 1 and (self.tokens > self.max_tokens
+                                         or (self.k is not None and len(self._window) > self.k)):
+            message, tokens = self._window.popleft()
+            self.tokens -= tokens
+            evicted.append(message)
+        self.evicted += len(evicted)
+        return evicted
 
     def add_messages(self, messages: list[BaseMessage]) -> None:
-        """Add new messages and keep only the last `k`."""
-        self.messages.extend(messages)
-        self.messages = self.messages[-self.k:]
+        """Add new messages, evicting the oldest beyond the token budget or `k`."""
+        messages = list(messages)
+        self._ensure_fresh()
+        evicted = self._append(messages)
+        if self.store is not None and self.session_id is not None:
+            self.store.append(self.session_id, messages)
+        if evicted and self.summarizer is not None:
+            self.summary = self.summarizer(self.summary, evicted)
+            if self.store is not None and self.session_id is not None:
+                self.store.set_summary(self.session_id, self.summary)
 
     async def aadd_messages(self, messages: list[BaseMessage]) -> None:
-        """Async version: Add new messages and keep only the last `k`."""
-        self.messages.extend(messages)
-        self.messages = self.messages[-self.k:]
+        """Async version: summarizing calls a model and refreshing reads the store, so
+        either runs in a thread; plain appends stay inline."""
+        if self.summarizer is not None or self._refresh is not None:
+            await asyncio.to_thread(self.add_messages, messages)
+        else:
+            self.add_messages(messages)
+
+    def load(self, messages: list[BaseMessage], summary: Optional[str] = None) -> None:
+        """Replace the window and summary with persisted ones without writing them back."""
+        self._window.clear()
+        self.tokens = 0
+        self.summary = summary
+        self._append(messages)
 
     def clear(self) -> None:
-        """Clear the history."""
-        self.messages = []
+        """Clear the history (and its persisted copy)."""
+        self._refresh = None
+        self._window.clear()
+        self.tokens = 0
+        self.summary = None
+        if self.store is not None and self.session_id is not None:
+            self.store.delete(self.session_id)
 
     async def aclear(self) -> None:
         """Async version: Clear the history."""
-        self.messages = []
\ No newline at end of file
+        self.clear()
@@ -0,0 +1,221 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+
+
+class SQLiteHistoryStore:
+    """
+    Durable chat histories in SQLite with batched write-behind.
+
+    `append` and `set_summary` only queue the write; a background thread
+    commits everything queued in one transaction every `flush_seconds` (or
+    as soon as `batch_size` writes are pending), so streaming an answer
+    never waits on the disk. Reads flush first, so they always see queued
+    writes. Each session keeps its latest `keep_messages` messages.
+
+    Several worker processes may share the file: message ids come from
+    SQLite, and every flush bumps the session's version so other workers
+    can tell their cached window is stale (see `changed_elsewhere`).
+    """
+
+    _shared: Optional["SQLiteHistoryStore"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path: str = os.getenv("HISTORY_DB_PATH", os.path.join(
+                     os.getenv("CHAT_SPILL_DIR", "chat_spill"), "history.sqlite")),
+                 flush_seconds: float = float(os.getenv("HISTORY_FLUSH_SECONDS", "1.0")),
+                 batch_size: int = int(os.getenv("HISTORY_FLUSH_BATCH", "256")),
+                 keep_messages: int = int(os.getenv("HISTORY_KEEP_MESSAGES", "200"))):
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self.batch_size = batch_size
+        self.keep_messages = keep_messages
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # durability up to the last flush is all write-behind promises anyway
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "session_id TEXT NOT NULL, message TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, id)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS summaries (session_id TEXT PRIMARY KEY, summary TEXT NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS versions (session_id TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+        self._conn.commit()
+        # session -> last version this process wrote or read
+        self._seen: Dict[str, int] = {}
+        self._pending_messages: List[Tuple[str, str]] = []
+        self._pending_summaries: Dict[str, str] = {}
+        self._pending_lock = threading.Lock()
+        # one flush at a time, so a read's flush waits for a batch already being written
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._flush_times: deque = deque(maxlen=1000)
+        self.flushes = 0
+        self.flushed_messages = 0
+        self._thread = threading.Thread(target=self._flush_loop, name="history-writer", daemon=True)
+        self._thread.start()
+
+    def _migrate(self) -> None:
+        """Move messages keyed by per-process (session_id, seq) to database-assigned ids."""
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(messages)")]
+            if "seq" in columns:
+                self._conn.execute("ALTER TABLE messages RENAME TO messages_seq")
+                self._conn.execute(
+                    "CREATE TABLE messages (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                    "session_id TEXT NOT NULL, message TEXT NOT NULL)")
+                self._conn.execute("INSERT INTO messages (session_id, message) "
+                                   "SELECT session_id, message FROM messages_seq ORDER BY session_id, seq")
+                self._conn.execute("DROP TABLE messages_seq")
+
+    @classmethod
+    def shared(cls) -> "SQLiteHistoryStore":
+        with cls._shared_lock:
+            if cls._shared is None or cls._shared._closed:
+                cls._shared = cls()
+            return cls._shared
+
+    def append(self, session_id: str, messages: List[BaseMessage]) -> None:
+        with self._pending_lock:
+            self._pending_messages += [(session_id, json.dumps(message_to_dict(m))) for m in messages]
+            full = len(self._pending_messages) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def set_summary(self, session_id: str, summary: str) -> None:
+        with self._pending_lock:
+            self._pending_summaries[session_id] = summary
+
+    def load(self, session_id: str, limit: Optional[int] = None) -> Tuple[List[BaseMessage], Optional[str]]:
+        """The session's latest `limit` messages (oldest first) and its summary."""
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT message FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                (session_id, limit if limit is not None else -1)).fetchall()
+            summary = self._conn.execute("SELECT summary FROM summaries WHERE session_id = ?",
+                                         (session_id,)).fetchone()
+            self._seen[session_id] = self._version(session_id)
+        messages = messages_from_dict([json.loads(r[0]) for r in reversed(rows)])
+        return messages, summary[0] if summary else None
+
+    def _version(self, session_id: str) -> int:
+        row = self._conn.execute("SELECT version FROM versions WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row else 0
+
+    def changed_elsewhere(self, session_id: str) -> bool:
+        """True if another process wrote the session since this one last read or wrote it."""
+        with self._lock:
+            return self._version(session_id) != self._seen.get(session_id, 0)
+
+    def delete(self, session_id: str) -> None:
+        with self._flush_lock:
+            with self._pending_lock:
+                self._pending_messages = [p for p in self._pending_messages if p[0] != session_id]
+                self._pending_summaries.pop(session_id, None)
+            with self._lock:
+                self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+                self._conn.execute("DELETE FROM summaries WHERE session_id = ?", (session_id,))
+                self._bump([session_id])
+                self._conn.commit()
+
+    def _bump(self, sessions) -> None:
+        for session_id in sessions:
+            before = self._version(session_id)
+            self._conn.execute(
+                "INSERT INTO versions (session_id, version) VALUES (?, 1) "
+                "ON CONFLICT(session_id) DO UPDATE SET version = version + 1", (session_id,))
+            # if another process wrote in between, leave ours stale so it reloads
+            if self._seen.get(session_id, 0) == before:
+                self._seen[session_id] = before + 1
+
+    def flush(self) -> int:
+        """Commit every queued write in one transaction; returns the number of messages written.
+
+        The queue is swapped out under the pending lock and written outside
+        it, so `append` never waits on the disk. If the write fails it is
+        rolled back and the batch goes back to the front of the queue.
+        """
+        with self._flush_lock:
+            with self._pending_lock:
+                messages, self._pending_messages = self._pending_messages, []
+                summaries, self._pending_summaries = self._pending_summaries, {}
+            if not messages and not summaries:
+                return 0
+            started = time.perf_counter()
+            sessions = {session_id for session_id, _ in messages} | set(summaries)
+            with self._lock:
+                seen = {s: self._seen[s] for s in sessions if s in self._seen}
+                try:
+                    self._conn.executemany("INSERT INTO messages (session_id, message) VALUES (?, ?)", messages)
+                    self._conn.executemany("INSERT OR REPLACE INTO summaries (session_id, summary) VALUES (?, ?)",
+                                           summaries.items())
+                    if self.keep_messages > 0:
+                        self._conn.executemany(
+                            "DELETE FROM messages WHERE session_id = ? AND id <= (SELECT id FROM messages "
+                            "WHERE session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                            [(s, s, self.keep_messages) for s in sessions])
+                    self._bump(sessions)
+                    self._conn.commit()
+                except sqlite3.Error:
+                    self._conn.rollback()
+                    for s in sessions:
+                        if s in seen:
+                            self._seen[s] = seen[s]
+                        else:
+                            self._seen.pop(s, None)
+                    with self._pending_lock:
+                        self._pending_messages = messages + self._pending_messages
+                        # a summary queued since is newer than the failed one
+                        self._pending_summaries = {**summaries, **self._pending_summaries}
+                    raise
+            self._flush_times.append(time.perf_counter() - started)
+            self.flushes += 1
+            self.flushed_messages += len(messages)
+            return len(messages)
+
+    def _flush_loop(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"[history] flush failed: {e}")
+
+    def close(self) -> None:
+        """Flush what is queued and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> dict:
+        with self._pending_lock:
+            pending = len(self._pending_messages) + len(self._pending_summaries)
+        times = sorted(self._flush_times)
+        return {
+            "pending": pending,
+            "flushes": self.flushes,
+            "flushed_messages": self.flushed_messages,
+            "avg_flush_ms": round(1000 * sum(times) / len(times), 3) if times else 0.0,
+            "p95_flush_ms": round(1000 * times[int(0.95 * (len(times) - 1))], 3) if times else 0.0,
+        }
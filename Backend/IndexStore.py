@@ -0,0 +1,257 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Union
+
+import faiss
+import numpy as np
+from langchain.schema import Document
+from langchain_community.docstore.base import AddableMixin, Docstore
+
+from SharedState import ChatLocks, ChatRegistry
+
+
+_SAFE_ID_RE = re.compile(r"^[\w.-]{1,100}$")
+
+
+def is_safe_id(chat_id: str) -> bool:
+    """Whether a chat id can be used as a directory name as is (no separators, not hidden)."""
+    return bool(_SAFE_ID_RE.match(chat_id)) and not chat_id.startswith(".")
+
+# root -> (registry, locks); one per process however many stores are created
+_node_state: Dict[str, tuple] = {}
+_node_state_lock = threading.Lock()
+
+
+class SQLiteDocstore(Docstore, AddableMixin):
+    """
+    Docstore that keeps chunk texts and metadata in SQLite instead of Python
+    objects, so a loaded index only holds vectors in memory. Also records the
+    FAISS position -> docstore id mapping (no pickle anywhere).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks (doc_id TEXT PRIMARY KEY, text TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS positions (position INTEGER PRIMARY KEY, doc_id TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (doc_id, text, metadata) VALUES (?, ?, ?)",
+                [(doc_id, doc.page_content, json.dumps(doc.metadata)) for doc_id, doc in texts.items()],
+            )
+            self._conn.commit()
+
+    def delete(self, ids: List) -> None:
+        with self._lock:
+            self._conn.executemany("DELETE FROM chunks WHERE doc_id = ?", [(i,) for i in ids])
+            self._conn.commit()
+
+    def search(self, search: str) -> Union[str, Document]:
+        docs = self.search_many([search])
+        return docs[0] if docs[0] is not None else f"ID {search} not found."
+
+    def search_many(self, ids: List[str]) -> List[Optional[Document]]:
+        """Fetch several chunks in one query, preserving the order of ids."""
+        if not ids:
+            return []
+        with self._lock:
+            rows = {}
+            for start in range(0, len(ids), 500):
+                part = ids[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows.update((r[0], r) for r in self._conn.execute(
+                    f"SELECT doc_id, text, metadata FROM chunks WHERE doc_id IN ({placeholders})", part))
+        return [Document(id=rows[i][0], page_content=rows[i][1], metadata=json.loads(rows[i][2]))
+                if i in rows else None for i in ids]
+
+    def iter_documents(self) -> Iterable[Document]:
+        with self._lock:
+            rows = self._conn.execute("SELECT doc_id, text, metadata FROM chunks").fetchall()
+        for doc_id, text, metadata in rows:
+            yield Document(id=doc_id, page_content=text, metadata=json.loads(metadata))
+
+    def write_positions(self, index_to_docstore_id: Dict[int, str]) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM positions")
+            self._conn.executemany("INSERT INTO positions (position, doc_id) VALUES (?, ?)",
+                                   sorted(index_to_docstore_id.items()))
+            self._conn.commit()
+
+    def read_positions(self) -> Dict[int, str]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT position, doc_id FROM positions"))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class VectorFile:
+    """
+    Append-only float32 copy of an index's vectors (row i is FAISS position
+    i), read through a memory map, so a reduced-precision index can rescore
+    candidates exactly without keeping float32 vectors on the heap. Without
+    a path the rows are kept in memory.
+    """
+
+    def __init__(self, path: Optional[str], dim: Optional[int] = None):
+        self.path = path
+        self.dim = dim
+        self._parts: List[np.ndarray] = []
+        self._map: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        if self.path is None:
+            return sum(len(p) for p in self._parts)
+        if not self.dim or not os.path.exists(self.path):
+            return 0
+        return os.path.getsize(self.path) // (4 * self.dim)
+
+    def append(self, vectors: np.ndarray) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.dim = self.dim or vectors.shape[1]
+        if self.path is None:
+            self._parts.append(vectors.copy())
+            return
+        with open(self.path, "ab") as f:
+            f.write(vectors.tobytes())
+
+    def truncate(self, rows: int) -> None:
+        """Drop rows past `rows`, e.g. of an ingest that was never saved."""
+        if self.path is None:
+            self._parts = [self.all()[:rows]] if rows else []
+        elif os.path.exists(self.path) and self.dim:
+            self._map = None
+            with open(self.path, "r+b") as f:
+                f.truncate(rows * 4 * self.dim)
+
+    def rows(self, positions: np.ndarray) -> np.ndarray:
+        if self.path is None:
+            return self.all()[positions]
+        if self._map is None or int(positions.max()) >= len(self._map):
+            self._map = np.memmap(self.path, dtype=np.float32, mode="r", shape=(len(self), self.dim))
+        return np.asarray(self._map[positions])
+
+    def all(self) -> np.ndarray:
+        if self.path is None:
+            if len(self._parts) > 1:
+                self._parts = [np.concatenate(self._parts)]
+            return self._parts[0] if self._parts else np.zeros((0, self.dim or 0), dtype=np.float32)
+        return np.fromfile(self.path, dtype=np.float32).reshape(-1, self.dim) if len(self) else \
+            np.zeros((0, self.dim or 0), dtype=np.float32)
+
+    def close(self) -> None:
+        self._map = None
+
+
+class ChatIndexStore:
+    """
+    One directory per chat_id under `root` holding that chat's retrieval state:
+
+      index.faiss    FAISS index (faiss.write_index; opened with mmap when possible)
+      chunks.sqlite  chunk texts, metadata and position -> id mapping
+      bm25/          lexical index (see BM25Index.save)
+      meta.json      distance settings and vector count
+      vectors.f32    exact float32 vectors, kept when the index stores less precision
+
+    Worker processes on a node share the root: `.shared/registry.sqlite`
+    records each chat's index version (bumped on save, so stale copies get
+    reloaded) and `.shared/locks/` holds the per-chat file locks.
+    """
+
+    INDEX_FILE = "index.faiss"
+    CHUNKS_FILE = "chunks.sqlite"
+    META_FILE = "meta.json"
+    VECTORS_FILE = "vectors.f32"
+
+    def __init__(self, root: str = os.getenv("INDEX_STORE_DIR", "indexes"), use_mmap: bool = True):
+        self.root = root
+        self.use_mmap = use_mmap
+        os.makedirs(root, exist_ok=True)
+        key = os.path.abspath(root)
+        with _node_state_lock:
+            if key not in _node_state:
+                shared = os.path.join(root, ".shared")
+                os.makedirs(shared, exist_ok=True)
+                _node_state[key] = (ChatRegistry(os.path.join(shared, "registry.sqlite")),
+                                    ChatLocks(os.path.join(shared, "locks")))
+            self.registry, self.locks = _node_state[key]
+
+    def path_for(self, chat_id: str) -> str:
+        """Directory of a chat; ids that are not filesystem-safe (or hidden) are hashed."""
+        name = chat_id if is_safe_id(chat_id) else \
+            "h_" + hashlib.sha256(chat_id.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.root, name)
+
+    def lock(self, chat_id: str, shared: bool = False):
+        """Cross-process lock on a chat's files: exclusive to write them, shared to read them."""
+        return self.locks.hold(os.path.basename(self.path_for(chat_id)), shared=shared)
+
+    def writer_lock(self, chat_id: str):
+        """Serializes ingests of one chat across processes; readers never take it."""
+        return self.locks.hold(os.path.basename(self.path_for(chat_id)) + ".ingest")
+
+    def exists(self, chat_id: str) -> bool:
+        return has_index(self.path_for(chat_id))
+
+    def delete(self, chat_id: str) -> None:
+        path = self.path_for(chat_id)
+        with self.lock(chat_id):
+            if os.path.exists(path):
+                shutil.rmtree(path)
+            self.registry.forget(chat_id)
+
+
+def has_index(path: str) -> bool:
+    return os.path.exists(os.path.join(path, ChatIndexStore.INDEX_FILE)) and \
+        os.path.exists(os.path.join(path, ChatIndexStore.CHUNKS_FILE))
+
+
+def write_index(index: faiss.Index, path: str) -> None:
+    """Atomically write a FAISS index file."""
+    tmp = path + ".tmp"
+    faiss.write_index(index, tmp)
+    os.replace(tmp, path)
+
+
+def read_index(path: str, use_mmap: bool = True) -> faiss.Index:
+    """Open a FAISS index, memory-mapped and read-only when the index type allows it."""
+    if use_mmap:
+        try:
+            return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            pass
+    return faiss.read_index(path)
+
+
+def write_meta(path: str, meta: dict) -> None:
+    tmp = os.path.join(path, ChatIndexStore.META_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(path, ChatIndexStore.META_FILE))
+
+
+def read_meta(path: str) -> dict:
+    meta_path = os.path.join(path, ChatIndexStore.META_FILE)
+    if not os.path.exists(meta_path):
+        return {}
+    with open(meta_path, encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,188 @@
+import asyncio
+import contextvars
+import io
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+
+class IngestQueueFull(Exception):
+    """Raised when the ingestion queue has reached its configured depth."""
+
+
+@dataclass
+class IngestJob:
+    job_id: str
+    chat_id: str
+    filename: str
+    status: str = "queued"          # queued -> running -> done | failed
+    progress: float = 0.0
+    chunks: int = 0
+    # chunks skipped as near-duplicates
+    duplicates: int = 0
+    chunks_per_second: float = 0.0
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    done_event: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "chat_id": self.chat_id,
+            "filename": self.filename,
+            "status": self.status,
+            "progress": round(self.progress, 4),
+            "chunks": self.chunks,
+            "duplicates": self.duplicates,
+            "chunks_per_second": round(self.chunks_per_second, 2),
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class IngestionQueue:
+    """
+    Runs document ingestion (parsing, splitting, embedding) on a worker pool so
+    the event loop keeps serving other chats while a large upload is processed.
+    Jobs for the same chat_id are serialized; different chats run in parallel.
+
+    With a `registry` (SharedState.ChatRegistry) job status is also recorded
+    there, so any worker process can report or wait for a job another runs.
+    """
+
+    def __init__(self, get_chatbot: Callable[[str], Any],
+                 max_workers: int = int(os.getenv("INGEST_MAX_WORKERS", "2")),
+                 max_queue: int = int(os.getenv("INGEST_MAX_QUEUE", "32")),
+                 job_ttl_seconds: float = float(os.getenv("INGEST_JOB_TTL_SECONDS", "3600")),
+                 registry=None, progress_interval: float = 0.5):
+        self.get_chatbot = get_chatbot
+        self.registry = registry
+        self.progress_interval = progress_interval
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.job_ttl_seconds = job_ttl_seconds
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self.jobs: Dict[str, IngestJob] = {}
+        self._chat_locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def pending(self, chat_id: Optional[str] = None) -> List[IngestJob]:
+        """Jobs that are queued or running, optionally for one chat."""
+        return [job for job in self.jobs.values()
+                if job.status in ("queued", "running") and (chat_id is None or job.chat_id == chat_id)]
+
+    def submit(self, chat_id: str, data: bytes, filename: str) -> IngestJob:
+        """
+        Queue a file for ingestion and return its job immediately.
+        Must be called from the event loop thread.
+
+        Raises:
+            IngestQueueFull: If `max_queue` jobs are already pending
+        """
+        self._prune()
+        if len(self.pending()) >= self.max_queue:
+            raise IngestQueueFull(f"Ingestion queue is full ({self.max_queue} pending jobs)")
+
+        job = IngestJob(job_id=uuid.uuid4().hex, chat_id=chat_id, filename=filename)
+        self.jobs[job.job_id] = job
+        self._publish(job)
+        loop = asyncio.get_running_loop()
+        # the worker keeps the submitting request's trace id
+        context = contextvars.copy_context()
+        future = loop.run_in_executor(self.executor, context.run, self._run, job, data, loop)
+        future.add_done_callback(lambda _: job.done_event.set())
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        return self.jobs.get(job_id)
+
+    def status(self, job_id: str) -> Optional[dict]:
+        """Status of a job run by this process or, via the registry, by another worker."""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        return self.registry.job(job_id) if self.registry is not None else None
+
+    async def wait(self, jobs: List[IngestJob], timeout: Optional[float] = None) -> None:
+        """Wait until all given jobs have finished (successfully or not)."""
+        if jobs:
+            await asyncio.wait_for(asyncio.gather(*(job.done_event.wait() for job in jobs)), timeout)
+
+    async def wait_for_chat(self, chat_id: str, timeout: Optional[float] = None) -> None:
+        """Wait for every pending ingest of chat_id, including those of other workers."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        await self.wait(self.pending(chat_id), timeout)
+        if self.registry is None:
+            return
+        while await asyncio.to_thread(self.registry.pending_jobs, chat_id):
+            if deadline is not None and time.monotonic() >= deadline:
+                raise asyncio.TimeoutError()
+            await asyncio.sleep(0.1)
+
+    def stats(self) -> dict:
+        counts: Dict[str, int] = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {"max_workers": self.max_workers, "max_queue": self.max_queue, "jobs": counts,
+                "chunks": sum(job.chunks for job in self.jobs.values()),
+                "duplicates": sum(job.duplicates for job in self.jobs.values())}
+
+    def _chat_lock(self, chat_id: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._chat_locks.setdefault(chat_id, threading.Lock())
+
+    def _publish(self, job: IngestJob) -> None:
+        if self.registry is not None:
+            try:
+                self.registry.save_job(job.to_dict())
+            except Exception as e:
+                print(f"[{job.chat_id}] Could not record job {job.job_id}: {e}")
+
+    def _run(self, job: IngestJob, data: bytes, loop: asyncio.AbstractEventLoop) -> None:
+        published = [0.0]
+
+        def set_progress(progress) -> None:
+            if progress.fraction is not None:
+                job.progress = progress.fraction
+            job.chunks = progress.chunks_done
+            job.duplicates = progress.duplicates
+            job.chunks_per_second = progress.chunks_per_second
+            if time.monotonic() - published[0] >= self.progress_interval:
+                published[0] = time.monotonic()
+                self._publish(job)
+
+        with self._chat_lock(job.chat_id):
+            job.status = "running"
+            job.started_at = time.time()
+            self._publish(job)
+            try:
+                chatbot = self.get_chatbot(job.chat_id)
+                progress = chatbot.read(io.BytesIO(data), filename=job.filename, on_progress=set_progress)
+                if progress is not None:
+                    # a file of nothing but duplicates never reports a batch
+                    job.chunks, job.duplicates = progress.chunks_done, progress.duplicates
+                job.progress = 1.0
+                job.status = "done"
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+                print(f"[{job.chat_id}] Error reading file {job.filename}: {e}")
+            finally:
+                job.finished_at = time.time()
+                self._publish(job)
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.job_ttl_seconds
+        for job_id, job in list(self.jobs.items()):
+            if job.finished_at is not None and job.finished_at < cutoff:
+                del self.jobs[job_id]
+        if self.registry is not None:
+            self.registry.prune_jobs(cutoff)
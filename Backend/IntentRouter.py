@@ -0,0 +1,175 @@
+import ast
+import math
+import operator
+import re
+import threading
+from dataclasses import dataclass
+from typing import Optional, Union
+
+
+ARITHMETIC = "arithmetic"
+DIRECT = "direct"
+AGENT = "agent"
+
+Number = Union[int, float]
+
+
+class UnsafeExpression(ValueError):
+    """Raised for expressions the local evaluator refuses to compute."""
+
+
+_BIN_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+_UNARY_OPS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+
+
+def safe_eval(expression: str, max_length: int = 200, max_nodes: int = 64,
+              max_exponent: int = 64, max_magnitude: float = 1e100) -> Number:
+    """
+    Evaluate + - * / // % ** over numeric literals by walking the AST; no
+    names, calls or attributes are ever evaluated.
+
+    Raises:
+        UnsafeExpression: On anything else, oversized input or results, or division by zero
+    """
+    if len(expression) > max_length:
+        raise UnsafeExpression("expression too long")
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError as e:
+        raise UnsafeExpression(str(e)) from e
+    if sum(1 for _ in ast.walk(tree)) > max_nodes:
+        raise UnsafeExpression("expression too large")
+
+    def check(value: Number) -> Number:
+        if isinstance(value, complex) or not math.isfinite(value) or abs(value) > max_magnitude:
+            raise UnsafeExpression("result out of range")
+        return value
+
+    def visit(node: ast.AST) -> Number:
+        if isinstance(node, ast.Expression):
+            return visit(node.body)
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            return check(node.value)
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPS:
+            return _UNARY_OPS[type(node.op)](visit(node.operand))
+        if isinstance(node, ast.BinOp) and type(node.op) in _BIN_OPS:
+            left, right = visit(node.left), visit(node.right)
+            if isinstance(node.op, ast.Pow) and abs(right) > max_exponent:
+                raise UnsafeExpression("exponent too large")
+            try:
+                return check(_BIN_OPS[type(node.op)](left, right))
+            except (ZeroDivisionError, OverflowError) as e:
+                raise UnsafeExpression(str(e)) from e
+        raise UnsafeExpression(f"unsupported syntax: {type(node).__name__}")
+
+    return visit(tree)
+
+
+_PREFIX_RE = re.compile(
+    r"^\s*(?:please\s+)?(?:what(?:'s| is| are)|how much is|calculate|compute|evaluate|solve)\s*", re.I)
+_WORD_OPS = [
+    (re.compile(r"\bdivided\s+by\b", re.I), "/"),
+    (re.compile(r"\bmultiplied\s+by\b|\btimes\b", re.I), "*"),
+    (re.compile(r"\bplus\b", re.I), "+"),
+    (re.compile(r"\bminus\b", re.I), "-"),
+    (re.compile(r"\bto\s+the\s+power\s+of\b", re.I), "**"),
+    (re.compile(r"(?<=[\d\s)])[x×](?=[\d\s(])"), "*"),
+    (re.compile(r"÷"), "/"),
+    (re.compile(r"\^"), "**"),
+]
+_EXPRESSION_RE = re.compile(r"^[\d\s.+\-*/%()]+$")
+_HAS_OPERATOR_RE = re.compile(r"\d\s*(?:\*\*|[+\-*/%])\s*[\d(.-]")
+# arithmetic intent the local evaluator cannot parse ("add 3 and 5", "sum of ...")
+_MATH_INTENT_RE = re.compile(
+    r"\b(add|subtract|multiply|divide|sum of|product of|difference between|quotient|square root|percent(?:age)? of)\b",
+    re.I)
+_NUMBER_RE = re.compile(r"\d")
+
+
+def extract_expression(question: str) -> Optional[str]:
+    """The arithmetic expression a question consists of, or None."""
+    text = _PREFIX_RE.sub("", question.strip())
+    text = text.rstrip(" ?.!=")
+    for pattern, replacement in _WORD_OPS:
+        text = pattern.sub(replacement, text)
+    text = text.replace(",", "").strip()
+    if not text or not _EXPRESSION_RE.match(text) or not _HAS_OPERATOR_RE.search(text):
+        return None
+    return text
+
+
+def format_number(value: Number) -> str:
+    if isinstance(value, float):
+        if value.is_integer() and abs(value) < 1e15:
+            return str(int(value))
+        return f"{value:.10g}"
+    return str(value)
+
+
+@dataclass
+class RouteDecision:
+    route: str
+    expression: Optional[str] = None
+    result: Optional[Number] = None
+
+    @property
+    def answer(self) -> Optional[str]:
+        if self.route != ARITHMETIC:
+            return None
+        return f"The answer of {self.expression} is {format_number(self.result)}"
+
+
+class IntentRouter:
+    """
+    Cheap routing in front of the agent:
+
+    - arithmetic: the whole question is an arithmetic expression, answered
+      locally by safe_eval without any LLM call
+    - agent: arithmetic phrased in words the evaluator cannot parse, which
+      needs the math tools
+    - direct: everything else, a single streaming LLM call over the
+      retrieved context
+    """
+
+    _shared: Optional["IntentRouter"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {ARITHMETIC: 0, DIRECT: 0, AGENT: 0}
+
+    @classmethod
+    def shared(cls) -> "IntentRouter":
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def route(self, question: str) -> RouteDecision:
+        decision = self._decide(question)
+        with self._lock:
+            self.counts[decision.route] += 1
+        return decision
+
+    def _decide(self, question: str) -> RouteDecision:
+        expression = extract_expression(question)
+        if expression is not None:
+            try:
+                return RouteDecision(ARITHMETIC, expression, safe_eval(expression))
+            except UnsafeExpression:
+                return RouteDecision(AGENT)
+        if _MATH_INTENT_RE.search(question) and _NUMBER_RE.search(question):
+            return RouteDecision(AGENT)
+        return RouteDecision(DIRECT)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
@@ -0,0 +1,311 @@
+import bisect
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+# trace id of the request being served; worker threads see it when the
+# context is copied (RetrievalExecutor, IngestionQueue)
+trace_id_var: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_NAME_RE = re.compile(r"[^a-zA-Z0-9_]")
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(list(zip(self.labelnames, key)))} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [count per bucket (+Inf last), sum, count]
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                labels = list(zip(self.labelnames, key))
+                cumulative = 0
+                for bound, n in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += n
+                    lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', _format_value(bound))])} "
+                                 f"{cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class TraceLog:
+    """Spans of the most recent traces, for looking up where one request spent its time."""
+
+    def __init__(self, max_traces: int = 512, max_spans: int = 256):
+        self.max_traces = max_traces
+        self.max_spans = max_spans
+        self._traces: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, trace_id: str, stage: str, started: float, seconds: float, error: Optional[str]) -> None:
+        with self._lock:
+            spans = self._traces.get(trace_id)
+            if spans is None:
+                spans = self._traces[trace_id] = []
+                while len(self._traces) > self.max_traces:
+                    self._traces.popitem(last=False)
+            if len(spans) < self.max_spans:
+                spans.append({"stage": stage, "start": started, "ms": round(1000 * seconds, 3), "error": error})
+
+    def get(self, trace_id: str) -> Optional[list]:
+        with self._lock:
+            spans = self._traces.get(trace_id)
+            return sorted(spans, key=lambda s: s["start"]) if spans is not None else None
+
+
+class MetricsRegistry:
+    """
+    Counters and histograms plus collectors that turn the existing
+    `stats()` dicts into gauges, all rendered in the Prometheus text format.
+    """
+
+    _shared: Optional["MetricsRegistry"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, namespace: str = "rag"):
+        self.namespace = namespace
+        self._metrics: "OrderedDict[str, object]" = OrderedDict()
+        self._collectors: List[Tuple[str, Callable[[], dict], Optional[str]]] = []
+        self._lock = threading.Lock()
+        self.traces = TraceLog()
+        self.stage_seconds = self.histogram("stage_seconds", "Duration of pipeline stages", ("stage",))
+        self.stage_errors = self.counter("stage_errors_total", "Pipeline stages that raised", ("stage",))
+
+    @classmethod
+    def shared(cls) -> "MetricsRegistry":
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def _get(self, cls, name: str, *args):
+        name = f"{self.namespace}_{name}"
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, *args)
+            return self._metrics[name]
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get(Counter, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, labelnames, buckets)
+
+    def register_stats(self, prefix: str, collect: Callable[[], dict], instance_label: Optional[str] = None) -> None:
+        """
+        Export the numeric leaves of collect() as `<namespace>_<prefix>_<key>`
+        gauges. With `instance_label`, collect() returns {instance: stats}
+        and the instance becomes that label.
+        """
+        self._collectors.append((prefix, collect, instance_label))
+
+    def observe_stage(self, stage: str, seconds: float, error: Optional[BaseException] = None,
+                      started: Optional[float] = None) -> None:
+        self.stage_seconds.observe(seconds, stage=stage)
+        if error is not None:
+            self.stage_errors.inc(stage=stage)
+        trace_id = trace_id_var.get()
+        if trace_id is not None:
+            self.traces.add(trace_id, stage, started if started is not None else time.time() - seconds, seconds,
+                            type(error).__name__ if error is not None else None)
+
+    def _collected(self) -> List[str]:
+        gauges: "OrderedDict[str, list]" = OrderedDict()
+
+        def walk(name: str, value, labels: tuple) -> None:
+            if isinstance(value, dict):
+                for key, inner in value.items():
+                    walk(f"{name}_{_NAME_RE.sub('_', str(key))}", inner, labels)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                gauges.setdefault(name, []).append((labels, value))
+            elif isinstance(value, bool):
+                gauges.setdefault(name, []).append((labels, int(value)))
+
+        for prefix, collect, instance_label in list(self._collectors):
+            try:
+                stats = collect()
+            except Exception:
+                continue
+            base = f"{self.namespace}_{prefix}"
+            if instance_label is None:
+                walk(base, stats, ())
+            else:
+                for instance, inner in stats.items():
+                    walk(base, inner, ((instance_label, str(instance)),))
+
+        lines = []
+        for name, samples in gauges.items():
+            lines.append(f"# TYPE {name} gauge")
+            lines += [f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples]
+        return lines
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines += metric.render()
+        lines += self._collected()
+        return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def span(stage: str, registry: Optional[MetricsRegistry] = None) -> Iterator[None]:
+    """Time the block as `stage` in the stage histogram and the current trace."""
+    registry = registry or MetricsRegistry.shared()
+    started_wall = time.time()
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        registry.observe_stage(stage, time.perf_counter() - started, error, started_wall)
+
+
+def timed_iter(items: Iterable, stage: str, registry: Optional[MetricsRegistry] = None) -> Iterator:
+    """
+    Yield from `items`, recording only the time spent producing them (not
+    the consumer's) as one `stage` span once the iterator is exhausted.
+    """
+    registry = registry or MetricsRegistry.shared()
+    iterator = iter(items)
+    started_wall = time.time()
+    total = 0.0
+    error = None
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                total += time.perf_counter() - started
+                break
+            except Exception as e:
+                total += time.perf_counter() - started
+                error = e
+                raise
+            total += time.perf_counter() - started
+            yield item
+    finally:
+        registry.observe_stage(stage, total, error, started_wall)
+
+
+class TraceMiddleware:
+    """
+    ASGI middleware: every HTTP request and websocket gets a trace id (the
+    client's X-Trace-Id if sent), available as trace_id_var while it is
+    served and returned in the X-Trace-Id header. HTTP requests are counted
+    and timed until the last body chunk is sent.
+    """
+
+    HEADER = b"x-trace-id"
+
+    def __init__(self, app, registry: Optional[MetricsRegistry] = None):
+        self.app = app
+        self.registry = registry or MetricsRegistry.shared()
+        self.requests = self.registry.counter("http_requests_total", "HTTP requests and websockets served",
+                                              ("method", "path", "status"))
+        self.duration = self.registry.histogram("http_request_seconds", "Time to the last response byte",
+                                                ("method", "path"))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        incoming = dict(scope.get("headers") or []).get(self.HEADER)
+        trace_id = incoming.decode("latin-1")[:64] if incoming else new_trace_id()
+        token = trace_id_var.set(trace_id)
+        method = scope.get("method", "WS")
+        started = time.perf_counter()
+        status = {"code": None}
+
+        async def send_with_trace(message):
+            kind = message["type"]
+            if kind in ("http.response.start", "websocket.accept"):
+                message = dict(message)
+                message["headers"] = list(message.get("headers") or []) + [(self.HEADER, trace_id.encode("latin-1"))]
+                status["code"] = message.get("status", 101)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            # templated path keeps label cardinality bounded (/ingest/{job_id}, not every id)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            self.requests.inc(method=method, path=path, status=status["code"] or 500)
+            if scope["type"] == "http":
+                self.duration.observe(time.perf_counter() - started, method=method, path=path)
+            trace_id_var.reset(token)
@@ -0,0 +1,154 @@
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class MinHashIndex:
+    """
+    Near-duplicate detector for chunk texts: MinHash signatures of word
+    shingles, bucketed by LSH bands so a new text is only compared with the
+    stored texts that share at least one band. A text is a duplicate when
+    the estimated Jaccard similarity of its shingles to a stored text
+    reaches `threshold`.
+
+    With `bands` x `rows` = `num_perm`, texts at the threshold become
+    candidates with probability 1 - (1 - t^rows)^bands (~0.99 at 0.9 with
+    the defaults). Signatures persist as a flat binary file (no pickle);
+    the buckets are rebuilt on load.
+    """
+
+    # process-wide counters over every index, for /ingest/stats and /metrics
+    totals = {"checked": 0, "duplicates": 0, "seconds": 0.0}
+    _totals_lock = threading.Lock()
+
+    def __init__(self, threshold: float = float(os.getenv("DEDUP_THRESHOLD", "0.9")),
+                 num_perm: int = 64, bands: int = 8, shingle_words: int = 3, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError(f"bands={bands} must divide num_perm={num_perm}")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_words = shingle_words
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        # multiply-shift hash family: ((a * x + b) mod 2^64) >> 32, a odd
+        self._a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+        self._band_mix = rng.integers(1, 2 ** 63, size=self.rows, dtype=np.uint64) | np.uint64(1)
+        self.signatures = np.zeros((0, num_perm), dtype=np.uint32)
+        self._pending: list = []
+        # (band, band hash) -> positions with it
+        self._buckets: Dict[tuple, List[int]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.signatures) + len(self._pending)
+
+    def signature(self, text: str) -> np.ndarray:
+        words = _WORD_RE.findall(text.lower())
+        n = self.shingle_words
+        shingles = {" ".join(words[i:i + n]) for i in range(max(len(words) - n + 1, 1))}
+        x = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+        with np.errstate(over="ignore"):
+            hashed = (np.outer(x, self._a) + self._b) >> np.uint64(32)
+        return hashed.min(axis=0).astype(np.uint32)
+
+    def _band_hashes(self, signatures: np.ndarray) -> np.ndarray:
+        """(n, bands) hashes of each signature's bands."""
+        mixed = signatures.reshape(-1, self.bands, self.rows).astype(np.uint64) * self._band_mix
+        return mixed.sum(axis=2, dtype=np.uint64)
+
+    def _band_keys(self, signature: np.ndarray) -> list:
+        return list(enumerate(self._band_hashes(signature)[0].tolist()))
+
+    def _stored(self, position: int) -> np.ndarray:
+        if position < len(self.signatures):
+            return self.signatures[position]
+        return self._pending[position - len(self.signatures)]
+
+    def find(self, signature: np.ndarray) -> Optional[int]:
+        """Position of a stored near-duplicate of `signature`, or None."""
+        compared = set()
+        for key in self._band_keys(signature):
+            for position in self._buckets.get(key, ()):
+                if position in compared:
+                    continue
+                compared.add(position)
+                if np.mean(self._stored(position) == signature) >= self.threshold:
+                    return position
+        return None
+
+    def _add(self, signature: np.ndarray) -> int:
+        position = len(self)
+        self._pending.append(signature)
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, []).append(position)
+        return position
+
+    def add(self, texts: Iterable[str]) -> None:
+        """Store texts unconditionally (e.g. rebuilding from an existing index)."""
+        with self._lock:
+            for text in texts:
+                self._add(self.signature(text))
+
+    def check_and_add(self, text: str) -> bool:
+        """True if `text` near-duplicates a stored text; otherwise store it and return False."""
+        started = time.perf_counter()
+        signature = self.signature(text)
+        with self._lock:
+            duplicate = self.find(signature) is not None
+            if not duplicate:
+                self._add(signature)
+        with MinHashIndex._totals_lock:
+            MinHashIndex.totals["checked"] += 1
+            MinHashIndex.totals["duplicates"] += duplicate
+            MinHashIndex.totals["seconds"] += time.perf_counter() - started
+        return duplicate
+
+    def _compact(self) -> None:
+        if self._pending:
+            self.signatures = np.vstack([self.signatures, np.asarray(self._pending, dtype=np.uint32)])
+            self._pending = []
+
+    def save(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            self._compact()
+            self.signatures.tofile(os.path.join(path, "signatures.bin"))
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"threshold": self.threshold, "num_perm": self.num_perm, "bands": self.bands,
+                       "shingle_words": self.shingle_words, "seed": self.seed, "count": len(self)}, f)
+
+    @classmethod
+    def load(cls, path: str, threshold: float = float(os.getenv("DEDUP_THRESHOLD", "0.9"))) -> "MinHashIndex":
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        index = cls(threshold=threshold, num_perm=meta["num_perm"], bands=meta["bands"], shingle_words=meta["shingle_words"],
+                    seed=meta["seed"])
+        signatures = np.fromfile(os.path.join(path, "signatures.bin"), dtype=np.uint32)
+        index.signatures = signatures.reshape(-1, index.num_perm)
+        for position, hashes in enumerate(index._band_hashes(index.signatures).tolist()):
+            for key in enumerate(hashes):
+                index._buckets.setdefault(key, []).append(position)
+        return index
+
+    @classmethod
+    def all_stats(cls) -> dict:
+        with cls._totals_lock:
+            totals = dict(cls.totals)
+        return {
+            "checked": totals["checked"],
+            "duplicates": totals["duplicates"],
+            "duplicate_rate": round(totals["duplicates"] / totals["checked"], 4) if totals["checked"] else 0.0,
+            "avg_check_us": round(1e6 * totals["seconds"] / totals["checked"], 2) if totals["checked"] else 0.0,
+        }
@@ -0,0 +1,176 @@
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+def _current_rss() -> int:
+    """Return the resident set size of this process in bytes (0 if unknown)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        pass
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is bytes on macOS and kilobytes on Linux
+        return rss if sys.platform == "darwin" else rss * 1024
+    except Exception:
+        return 0
+
+
+def _parameter_bytes(model: Any) -> int:
+    """Best-effort size of a torch model's parameters and buffers."""
+    modules = [model]
+    for attr in ("client", "model", "_client"):
+        inner = getattr(model, attr, None)
+        if inner is not None:
+            modules.append(inner)
+            nested = getattr(inner, "model", None)
+            if nested is not None:
+                modules.append(nested)
+
+    for module in modules:
+        if hasattr(module, "parameters") and callable(module.parameters):
+            try:
+                total = sum(p.numel() * p.element_size() for p in module.parameters())
+                if hasattr(module, "buffers"):
+                    total += sum(b.numel() * b.element_size() for b in module.buffers())
+                if total:
+                    return total
+            except Exception:
+                continue
+    return 0
+
+
+@dataclass
+class ModelEntry:
+    kind: str
+    model_name: str
+    device: str
+    model: Any = None
+    load_seconds: float = 0.0
+    rss_delta_bytes: int = 0
+    param_bytes: int = 0
+    loaded_at: float = 0.0
+    hits: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "model_name": self.model_name,
+            "device": self.device,
+            "loaded": self.model is not None,
+            "load_seconds": round(self.load_seconds, 4),
+            "rss_delta_mb": round(self.rss_delta_bytes / (1024 * 1024), 2),
+            "param_mb": round(self.param_bytes / (1024 * 1024), 2),
+            "loaded_at": self.loaded_at,
+            "hits": self.hits,
+        }
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of heavy models (embeddings, cross-encoder, Whisper).
+    Models are loaded lazily on first use, once per (kind, model name, device),
+    and then shared read-only by every RAGPipeline, ChatBot and VoiceAgent.
+    """
+
+    _entries: Dict[Tuple[str, str, str], ModelEntry] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _resolve_device(device: Optional[str]) -> str:
+        if device:
+            return device
+        try:
+            import torch
+            return "cuda" if torch.cuda.is_available() else "cpu"
+        except ImportError:
+            return "cpu"
+
+    @classmethod
+    def get(cls, kind: str, model_name: str, loader: Callable[[str], Any],
+            device: Optional[str] = None) -> Any:
+        """
+        Return the shared model for (kind, model_name, device), loading it with
+        `loader(device)` the first time. Concurrent first calls for the same key
+        block on a per-key lock so the model is only ever loaded once.
+        """
+        device = cls._resolve_device(device)
+        key = (kind, model_name, device)
+
+        with cls._lock:
+            entry = cls._entries.get(key)
+            if entry is None:
+                entry = ModelEntry(kind=kind, model_name=model_name, device=device)
+                cls._entries[key] = entry
+
+        if entry.model is not None:
+            entry.hits += 1
+            return entry.model
+
+        with entry.lock:
+            if entry.model is None:
+                rss_before = _current_rss()
+                start = time.perf_counter()
+                model = loader(device)
+                entry.load_seconds = time.perf_counter() - start
+                entry.rss_delta_bytes = max(_current_rss() - rss_before, 0)
+                entry.param_bytes = _parameter_bytes(model)
+                entry.loaded_at = time.time()
+                entry.model = model
+            else:
+                entry.hits += 1
+        return entry.model
+
+    @classmethod
+    def get_embeddings(cls, model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+                       device: Optional[str] = None):
+        """Shared HuggingFaceEmbeddings instance."""
+        def load(dev: str):
+            from langchain_huggingface import HuggingFaceEmbeddings
+            return HuggingFaceEmbeddings(model_name=model_name, model_kwargs={"device": dev})
+        return cls.get("embeddings", model_name, load, device)
+
+    @classmethod
+    def get_cross_encoder(cls, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+                          device: Optional[str] = None):
+        """Shared sentence-transformers CrossEncoder instance."""
+        def load(dev: str):
+            from sentence_transformers import CrossEncoder
+            return CrossEncoder(model_name, device=dev)
+        return cls.get("cross_encoder", model_name, load, device)
+
+    @classmethod
+    def get_whisper(cls, model_name: str = "base", device: Optional[str] = None):
+        """Shared openai-whisper model."""
+        def load(dev: str):
+            import whisper
+            return whisper.load_model(model_name, device=dev)
+        return cls.get("whisper", model_name, load, device)
+
+    @classmethod
+    def stats(cls) -> list[dict]:
+        """Load time and memory footprint of every registered model."""
+        with cls._lock:
+            entries = list(cls._entries.values())
+        return [entry.stats() for entry in entries]
+
+    @classmethod
+    def clear(cls) -> None:
+        """Drop every cached model (mainly for tests and benchmarks)."""
+        with cls._lock:
+            cls._entries.clear()
+
+
+if __name__ == "__main__":
+    ModelRegistry.get_embeddings()
+    ModelRegistry.get_embeddings()
+    for s in ModelRegistry.stats():
+        print(s)
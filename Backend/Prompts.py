@@ -67,6 +67,25 @@ class ChatBotPrompts:
         return SystemMessagePromptTemplate.from_template("Below is list of your previous interact with user:"
         "this is only chat history do not mix this up with few shot examples")
 
+    @staticmethod
+    def direct_system_prompt() -> SystemMessagePromptTemplate:
+        return SystemMessagePromptTemplate.from_template(
+          """  You are a helpful AI assistant. 
+
+            - Answer the user directly in complete sentences, not json.  
+            - Always use the provided context when possible.  """
+        )
+
+    @staticmethod
+    def build_direct_prompt() -> ChatPromptTemplate:
+        """Prompt for a single LLM call without tools (no final_answer round trip)."""
+        return ChatPromptTemplate.from_messages([
+            ChatBotPrompts.direct_system_prompt(),
+            ChatBotPrompts.history_intro(),
+            MessagesPlaceholder(variable_name="chat_history"),
+            ChatBotPrompts.user_prompt(),
+        ])
+
     @staticmethod
     def build_prompt() -> ChatPromptTemplate:
         return ChatPromptTemplate.from_messages([
@@ -1,13 +1,73 @@
 # RAG.py
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain.schema import Document
-from rank_bm25 import BM25Okapi
-from sentence_transformers import CrossEncoder
+from langchain_core.embeddings import Embeddings
+import faiss
+import numpy as np
 import os
+import threading
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional
 
+from BM25Index import BM25Index, reciprocal_rank_fusion
+from ContextBuilder import ContextBuilder
 from DocReader import DocumentReader
+from EmbeddingCache import CachedEmbeddings, EmbeddingCache
+from Metrics import span
+from MinHashIndex import MinHashIndex
+from IndexStore import (ChatIndexStore, SQLiteDocstore, VectorFile, has_index, read_index, read_meta,
+                        write_index, write_meta)
+from ModelRegistry import ModelRegistry
+from VectorIndex import (IndexConfig, IndexManager, apply_search_params, exact_rescore, index_precision,
+                         is_lossy, reconstruct_all)
+from Reranker import RerankService
+from RetrievalCache import RetrievalCache
+from RetrievalExecutor import RetrievalCancelled, RetrievalExecutor
+
+
+@dataclass
+class IngestProgress:
+    """Progress of a streaming ingest, reported after every embedded batch."""
+    texts_done: int = 0
+    texts_total: Optional[int] = None
+    chunks_done: int = 0
+    # chunks skipped as near-duplicates of the chat's chunks
+    duplicates: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def fraction(self) -> Optional[float]:
+        if not self.texts_total:
+            return None
+        return min(self.texts_done / self.texts_total, 1.0)
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks_done / self.elapsed if self.elapsed > 0 else 0.0
+
+
+@dataclass
+class SearchHit:
+    """One ranked chunk of search_batch() with the score of every retrieval stage."""
+    document: Document
+    rerank_score: float
+    # FAISS distance (lower is closer for L2); None if only BM25 found the chunk
+    dense_score: Optional[float] = None
+    # BM25 score; None if only the dense search found the chunk
+    lexical_score: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "text": self.document.page_content,
+            "metadata": self.document.metadata,
+            "rerank_score": self.rerank_score,
+            "dense_score": self.dense_score,
+            "lexical_score": self.lexical_score,
+        }
 
 
 class RAGPipeline:
@@ -18,125 +78,648 @@ class RAGPipeline:
     - Store in vector database
     - Run similarity search
     - Provide context retrieval for pipeline wiring
+
+    With a chat_id the pipeline persists to its own directory in a
+    ChatIndexStore, loads lazily on first query and can be unloaded when idle.
     """
 
     def __init__(self, embedding_model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
-                 chunk_size: int = 500, chunk_overlap: int = 50):
-        # Initialize Hugging Face embeddings
-        self.embedding_model = HuggingFaceEmbeddings(model_name=embedding_model_name)
+                 chunk_size: int = 500, chunk_overlap: int = 50,
+                 reranker_model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+                 device: str | None = None, embeddings: Embeddings | None = None,
+                 rrf_k: int = 60, index_config: IndexConfig | None = None,
+                 use_embedding_cache: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "1") == "1",
+                 chat_id: str | None = None, store: ChatIndexStore | None = None,
+                 use_retrieval_cache: bool = os.getenv("RETRIEVAL_CACHE_ENABLED", "1") == "1",
+                 context_builder: ContextBuilder | None = None,
+                 dedup: bool = os.getenv("INGEST_DEDUP", "1") == "1"):
+        # Hugging Face embeddings are shared process-wide through the registry
+        base_embeddings = embeddings or ModelRegistry.get_embeddings(embedding_model_name, device=device)
+        if use_embedding_cache:
+            # chunk vectors are content-addressed, so re-ingesting known text skips the model
+            cache_name = embedding_model_name if embeddings is None else \
+                getattr(embeddings, "model_name", type(embeddings).__name__)
+            self.embedding_model = CachedEmbeddings(base_embeddings, EmbeddingCache.shared(cache_name))
+        else:
+            self.embedding_model = base_embeddings
+        self.reranker_model_name = reranker_model_name
+        self.device = device
 
         # Setup text splitter
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
-            separators=["\n\n", "\n", ".", " ", ""]
+            separators=["\n\n", "\n", ".", " ", ""],
+            # chunk offsets let the ContextBuilder merge overlapping neighbours
+            add_start_index=True,
         )
         self.document_reader = DocumentReader()
         self.vectorstore: FAISS | None = None
+        # corpus-wide lexical index; doc ids match positions in the FAISS index
+        self.bm25 = BM25Index()
+        self.rrf_k = rrf_k
+        # picks flat / HNSW / IVF / IVF-PQ by corpus size and migrates between them
+        self.index_manager = IndexManager(index_config)
+        # float32 copy of the vectors when the index stores less precision
+        self.exact_vectors: VectorFile | None = None
+        # whether exact_vectors was repaired against the index since it was
+        # opened; a load without the writer lock must leave the file alone
+        self._exact_synced = True
+        # set while this pipeline holds the chat's writer lock
+        self._writing = False
+        # near-duplicate chunks are skipped at ingest; the MinHash index is
+        # only held in memory while ingesting into a persisted chat
+        self.dedup_enabled = dedup
+        self.dedup: MinHashIndex | None = None
+        # guards the FAISS store against concurrent ingest workers and queries
+        self._lock = threading.RLock()
+        # per-chat namespace on disk; None keeps the index purely in memory
+        self.chat_id = chat_id
+        self.store = store or (ChatIndexStore() if chat_id else None)
+        self.path = self.store.path_for(chat_id) if chat_id else None
+        self._dirty = False
+        self._mmapped = False
+        self.last_used = time.monotonic()
+        # bumped by every ingested batch or reload; invalidates the retrieval cache
+        self.generation = 0
+        # registry version of the saved index this pipeline holds (see ChatIndexStore)
+        self.index_version = 0
+        self.retrieval_cache = RetrievalCache() if use_retrieval_cache else None
+        self.context_builder = context_builder or ContextBuilder.shared()
     
     def read(self, path: str) -> list[str]:
         """Read document from path and return list of text chunks."""
         file_path = os.path.abspath(path)
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File not found: {file_path}") 
-        # Use DocumentReader to read the file
-        self.ingest(self.document_reader.read(file_path))
+        # Use DocumentReader to stream the file page by page
+        self.ingest_stream(self.document_reader.iter_read(file_path), source=os.path.basename(file_path))
 
-    def ingest(self, raw_texts: list[str] ,save:bool=False) -> None:
+    def ingest(self, raw_texts: list[str] ,save:bool=False,
+               on_progress: Optional[Callable[[IngestProgress], None]] = None,
+               batch_size: int = 64, source: Optional[str] = None) -> IngestProgress:
         """Takes list of raw texts, splits into chunks, and stores in FAISS vectorstore."""
+        return self.ingest_stream(raw_texts, save=save, on_progress=on_progress, batch_size=batch_size,
+                                  source=source)
+
+    def ingest_stream(self, texts: Iterable[str], save: bool = False,
+                      on_progress: Optional[Callable[[IngestProgress], None]] = None,
+                      batch_size: int = 64, total: Optional[int] = None,
+                      source: Optional[str] = None) -> IngestProgress:
+        """Streaming ingest: texts -> splitter -> fixed-size embedding batches -> vectorstore.
+
+        Texts (e.g. a DocumentReader.iter_read stream) are consumed one at a
+        time and every batch of `batch_size` chunks is embedded and added as
+        soon as it is full, so memory stays bounded by one text plus one batch
+        and earlier chunks are searchable while later pages are still parsed.
+        `on_progress` receives an IngestProgress after each batch.
+
+        Every chunk records `source`, the index of its text (`part`) and its
+        `start_index` within that text. Chunks that near-duplicate one already
+        in the chat or earlier in the upload (repeated headers, footers,
+        disclaimers) are skipped before embedding; see MinHashIndex.
+        """
+        if total is None:
+            total = getattr(texts, "total", None)
+        if total is None and hasattr(texts, "__len__"):
+            total = len(texts)
+        if self.store is not None:
+            # one writer per chat across worker processes, so no save is lost;
+            # only the writer may truncate or rewrite the chat's vectors.f32
+            with self.store.writer_lock(self.chat_id):
+                self._writing = True
+                try:
+                    return self._ingest_stream(texts, save, on_progress, batch_size, total, source)
+                finally:
+                    self._writing = False
+        return self._ingest_stream(texts, save, on_progress, batch_size, total, source)
+
+    def _ingest_stream(self, texts: Iterable[str], save: bool,
+                       on_progress: Optional[Callable[[IngestProgress], None]],
+                       batch_size: int, total: Optional[int], source: Optional[str]) -> IngestProgress:
+        with self._lock:
+            self._ensure_loaded(writable=True)
+            if self.vectorstore is not None and not self._exact_synced:
+                # opened by a query: line vectors.f32 up with the index before appending
+                self._replace_exact_vectors(self._open_exact_vectors(self.path, self.vectorstore.index, True))
+                self._exact_synced = True
+            dedup = self._dedup_index() if self.dedup_enabled else None
+
+        progress = IngestProgress(texts_total=total)
+        started = time.perf_counter()
+
+        def flush(batch: list[Document]) -> None:
+            self._add_batch([d.page_content for d in batch], [d.metadata for d in batch])
+            progress.chunks_done += len(batch)
+            progress.elapsed = time.perf_counter() - started
+            if on_progress:
+                on_progress(progress)
 
-        if os.path.exists("faiss_index") and save:
-            self.load("faiss_index")
+        batch: list[Document] = []
+        parts = 0
+        try:
+            for part, text in enumerate(texts):
+                with span("split"):
+                    chunks = self.text_splitter.create_documents([text], [{"source": source, "part": part}])
+                if dedup is not None:
+                    with span("dedup"):
+                        kept = [chunk for chunk in chunks if not dedup.check_and_add(chunk.page_content)]
+                    progress.duplicates += len(chunks) - len(kept)
+                    chunks = kept
+                for chunk in chunks:
+                    batch.append(chunk)
+                    if len(batch) >= batch_size:
+                        flush(batch)
+                        batch = []
+                parts = part + 1
+                # blank pages a TextStream skipped count as done too
+                progress.texts_done = parts + getattr(texts, "skipped", 0)
+            progress.texts_done = parts + getattr(texts, "skipped", 0)
+            if batch:
+                flush(batch)
+            elif on_progress:
+                progress.elapsed = time.perf_counter() - started
+                on_progress(progress)
+        except BaseException:
+            # signatures of chunks that never reached the index would make a
+            # retry skip them; the next ingest rebuilds from what was indexed
+            with self._lock:
+                self.dedup = None
+            raise
+        progress.elapsed = time.perf_counter() - started
+        if save and self.vectorstore is not None:
+            with span("index_save"):
+                self.save()
+        with self._lock:
+            if self.path and not self._dirty:
+                # saved with the index; reloaded by the next ingest
+                self.dedup = None
+        return progress
 
-        docs = [Document(page_content=t) for t in raw_texts]
-        chunks = self.text_splitter.split_documents(docs)
-        if self.vectorstore:
-            self.vectorstore.add_documents(chunks)
+    def _dedup_index(self) -> MinHashIndex:
+        """The chat's near-duplicate index: loaded from disk, or rebuilt from its chunks (caller holds the lock)."""
+        if self.dedup is not None:
+            return self.dedup
+        ntotal = self.vectorstore.index.ntotal if self.vectorstore is not None else 0
+        dedup = None
+        dedup_path = os.path.join(self.path, "minhash") if self.path else None
+        if ntotal and dedup_path and os.path.exists(os.path.join(dedup_path, "meta.json")):
+            dedup = MinHashIndex.load(dedup_path)
+            if len(dedup) != ntotal:
+                dedup = None
+        if dedup is None:
+            dedup = MinHashIndex()
+            if ntotal:
+                dedup.add(doc.page_content for doc in self._docs_at(list(range(ntotal))))
+        self.dedup = dedup
+        return dedup
+
+    def _add_batch(self, texts: list[str], metadatas: Optional[list[dict]] = None) -> None:
+        """Embed one batch of chunks and add it to the FAISS and BM25 indexes."""
+        with span("embed"):
+            vectors = self.embedding_model.embed_documents(texts)
+        with self._lock, span("index_add"):
+            # the index may have been unloaded between batches
+            self._ensure_loaded(writable=True)
+            if self.vectorstore is None:
+                self.vectorstore = self._new_vectorstore(len(vectors[0]))
+            self.vectorstore.add_embeddings(zip(texts, vectors), metadatas=metadatas)
+            if self.exact_vectors is not None:
+                matrix = np.asarray(vectors, dtype=np.float32)
+                if getattr(self.vectorstore, "_normalize_L2", False):
+                    faiss.normalize_L2(matrix)
+                self.exact_vectors.append(matrix)
+            self.bm25.add(texts)
+            self._dirty = True
+            self.generation += 1
+            index = self.vectorstore.index
+            migrated = self.index_manager.maybe_migrate(
+                index, self.exact_vectors.all if self.exact_vectors is not None else None)
+            if migrated is not None:
+                if self.exact_vectors is None and is_lossy(migrated) and not is_lossy(index):
+                    # e.g. IVF-Flat -> IVF-PQ: keep the exact vectors, so later
+                    # retraining does not start from lossy codes
+                    self.exact_vectors = VectorFile(
+                        os.path.join(self.path, ChatIndexStore.VECTORS_FILE) if self.path else None, index.d)
+                    self.exact_vectors.truncate(0)
+                    self.exact_vectors.append(reconstruct_all(index))
+                self.vectorstore.index = migrated
+
+    def _new_vectorstore(self, dim: int) -> FAISS:
+        """Empty FAISS store; chats keep their chunk texts in SQLite, not in memory."""
+        if self.path:
+            os.makedirs(self.path, exist_ok=True)
+            docstore = SQLiteDocstore(os.path.join(self.path, ChatIndexStore.CHUNKS_FILE))
         else:
-            self.vectorstore = FAISS.from_documents(chunks, self.embedding_model)
-        if save:
-            self.save("faiss_index")
+            docstore = InMemoryDocstore()
+        if self.index_manager.config.precision != "float32":
+            self.exact_vectors = VectorFile(
+                os.path.join(self.path, ChatIndexStore.VECTORS_FILE) if self.path else None, dim)
+            self.exact_vectors.truncate(0)
+        return FAISS(self.embedding_model, faiss.IndexFlatL2(dim), docstore, {})
 
-    def save(self, path: str = "faiss_index") -> None:
-        """Save FAISS index to disk."""
+    @property
+    def is_loaded(self) -> bool:
+        return self.vectorstore is not None
+
+    def save(self, path: str | None = None) -> None:
+        """Save FAISS index, chunk store and BM25 index (no pickle) to `path` or the chat's directory."""
         if not self.vectorstore:
             raise ValueError("No vectorstore to save. Run ingest() first.")
-        self.vectorstore.save_local(path)
+        path = path or self.path
+        if path is None:
+            raise ValueError("No path given and the pipeline has no chat_id.")
+        own = self.store is not None and path == self.path
+        with self._lock, (self.store.lock(self.chat_id) if own else nullcontext()):
+            os.makedirs(path, exist_ok=True)
+            write_index(self.vectorstore.index, os.path.join(path, ChatIndexStore.INDEX_FILE))
+            chunks_path = os.path.join(path, ChatIndexStore.CHUNKS_FILE)
+            docstore = self.vectorstore.docstore
+            if not (isinstance(docstore, SQLiteDocstore) and os.path.exists(chunks_path)
+                    and os.path.samefile(docstore.path, chunks_path)):
+                if os.path.exists(chunks_path):
+                    os.remove(chunks_path)
+                target = SQLiteDocstore(chunks_path)
+                ids = list(self.vectorstore.index_to_docstore_id.values())
+                target.add({doc_id: docstore.search(doc_id) for doc_id in ids})
+                docstore = target
+            docstore.write_positions(self.vectorstore.index_to_docstore_id)
+            vectors_path = os.path.join(path, ChatIndexStore.VECTORS_FILE)
+            if self.exact_vectors is not None and self.exact_vectors.path != vectors_path:
+                target = VectorFile(vectors_path, self.exact_vectors.dim)
+                target.truncate(0)
+                target.append(self.exact_vectors.all())
+            self.bm25.save(os.path.join(path, "bm25"))
+            if self.dedup is not None:
+                self.dedup.save(os.path.join(path, "minhash"))
+            write_meta(path, {
+                "ntotal": self.vectorstore.index.ntotal,
+                "dim": self.vectorstore.index.d,
+                "normalize_L2": bool(getattr(self.vectorstore, "_normalize_L2", False)),
+            })
+            if path == self.path:
+                self._dirty = False
+            if own:
+                self.index_version = self.store.registry.bump_index_version(self.chat_id, path)
 
-    def load(self, path: str = "faiss_index") -> None:
-        """Load FAISS index from disk."""
-        if not os.path.exists(path):
+    def load(self, path: str | None = None) -> None:
+        """Load a saved index from `path` or the chat's directory."""
+        path = path or self.path
+        if path is None or not has_index(path):
             raise FileNotFoundError(f"No FAISS index found at {path}")
-        self.vectorstore = FAISS.load_local(
-            path, self.embedding_model, allow_dangerous_deserialization=True
-        )
+        with self._lock:
+            self._load_from(path, writable=True)
+
+    def _load_from(self, path: str, writable: bool) -> None:
+        use_mmap = not writable and (self.store.use_mmap if self.store else True)
+        own = self.store is not None and path == self.path
+        # shared lock: another worker may be saving this chat right now
+        with (self.store.lock(self.chat_id, shared=True) if own else nullcontext()):
+            version = self.store.registry.index_version(self.chat_id) if own else 0
+            with span("index_load"):
+                index = read_index(os.path.join(path, ChatIndexStore.INDEX_FILE), use_mmap=use_mmap)
+            docstore = SQLiteDocstore(os.path.join(path, ChatIndexStore.CHUNKS_FILE))
+            meta = read_meta(path)
+            positions = docstore.read_positions()
+            bm25_path = os.path.join(path, "bm25")
+            bm25 = BM25Index.load(bm25_path) if os.path.exists(os.path.join(bm25_path, "meta.json")) else None
+            # another worker may be appending rows of an unsaved ingest
+            rewrite = writable and (not own or self._writing)
+            exact = self._open_exact_vectors(path, index, rewrite)
+        self._close_docstore()
+        self._replace_exact_vectors(exact)
+        self._exact_synced = rewrite
+        self.dedup = None
+        self.vectorstore = FAISS(self.embedding_model, index, docstore, positions,
+                                 normalize_L2=meta.get("normalize_L2", False))
+        apply_search_params(self.vectorstore.index, self.index_manager.config)
+        if bm25 is None:
+            # rebuild the lexical index in FAISS order
+            bm25 = BM25Index()
+            bm25.add(doc.page_content for doc in self._docs_at(list(range(index.ntotal))))
+        self.bm25 = bm25
+        self._mmapped = use_mmap
+        self._dirty = False
+        self.index_version = version
+        self.generation += 1
+
+    def _open_exact_vectors(self, path: str, index: faiss.Index, rewrite: bool) -> VectorFile | None:
+        """The saved float32 vectors of an index, if it keeps any or should.
+
+        Only with `rewrite` (no other writer can be appending) is the file
+        truncated, backfilled or removed to match the index.
+        """
+        vectors_path = os.path.join(path, ChatIndexStore.VECTORS_FILE)
+        if self.index_manager.config.precision == "float32" and not os.path.exists(vectors_path):
+            return None
+        exact = VectorFile(vectors_path, index.d)
+        if not rewrite:
+            return exact if len(exact) >= index.ntotal else None
+        if self.index_manager.config.precision == "float32" and not is_lossy(index):
+            # back at full precision: the copy is no longer needed
+            os.remove(vectors_path)
+            return None
+        if len(exact) > index.ntotal:
+            # rows of an ingest that was never saved
+            exact.truncate(index.ntotal)
+        elif len(exact) < index.ntotal:
+            if is_lossy(index):
+                return None
+            # a float32 index about to be stored at lower precision: keep its vectors first
+            exact.truncate(0)
+            exact.append(reconstruct_all(index))
+        return exact
+
+    def _replace_exact_vectors(self, exact: VectorFile | None) -> None:
+        if self.exact_vectors is not None and self.exact_vectors is not exact:
+            self.exact_vectors.close()
+        self.exact_vectors = exact
+
+    def _close_docstore(self) -> None:
+        if self.vectorstore is not None and isinstance(self.vectorstore.docstore, SQLiteDocstore):
+            self.vectorstore.docstore.close()
+
+    def _is_stale(self) -> bool:
+        """Another worker process saved a newer index of this chat."""
+        return self.store is not None and not self._dirty and \
+            self.store.registry.index_version(self.chat_id) != self.index_version
+
+    def _ensure_loaded(self, writable: bool = False) -> None:
+        """Lazily open the chat's index on first use (caller holds the lock)."""
+        self.last_used = time.monotonic()
+        if self.vectorstore is not None and self._is_stale():
+            if not has_index(self.path):
+                # deleted by another worker
+                self._close_docstore()
+                self.vectorstore = None
+                self.dedup = None
+                self.bm25 = BM25Index()
+                self.generation += 1
+                return
+            self._load_from(self.path, writable=writable or not self._mmapped)
+            return
+        if self.vectorstore is not None:
+            if writable and self._mmapped:
+                # memory-mapped indexes are read-only; reopen in memory before adding
+                self._load_from(self.path, writable=True)
+            return
+        if self.path and has_index(self.path):
+            self._load_from(self.path, writable=writable)
+
+    def unload(self) -> bool:
+        """Persist pending changes and drop the index from memory; it reloads lazily."""
+        with self._lock:
+            if self.vectorstore is None:
+                return False
+            if self._dirty:
+                if not self.path:
+                    return False
+                self.save()
+            self._close_docstore()
+            self.vectorstore = None
+            self.exact_vectors = None
+            self.dedup = None
+            self.bm25 = BM25Index()
+            self._mmapped = False
+            return True
+
+    def set_search_params(self, nprobe: int | None = None, ef_search: int | None = None) -> None:
+        """Tune search-time recall/latency: nprobe for IVF kinds, efSearch for HNSW."""
+        with self._lock:
+            if self.vectorstore:
+                self.index_manager.set_search_params(self.vectorstore.index, nprobe=nprobe, ef_search=ef_search)
+            else:
+                self.index_manager.config.nprobe = nprobe or self.index_manager.config.nprobe
+                self.index_manager.config.ef_search = ef_search or self.index_manager.config.ef_search
+
+    def index_info(self) -> dict:
+        """Current index kind, size and search knobs."""
+        return self.index_manager.describe(self.vectorstore.index if self.vectorstore else None)
+
+    def _docs_at(self, positions: list[int]) -> list[Document]:
+        """Documents stored at FAISS index positions."""
+        ids = [self.vectorstore.index_to_docstore_id[p] for p in positions]
+        docstore = self.vectorstore.docstore
+        if isinstance(docstore, SQLiteDocstore):
+            return docstore.search_many(ids)
+        return [docstore.search(doc_id) for doc_id in ids]
 
-    def query(self, question: str, k: int = 3, initial_k: int = 20):
+    def _embed_query(self, question: str) -> np.ndarray:
+        return np.asarray([self.embedding_model.embed_query(question)], dtype=np.float32)
+
+    def _dense_search(self, question: str, k: int, vector: np.ndarray | None = None) -> list[tuple[int, float]]:
+        """Embed the question (unless `vector` is given) and return (position, distance) pairs from FAISS."""
+        vector = self._embed_query(question) if vector is None else vector.copy()
+        distances, positions = self._search_vectors(vector, k)
+        return [(int(p), float(d)) for p, d in zip(positions[0], distances[0]) if p != -1]
+
+    def _search_vectors(self, vectors: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """FAISS search of query rows (normalized in place if the store is). A
+        reduced-precision index is over-fetched by rescore_factor and its
+        candidates re-ranked by exact distance to the float32 vectors."""
+        if getattr(self.vectorstore, "_normalize_L2", False):
+            faiss.normalize_L2(vectors)
+        index = self.vectorstore.index
+        config = self.index_manager.config
+        if self.exact_vectors is None or not config.rescores or index_precision(index) == "float32":
+            return index.search(vectors, k)
+        _, candidates = index.search(vectors, k * config.rescore_factor)
+        with span("rescore"):
+            return exact_rescore(vectors, candidates, self.exact_vectors.rows, k)
+
+    def query(self, question: str, k: int = 3, initial_k: int = 20,
+              cancel_event: threading.Event | None = None):
+        """Top-k documents of query_with_scores(), without their scores."""
+        return [doc for doc, _ in self.query_with_scores(question, k, initial_k, cancel_event)]
+
+    def query_with_scores(self, question: str, k: int = 3, initial_k: int = 20,
+                          cancel_event: threading.Event | None = None) -> list[tuple[Document, float]]:
         """Run hybrid search with reranking over the vectorstore.
         
         Pipeline:
-        1. Vector search to get initial candidates
-        2. BM25 search on those candidates
-        3. Cross-encoder reranking
+        1. Vector search over the FAISS index
+        2. BM25 search over the whole corpus-wide inverted index
+        3. Reciprocal rank fusion of both candidate lists
+        4. Cross-encoder reranking
+
+        Results are cached per index keyed by the query embedding, so a
+        question close enough to a recent one (see RetrievalCache) skips
+        steps 1-4 until the next ingest.
         
         Args:
             question: Query string
             k: Final number of results to return
             initial_k: Number of candidates to retrieve initially (should be > k)
+            cancel_event: When set (caller went away), stop before the next stage
         
         Returns:
-            List[Document]: List of Document objects with page_content attribute
+            List of (Document, rerank score) pairs, best first
+
+        Raises:
+            RetrievalCancelled: If cancel_event was set during retrieval
         """
-        if not self.vectorstore:
-            raise ValueError("Vectorstore not initialized. Run ingest() or load() first.")
-        
-        dense_results = self.vectorstore.similarity_search(question, k=initial_k)
+        def check_cancelled() -> None:
+            if cancel_event is not None and cancel_event.is_set():
+                raise RetrievalCancelled(question)
+
+        started = time.perf_counter()
+        with self._lock:
+            self._ensure_loaded()
+            if not self.vectorstore:
+                raise ValueError("Vectorstore not initialized. Run ingest() or load() first.")
+            generation = self.generation
+        with span("embed_query"):
+            vector = self._embed_query(question)
+        check_cancelled()
+        if self.retrieval_cache is not None:
+            cached = self.retrieval_cache.lookup(vector[0], (k, initial_k), generation)
+            if cached is not None:
+                return cached
+
+        with self._lock:
+            self._ensure_loaded()
+            with span("faiss_search"):
+                dense_hits = self._dense_search(question, initial_k, vector=vector)
+            with span("bm25_search"):
+                lexical_hits = self.bm25.search(question, initial_k)
+            fused = reciprocal_rank_fusion(
+                [[p for p, _ in dense_hits], [p for p, _ in lexical_hits]], k=self.rrf_k
+            )[:initial_k]
+            with span("docstore_fetch"):
+                candidate_docs = self._docs_at(fused)
         
-        if not dense_results:
+        if not candidate_docs:
             return []
-     
-        texts = [doc.page_content for doc in dense_results]
-        tokenized_corpus = [text.split(" ") for text in texts]
-        bm25 = BM25Okapi(tokenized_corpus)
-        tokenized_query = question.split(" ")
-        bm25_scores = bm25.get_scores(tokenized_query)
-        
-        scored_docs = [(doc, score) for doc, score in zip(dense_results, bm25_scores)]
-
-        scored_docs.sort(key=lambda x: x[1], reverse=True)
-        bm25_filtered_docs = [doc for doc, _ in scored_docs]
+        check_cancelled()
      
         if not hasattr(self, 'reranker'):
-            self.reranker = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
+            # shared service that micro-batches pairs across concurrent queries
+            self.reranker = RerankService.shared(self.reranker_model_name, device=self.device)
         
      
-        pairs = [[question, doc.page_content] for doc in bm25_filtered_docs]
-        rerank_scores = self.reranker.predict(pairs)
+        pairs = [[question, doc.page_content] for doc in candidate_docs]
+        with span("rerank"):
+            rerank_scores = self.reranker.predict(pairs)
         
        
-        reranked_docs = [(doc, score) for doc, score in zip(bm25_filtered_docs, rerank_scores)]
+        reranked_docs = [(doc, score) for doc, score in zip(candidate_docs, rerank_scores)]
         reranked_docs.sort(key=lambda x: x[1], reverse=True)
         
- 
-        return [doc for doc, _ in reranked_docs[:k]]
+        results = [(doc, float(score)) for doc, score in reranked_docs[:k]]
+        if self.retrieval_cache is not None:
+            self.retrieval_cache.store(vector[0], (k, initial_k), generation, results,
+                                       time.perf_counter() - started)
+        return results
 
-    async def _retrieve_context(self, inputs: dict, k: int = 3) -> dict:
-            """For pipeline: takes {'question': str}, injects retrieved context."""
+    def search_batch(self, questions: list[str], k: int = 3, initial_k: int = 20,
+                     cancel_event: threading.Event | None = None) -> list[list[SearchHit]]:
+        """Retrieval only, for many questions at once: the hybrid search of
+        query_with_scores() with every stage batched across the questions.
+
+        All questions are embedded in one model call and searched with one
+        FAISS call over the query matrix; candidate chunks are fetched from
+        the docstore once, and every (question, chunk) pair is reranked
+        through the shared reranker in batches of its size. The retrieval
+        cache is bypassed, so the stage scores are always fresh.
+
+        Returns:
+            Per question, its top-k SearchHits, best first
+
+        Raises:
+            RetrievalCancelled: If cancel_event was set during retrieval
+        """
+        def check_cancelled() -> None:
+            if cancel_event is not None and cancel_event.is_set():
+                raise RetrievalCancelled(f"{len(questions)} queries")
+
+        if not questions:
+            return []
+        with self._lock:
+            self._ensure_loaded()
             if not self.vectorstore:
-                self.load()
+                return [[] for _ in questions]
+        with span("embed_query"):
+            vectors = self._embed_queries(questions)
+        check_cancelled()
+
+        with self._lock:
+            self._ensure_loaded()
+            with span("faiss_search"):
+                distances, positions = self._search_vectors(vectors, initial_k)
+            dense = [{int(p): float(d) for p, d in zip(row_p, row_d) if p != -1}
+                     for row_p, row_d in zip(positions, distances)]
+            with span("bm25_search"):
+                lexical = [dict(self.bm25.search(question, initial_k)) for question in questions]
+            fused = [reciprocal_rank_fusion([list(d), list(l)], k=self.rrf_k)[:initial_k]
+                     for d, l in zip(dense, lexical)]
+            unique = list(dict.fromkeys(p for candidates in fused for p in candidates))
+            with span("docstore_fetch"):
+                docs = dict(zip(unique, self._docs_at(unique)))
+
+        pairs = [[question, docs[p].page_content] for question, candidates in zip(questions, fused)
+                 for p in candidates]
+        check_cancelled()
+        with span("rerank"):
+            scores = self._rerank_many(pairs)
+
+        results, offset = [], 0
+        for candidates, d, l in zip(fused, dense, lexical):
+            hits = [SearchHit(docs[p], score, d.get(p), l.get(p))
+                    for p, score in zip(candidates, scores[offset:offset + len(candidates)])]
+            offset += len(candidates)
+            hits.sort(key=lambda hit: hit.rerank_score, reverse=True)
+            results.append(hits[:k])
+        return results
+
+    def _embed_queries(self, questions: list[str]) -> np.ndarray:
+        """One model call for all questions. Queries skip the chunk embedding
+        cache; for symmetric models such as MiniLM a query embeds like a document."""
+        model = self.embedding_model.embeddings if isinstance(self.embedding_model, CachedEmbeddings) \
+            else self.embedding_model
+        return np.asarray(model.embed_documents(questions), dtype=np.float32)
+
+    def _rerank_many(self, pairs: list[list[str]]) -> list[float]:
+        """Score many pairs in reranker-sized batches, all queued at once."""
+        if not hasattr(self, 'reranker'):
+            self.reranker = RerankService.shared(self.reranker_model_name, device=self.device)
+        size = getattr(self.reranker, "max_batch_size", 0) or len(pairs) or 1
+        chunks = [pairs[start:start + size] for start in range(0, len(pairs), size)]
+        if hasattr(self.reranker, "submit"):
+            futures = [self.reranker.submit(chunk) for chunk in chunks]
+            return [float(s) for future in futures for s in future.result()]
+        return [float(s) for chunk in chunks for s in self.reranker.predict(chunk)]
+
+    def _retrieve(self, question: str, k: int = 3,
+                  cancel_event: threading.Event | None = None) -> list[tuple[Document, float]]:
+        """Scored candidates for the ContextBuilder: at least its `candidates` chunks."""
+        k = max(k, self.context_builder.candidates)
+        with span("retrieve"):
+            with self._lock:
+                self._ensure_loaded()
+                if not self.vectorstore:
+                    return []
+            return self.query_with_scores(question, k=k, cancel_event=cancel_event)
+
+    async def _retrieve_context(self, inputs: dict, k: int = 3) -> dict:
+            """For pipeline: takes {'question': str}, injects retrieved context.
+
+            Index loading and retrieval run on the shared RetrievalExecutor, so
+            the event loop keeps streaming other chats meanwhile. The
+            ContextBuilder merges, dedupes and packs the chunks into its token budget.
+            """
             query = inputs["question"]
-            docs = self.query(query, k=k) if self.vectorstore else []
-            context = "\n".join(d.page_content for d in docs)
+            scored_docs = await RetrievalExecutor.shared().run(self._retrieve, query, k=k)
+            with span("context_build"):
+                context, _ = self.context_builder.build(scored_docs)
             return {**inputs, "context": context}
 
 
 if __name__ == "__main__":
-    rag = RAGPipeline()
+    rag = RAGPipeline(chat_id="demo")
     print("RAG pipeline initialized with HuggingFace embeddings ✅")
     rag.ingest([
         "my name is hashir"
 
-        ])
-    rag.save()
+        ], save=True)
 
 
@@ -0,0 +1,151 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from ModelRegistry import ModelRegistry
+
+
+@dataclass
+class _RerankRequest:
+    pairs: Sequence[Sequence[str]]
+    future: Future = field(default_factory=Future)
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class RerankService:
+    """
+    Shared cross-encoder scoring service with cross-request micro-batching.
+
+    Concurrent callers submit their (query, passage) pairs; a single worker
+    thread gathers pending requests into one batch, bounded by `max_batch_size`
+    pairs and `max_wait_ms` of waiting, runs one forward pass and hands every
+    caller back its own slice of the scores.
+    """
+
+    _instances: Dict[Tuple[str, str], "RerankService"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, model_loader: Callable[[], Any],
+                 max_batch_size: int = int(os.getenv("RERANK_MAX_BATCH_SIZE", "128")),
+                 max_wait_ms: float = float(os.getenv("RERANK_MAX_WAIT_MS", "4"))):
+        self.model_loader = model_loader
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[_RerankRequest]" = queue.Queue()
+        self._carry: Optional[_RerankRequest] = None
+        self._last_batch_requests = 0
+        self._model = None
+        self._stats_lock = threading.Lock()
+        self._batch_sizes: deque = deque(maxlen=1000)
+        self._queue_waits: deque = deque(maxlen=1000)
+        self.batches = 0
+        self.requests = 0
+        self.pairs_scored = 0
+        self.busy_seconds = 0.0
+        self.started_at = time.time()
+        self._worker = threading.Thread(target=self._run, name="rerank-batcher", daemon=True)
+        self._worker.start()
+
+    @classmethod
+    def shared(cls, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+               device: Optional[str] = None) -> "RerankService":
+        """Process-wide service for a cross-encoder model from the ModelRegistry."""
+        key = (model_name, device or "")
+        with cls._instances_lock:
+            service = cls._instances.get(key)
+            if service is None:
+                service = cls(lambda: ModelRegistry.get_cross_encoder(model_name, device=device))
+                cls._instances[key] = service
+            return service
+
+    @classmethod
+    def all_stats(cls) -> dict:
+        """Batching metrics of every shared service keyed by model name."""
+        with cls._instances_lock:
+            services = dict(cls._instances)
+        return {f"{name}@{device or 'auto'}": service.stats() for (name, device), service in services.items()}
+
+    def submit(self, pairs: Sequence[Sequence[str]]) -> Future:
+        """Queue pairs for scoring; the future resolves to a list of floats."""
+        request = _RerankRequest(pairs=pairs)
+        if not pairs:
+            request.future.set_result([])
+        else:
+            self._queue.put(request)
+        return request.future
+
+    def predict(self, pairs: Sequence[Sequence[str]]) -> List[float]:
+        """Blocking drop-in for CrossEncoder.predict."""
+        return self.submit(pairs).result()
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            sizes = list(self._batch_sizes)
+            waits = sorted(self._queue_waits)
+            elapsed = max(time.time() - self.started_at, 1e-9)
+            return {
+                "batches": self.batches,
+                "requests": self.requests,
+                "pairs_scored": self.pairs_scored,
+                "avg_batch_pairs": round(sum(sizes) / len(sizes), 2) if sizes else 0.0,
+                "max_batch_pairs": max(sizes) if sizes else 0,
+                "avg_queue_wait_ms": round(1000 * sum(waits) / len(waits), 3) if waits else 0.0,
+                "p95_queue_wait_ms": round(1000 * waits[int(0.95 * (len(waits) - 1))], 3) if waits else 0.0,
+                "pairs_per_second": round(self.pairs_scored / elapsed, 2),
+                "busy_pairs_per_second": round(self.pairs_scored / self.busy_seconds, 2) if self.busy_seconds else 0.0,
+            }
+
+    def _next_batch(self) -> List[_RerankRequest]:
+        first = self._carry or self._queue.get()
+        self._carry = None
+        batch, size = [first], len(first.pairs)
+        # a lone caller should not pay max_wait: only linger when requests are
+        # already queued or the previous batch showed concurrent traffic
+        concurrent = self._last_batch_requests > 1 or not self._queue.empty()
+        deadline = time.perf_counter() + (self.max_wait if concurrent else 0.0)
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if size + len(request.pairs) > self.max_batch_size:
+                # keep requests whole; this one opens the next batch
+                self._carry = request
+                break
+            batch.append(request)
+            size += len(request.pairs)
+        self._last_batch_requests = len(batch)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            started = time.perf_counter()
+            pairs = [pair for request in batch for pair in request.pairs]
+            try:
+                if self._model is None:
+                    self._model = self.model_loader()
+                scores = self._model.predict(pairs, batch_size=len(pairs))
+                offset = 0
+                for request in batch:
+                    n = len(request.pairs)
+                    request.future.set_result([float(s) for s in scores[offset:offset + n]])
+                    offset += n
+            except Exception as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+            finished = time.perf_counter()
+            with self._stats_lock:
+                self.batches += 1
+                self.requests += len(batch)
+                self.pairs_scored += len(pairs)
+                self.busy_seconds += finished - started
+                self._batch_sizes.append(len(pairs))
+                self._queue_waits.extend(started - request.enqueued_at for request in batch)
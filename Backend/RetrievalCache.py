@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Hashable, List, Optional
+
+import numpy as np
+
+
+@dataclass
+class _CachedResult:
+    vector: np.ndarray          # unit-length query embedding
+    key: Hashable               # exact-match part of the key (k, initial_k, ...)
+    results: List[Any]
+    created_at: float
+    latency: float              # seconds the original retrieval took
+
+
+class RetrievalCache:
+    """
+    Semantic cache of retrieval results for one index, keyed by the query
+    embedding: a lookup hits when a cached query with the same `key` has
+    cosine similarity >= `threshold`, so paraphrases of a recent question
+    skip dense search, BM25 and reranking.
+
+    Bounded by LRU (`max_entries`) and TTL. Every entry belongs to an index
+    generation; ingesting bumps the generation and drops all entries.
+    """
+
+    _instances: "weakref.WeakSet[RetrievalCache]" = weakref.WeakSet()
+    _instances_lock = threading.Lock()
+
+    def __init__(self, threshold: float = float(os.getenv("RETRIEVAL_CACHE_THRESHOLD", "0.95")),
+                 max_entries: int = int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", "256")),
+                 ttl_seconds: float = float(os.getenv("RETRIEVAL_CACHE_TTL_SECONDS", "600"))):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.generation = 0
+        self._entries: "OrderedDict[int, _CachedResult]" = OrderedDict()
+        self._next_id = 0
+        # stacked unit vectors of _entries (in insertion order), rebuilt lazily
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_ids: List[int] = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.expired = 0
+        self.evictions = 0
+        self.latency_saved = 0.0
+        with self._instances_lock:
+            self._instances.add(self)
+
+    @classmethod
+    def all_stats(cls) -> dict:
+        """Totals over every live cache in this process."""
+        with cls._instances_lock:
+            caches = list(cls._instances)
+        totals = {"caches": len(caches), "entries": 0, "hits": 0, "misses": 0,
+                  "invalidations": 0, "latency_saved_ms": 0.0}
+        for cache in caches:
+            stats = cache.stats()
+            for name in ("entries", "hits", "misses", "invalidations", "latency_saved_ms"):
+                totals[name] += stats[name]
+        lookups = totals["hits"] + totals["misses"]
+        totals["hit_rate"] = round(totals["hits"] / lookups, 4) if lookups else 0.0
+        totals["latency_saved_ms"] = round(totals["latency_saved_ms"], 3)
+        return totals
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, vector, key: Hashable, generation: int) -> Optional[List[Any]]:
+        """Cached results for the most similar query above the threshold, else None."""
+        query = self._unit(vector)
+        with self._lock:
+            self._sync(generation)
+            self._expire()
+            best_id, best_score = None, self.threshold
+            if self._entries:
+                if self._matrix is None:
+                    self._matrix_ids = list(self._entries)
+                    self._matrix = np.stack([self._entries[i].vector for i in self._matrix_ids])
+                scores = self._matrix @ query
+                for row in np.argsort(-scores):
+                    if scores[row] < best_score:
+                        break
+                    entry_id = self._matrix_ids[row]
+                    if self._entries[entry_id].key == key:
+                        best_id, best_score = entry_id, scores[row]
+                        break
+            if best_id is None:
+                self.misses += 1
+                return None
+            entry = self._entries[best_id]
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            self.latency_saved += entry.latency
+            return list(entry.results)
+
+    def store(self, vector, key: Hashable, generation: int, results: List[Any], latency: float) -> None:
+        """Remember the results of a retrieval run against index `generation`."""
+        with self._lock:
+            self._sync(generation)
+            if generation != self.generation:
+                return
+            self._entries[self._next_id] = _CachedResult(
+                vector=self._unit(vector), key=key, results=list(results),
+                created_at=time.monotonic(), latency=latency)
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._matrix = None
+
+    def invalidate(self, generation: Optional[int] = None) -> None:
+        """Drop every entry; with a generation, also move the cache to it."""
+        with self._lock:
+            if generation is not None:
+                self.generation = generation
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._matrix = None
+
+    def _sync(self, generation: int) -> None:
+        # a newer index generation makes every cached result stale
+        if generation > self.generation:
+            self.generation = generation
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._matrix = None
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.ttl_seconds
+        # insertion order is not access order, so scan everything
+        stale = [entry_id for entry_id, entry in self._entries.items() if entry.created_at < cutoff]
+        for entry_id in stale:
+            del self._entries[entry_id]
+        if stale:
+            self.expired += len(stale)
+            self._matrix = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "generation": self.generation,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "latency_saved_ms": round(1000 * self.latency_saved, 3),
+            }
@@ -0,0 +1,176 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+
+class RetrievalCancelled(Exception):
+    """Raised inside a retrieval whose caller went away (e.g. client disconnect)."""
+
+
+class RetrievalExecutor:
+    """
+    Dedicated thread pool for retrieval (query embedding, FAISS, BM25 and
+    reranking) so that CPU work never runs on the event loop.
+
+    At most `max_concurrent` retrievals run at once; further callers wait
+    asynchronously. Cancelling the awaiting task sets the `cancel_event`
+    passed to the function, which checks it between stages.
+    """
+
+    _shared: Optional["RetrievalExecutor"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, max_workers: int = int(os.getenv("RETRIEVAL_MAX_WORKERS", "4")),
+                 max_concurrent: int = int(os.getenv("RETRIEVAL_MAX_CONCURRENT", "4"))):
+        self.max_workers = max_workers
+        self.max_concurrent = max_concurrent
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="retrieval")
+        # asyncio semaphores belong to one loop; tests and workers may run several
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = \
+            weakref.WeakKeyDictionary()
+        self._stats_lock = threading.Lock()
+        self._waits: deque = deque(maxlen=1000)
+        self._runtimes: deque = deque(maxlen=1000)
+        self.waiting = 0
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+
+    @classmethod
+    def shared(cls) -> "RetrievalExecutor":
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def _semaphore(self, loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+        with self._stats_lock:
+            if loop not in self._semaphores:
+                self._semaphores[loop] = asyncio.Semaphore(self.max_concurrent)
+            return self._semaphores[loop]
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Await fn(*args, cancel_event=<threading.Event>, **kwargs) on the pool."""
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphore(loop)
+        queued_at = time.perf_counter()
+        with self._stats_lock:
+            self.waiting += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            with self._stats_lock:
+                self.waiting -= 1
+        cancel_event = threading.Event()
+        with self._stats_lock:
+            self._waits.append(time.perf_counter() - queued_at)
+            self.active += 1
+
+        def call():
+            started = time.perf_counter()
+            ok = False
+            try:
+                result = fn(*args, cancel_event=cancel_event, **kwargs)
+                ok = True
+                return result
+            finally:
+                with self._stats_lock:
+                    self.active -= 1
+                    self._runtimes.append(time.perf_counter() - started)
+                    if ok:
+                        self.completed += 1
+                    elif not cancel_event.is_set():
+                        self.failed += 1
+                # the slot is only freed once the thread is really done
+                try:
+                    loop.call_soon_threadsafe(semaphore.release)
+                except RuntimeError:
+                    pass  # loop already closed
+
+        try:
+            # spans recorded by fn belong to the caller's trace
+            submitted = loop.run_in_executor(self.executor, contextvars.copy_context().run, call)
+        except BaseException:
+            with self._stats_lock:
+                self.active -= 1
+            semaphore.release()
+            raise
+        try:
+            return await submitted
+        except asyncio.CancelledError:
+            cancel_event.set()
+            with self._stats_lock:
+                self.cancelled += 1
+            raise
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            waits = sorted(self._waits)
+            runtimes = sorted(self._runtimes)
+            return {
+                "max_workers": self.max_workers,
+                "max_concurrent": self.max_concurrent,
+                "active": self.active,
+                "waiting": self.waiting,
+                "completed": self.completed,
+                "failed": self.failed,
+                "cancelled": self.cancelled,
+                "avg_wait_ms": round(1000 * sum(waits) / len(waits), 3) if waits else 0.0,
+                "p95_wait_ms": round(1000 * waits[int(0.95 * (len(waits) - 1))], 3) if waits else 0.0,
+                "avg_run_ms": round(1000 * sum(runtimes) / len(runtimes), 3) if runtimes else 0.0,
+                "p95_run_ms": round(1000 * runtimes[int(0.95 * (len(runtimes) - 1))], 3) if runtimes else 0.0,
+            }
+
+
+class EventLoopLagMonitor:
+    """
+    Measures event-loop responsiveness: a task sleeps `interval_ms` in a loop
+    and records how late it wakes up. Sustained lag means something is
+    blocking the loop and token streaming will stutter.
+    """
+
+    def __init__(self, interval_ms: float = float(os.getenv("LOOP_LAG_INTERVAL_MS", "100")),
+                 window: int = 600):
+        self.interval = interval_ms / 1000.0
+        self._samples: deque = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+        self.max_lag = 0.0
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(time.perf_counter() - started - self.interval, 0.0)
+            self._samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def stats(self) -> dict:
+        samples = sorted(self._samples)
+        return {
+            "interval_ms": round(1000 * self.interval, 3),
+            "samples": len(samples),
+            "avg_lag_ms": round(1000 * sum(samples) / len(samples), 3) if samples else 0.0,
+            "p50_lag_ms": round(1000 * samples[len(samples) // 2], 3) if samples else 0.0,
+            "p99_lag_ms": round(1000 * samples[int(0.99 * (len(samples) - 1))], 3) if samples else 0.0,
+            "max_lag_ms": round(1000 * self.max_lag, 3),
+        }
@@ -1,19 +1,173 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.messages import messages_from_dict
+
 from History import BufferWindowMessageHistory
+from HistoryStore import SQLiteHistoryStore
+from IndexStore import is_safe_id
+
 
 class SessionMemoryManager:
-    session_memory_map = {}  
+    """
+    Process-wide chat histories keyed by session id.
+    The map is bounded by LRU size and idle TTL. Every message is written
+    behind to the SQLiteHistoryStore, so evicting a history only drops it
+    from memory; the next access (or a restart) reloads it from the store.
+    A cached history that another worker process has written since is
+    reloaded too.
+
+    `get_session` is called on the event loop for every turn, so it only
+    touches memory: loading a history, and checking at most every
+    `version_check_seconds` whether another process wrote it, are deferred
+    to the history's next read (see BufferWindowMessageHistory.mark_stale),
+    which runs in a thread on the async path.
+    """
+    session_memory_map: "OrderedDict[str, BufferWindowMessageHistory]" = OrderedDict()
+    last_access: dict = {}
+    # session -> monotonic time its version was last checked against the store
+    last_checked: dict = {}
+    max_sessions = int(os.getenv("SESSION_MAX_ENTRIES", "1024"))
+    ttl_seconds = float(os.getenv("SESSION_TTL_SECONDS", "3600"))
+    # the store's write-behind already delays cross-process visibility by HISTORY_FLUSH_SECONDS
+    version_check_seconds = float(os.getenv("SESSION_VERSION_CHECK_SECONDS", "1.0"))
+    spill_dir = os.getenv("CHAT_SPILL_DIR", "chat_spill")
+    # optional rolling summary of evicted turns, e.g. History.LLMSummarizer
+    summarizer = None
+    stats = {"hits": 0, "misses": 0, "evictions": 0, "reloads": 0, "stale": 0}
+    _lock = threading.RLock()
+
+    @staticmethod
+    def store() -> SQLiteHistoryStore:
+        return SQLiteHistoryStore.shared()
 
     @staticmethod
     def get_session(session_id: str, k: int = 3):
-        if session_id not in SessionMemoryManager.session_memory_map:
-            SessionMemoryManager.session_memory_map[session_id] = BufferWindowMessageHistory(k=k)
-        return SessionMemoryManager.session_memory_map[session_id]
+        with SessionMemoryManager._lock:
+            now = time.monotonic()
+            history = SessionMemoryManager.session_memory_map.get(session_id)
+            if history is not None:
+                SessionMemoryManager.stats["hits"] += 1
+                SessionMemoryManager.session_memory_map.move_to_end(session_id)
+                checked = SessionMemoryManager.last_checked.get(session_id)
+                if checked is not None and now - checked >= SessionMemoryManager.version_check_seconds:
+                    history.mark_stale(SessionMemoryManager._check)
+            else:
+                SessionMemoryManager.stats["misses"] += 1
+                history = BufferWindowMessageHistory(k=k, summarizer=SessionMemoryManager.summarizer,
+                                                     store=SessionMemoryManager.store(), session_id=session_id)
+                history.mark_stale(SessionMemoryManager._load)
+                SessionMemoryManager.session_memory_map[session_id] = history
+            SessionMemoryManager.last_access[session_id] = now
+            SessionMemoryManager._enforce_limits(keep=session_id)
+            return history
 
     @staticmethod
     def clear_session(session_id: str):
-        if session_id in SessionMemoryManager.session_memory_map:
-            del SessionMemoryManager.session_memory_map[session_id]
+        with SessionMemoryManager._lock:
+            if session_id in SessionMemoryManager.session_memory_map:
+                del SessionMemoryManager.session_memory_map[session_id]
+            SessionMemoryManager.last_access.pop(session_id, None)
+            SessionMemoryManager.last_checked.pop(session_id, None)
+            SessionMemoryManager.store().delete(session_id)
+            path = SessionMemoryManager._legacy_path(session_id)
+            if path and os.path.exists(path):
+                os.remove(path)
 
     @staticmethod
     def clear_all():
-        SessionMemoryManager.session_memory_map.clear()
\ No newline at end of file
+        with SessionMemoryManager._lock:
+            SessionMemoryManager.session_memory_map.clear()
+            SessionMemoryManager.last_access.clear()
+            SessionMemoryManager.last_checked.clear()
+
+    @staticmethod
+    def spill(session_id: str) -> bool:
+        """Drop a session's history from memory; its messages are already in the store."""
+        with SessionMemoryManager._lock:
+            history = SessionMemoryManager.session_memory_map.pop(session_id, None)
+            SessionMemoryManager.last_access.pop(session_id, None)
+            SessionMemoryManager.last_checked.pop(session_id, None)
+            if history is None:
+                return False
+            SessionMemoryManager.stats["evictions"] += 1
+            return True
+
+    @staticmethod
+    def estimate_bytes(session_id: str) -> int:
+        """Rough in-memory size of a session's history."""
+        history = SessionMemoryManager.session_memory_map.get(session_id)
+        if history is None:
+            return 0
+        return sum(len(str(m.content)) + 256 for m in history.cached_messages)
+
+    @staticmethod
+    def get_stats() -> dict:
+        with SessionMemoryManager._lock:
+            return {**SessionMemoryManager.stats, "entries": len(SessionMemoryManager.session_memory_map),
+                    "store": SessionMemoryManager.store().stats()}
+
+    @staticmethod
+    def _legacy_path(session_id: str) -> str | None:
+        """Where histories were spilled as JSON before the SQLite store; None for ids that are not a plain name."""
+        if not is_safe_id(session_id):
+            return None
+        return os.path.join(SessionMemoryManager.spill_dir, session_id, "history.json")
+
+    @staticmethod
+    def _load(history: BufferWindowMessageHistory) -> None:
+        """Fill a new history from the store; runs on the history's first read."""
+        if SessionMemoryManager._reload(history.session_id, history):
+            with SessionMemoryManager._lock:
+                SessionMemoryManager.stats["reloads"] += 1
+
+    @staticmethod
+    def _check(history: BufferWindowMessageHistory) -> None:
+        """Reload a cached history if another process has written it since."""
+        session_id = history.session_id
+        if SessionMemoryManager.store().changed_elsewhere(session_id):
+            with SessionMemoryManager._lock:
+                SessionMemoryManager.stats["stale"] += 1
+            SessionMemoryManager._load(history)
+        else:
+            SessionMemoryManager._mark_checked(session_id, history)
+
+    @staticmethod
+    def _mark_checked(session_id: str, history: BufferWindowMessageHistory) -> None:
+        with SessionMemoryManager._lock:
+            # a spilled history is no longer the cached one
+            if SessionMemoryManager.session_memory_map.get(session_id) is history:
+                SessionMemoryManager.last_checked[session_id] = time.monotonic()
+
+    @staticmethod
+    def _reload(session_id: str, history: BufferWindowMessageHistory) -> bool:
+        messages, summary = SessionMemoryManager.store().load(session_id, limit=history.k)
+        legacy = SessionMemoryManager._legacy_path(session_id)
+        if not messages and legacy and os.path.exists(legacy):
+            # one-time migration of a JSON spill file into the store
+            with open(legacy, encoding="utf-8") as f:
+                messages = messages_from_dict(json.load(f).get("messages", []))
+            SessionMemoryManager.store().append(session_id, messages)
+            os.remove(legacy)
+        history.load(messages, summary)
+        SessionMemoryManager._mark_checked(session_id, history)
+        return bool(messages) or summary is not None
+
+    @staticmethod
+    def _enforce_limits(keep: str | None = None):
+        now = time.monotonic()
+        sessions = SessionMemoryManager.session_memory_map
+        for session_id in list(sessions.keys()):
+            if session_id == keep:
+                continue
+            idle = now - SessionMemoryManager.last_access.get(session_id, now)
+            if idle > SessionMemoryManager.ttl_seconds:
+                SessionMemoryManager.spill(session_id)
+        while len(sessions) > SessionMemoryManager.max_sessions:
+            oldest = next(iter(sessions))
+            if oldest == keep:
+                break
+            SessionMemoryManager.spill(oldest)
@@ -0,0 +1,184 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: locks only cover this process
+    fcntl = None
+
+
+class ChatLocks:
+    """
+    Per-chat locks shared by every worker process on the node: an flock on
+    `<directory>/<chat>.lock`, plus a reentrant in-process lock so threads of
+    one worker queue up and nested acquisitions do not deadlock.
+
+    Writers (ingest, save) lock exclusively; readers loading an index from
+    disk lock shared so they never see a half-written index.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._guard = threading.Lock()
+        self._locks: Dict[str, threading.RLock] = {}
+        # chat -> [fd, depth, exclusive] held by this process
+        self._held: Dict[str, list] = {}
+
+    def _thread_lock(self, name: str) -> threading.RLock:
+        with self._guard:
+            return self._locks.setdefault(name, threading.RLock())
+
+    @contextmanager
+    def hold(self, name: str, shared: bool = False) -> Iterator[None]:
+        lock = self._thread_lock(name)
+        with lock:
+            held = self._held.get(name)
+            if held is None:
+                fd = os.open(os.path.join(self.directory, f"{name}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+                held = self._held[name] = [fd, 0, not shared]
+            elif not shared and not held[2]:
+                # upgrade a shared hold of this thread to exclusive
+                if fcntl is not None:
+                    fcntl.flock(held[0], fcntl.LOCK_EX)
+                held[2] = True
+            held[1] += 1
+            try:
+                yield
+            finally:
+                held[1] -= 1
+                if held[1] == 0:
+                    del self._held[name]
+                    if fcntl is not None:
+                        fcntl.flock(held[0], fcntl.LOCK_UN)
+                    os.close(held[0])
+
+
+class ChatRegistry:
+    """
+    Node-wide record of chats in SQLite, shared by all worker processes:
+    where each chat's index lives and its index version, bumped by every
+    save so workers holding an older copy reload it; and ingest jobs, so any
+    worker can report a job another worker runs.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chats (chat_id TEXT PRIMARY KEY, index_path TEXT NOT NULL, "
+            "index_version INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ingest_jobs (job_id TEXT PRIMARY KEY, chat_id TEXT NOT NULL, "
+            "filename TEXT, status TEXT NOT NULL, progress REAL NOT NULL DEFAULT 0, chunks INTEGER NOT NULL DEFAULT 0, "
+            "chunks_per_second REAL NOT NULL DEFAULT 0, error TEXT, created_at REAL, started_at REAL, "
+            "finished_at REAL, pid INTEGER NOT NULL, duplicates INTEGER NOT NULL DEFAULT 0)"
+        )
+        if "duplicates" not in [row[1] for row in self._conn.execute("PRAGMA table_info(ingest_jobs)")]:
+            try:
+                self._conn.execute("ALTER TABLE ingest_jobs ADD COLUMN duplicates INTEGER NOT NULL DEFAULT 0")
+            except sqlite3.OperationalError:
+                pass  # another worker added it first
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ingest_jobs_chat ON ingest_jobs (chat_id, status)")
+        self._conn.commit()
+
+    def register(self, chat_id: str, index_path: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO chats (chat_id, index_path, created_at, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(chat_id) DO NOTHING", (chat_id, index_path, now, now))
+            self._conn.commit()
+
+    def index_version(self, chat_id: str) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT index_version FROM chats WHERE chat_id = ?", (chat_id,)).fetchone()
+        return row[0] if row else 0
+
+    def bump_index_version(self, chat_id: str, index_path: str) -> int:
+        """Record a new saved index; returns its version."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO chats (chat_id, index_path, index_version, created_at, updated_at) "
+                "VALUES (?, ?, 1, ?, ?) ON CONFLICT(chat_id) DO UPDATE SET "
+                "index_version = index_version + 1, index_path = excluded.index_path, updated_at = excluded.updated_at",
+                (chat_id, index_path, now, now))
+            version = self._conn.execute("SELECT index_version FROM chats WHERE chat_id = ?",
+                                         (chat_id,)).fetchone()[0]
+            self._conn.commit()
+        return version
+
+    def forget(self, chat_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM chats WHERE chat_id = ?", (chat_id,))
+            self._conn.commit()
+
+    def chats(self) -> List[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chat_id, index_path, index_version, created_at, updated_at FROM chats").fetchall()
+        return [dict(zip(("chat_id", "index_path", "index_version", "created_at", "updated_at"), r)) for r in rows]
+
+    _JOB_FIELDS = ("job_id", "chat_id", "filename", "status", "progress", "chunks", "duplicates",
+                   "chunks_per_second", "error", "created_at", "started_at", "finished_at")
+
+    def save_job(self, job: dict) -> None:
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO ingest_jobs ({', '.join(self._JOB_FIELDS)}, pid) "
+                f"VALUES ({', '.join('?' * (len(self._JOB_FIELDS) + 1))})",
+                [job.get(f) for f in self._JOB_FIELDS] + [os.getpid()])
+            self._conn.commit()
+
+    def job(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(self._JOB_FIELDS)}, pid FROM ingest_jobs WHERE job_id = ?",
+                                     (job_id,)).fetchone()
+        return self._job_dict(row) if row else None
+
+    def pending_jobs(self, chat_id: str) -> List[dict]:
+        """Queued or running jobs of chat_id in live worker processes."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(self._JOB_FIELDS)}, pid FROM ingest_jobs "
+                f"WHERE chat_id = ? AND status IN ('queued', 'running')", (chat_id,)).fetchall()
+        return [job for job in map(self._job_dict, rows) if job["status"] in ("queued", "running")]
+
+    def prune_jobs(self, finished_before: float) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM ingest_jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                               (finished_before,))
+            self._conn.commit()
+
+    def _job_dict(self, row) -> dict:
+        job = dict(zip(self._JOB_FIELDS, row[:-1]))
+        if job["status"] in ("queued", "running") and not _alive(row[-1]):
+            # the worker running it died
+            job["status"], job["error"] = "failed", "worker process exited"
+        return job
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -1,40 +1,214 @@
 import asyncio
-from typing import Any
-from langchain_core.callbacks.base import AsyncCallbackHandler
-from langchain_core.outputs import LLMResult
-
-
-class QueueCallbackHandler(AsyncCallbackHandler):
-    """Callback handler that puts tokens into an async queue for streaming."""
-
-    def __init__(self):
-        self.queue = asyncio.Queue()
-        self._done = False
-
-    async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
-        """Put new token in queue."""
-   
-        if token:  
-            await self.queue.put(token)
-
-    async def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
-        """Mark as done."""
-        self._done = True
-        await self.queue.put(None) 
-
-    async def on_llm_error(self, error: Exception, **kwargs: Any) -> None:
-        """Mark as done on error."""
-        self._done = True
-        await self.queue.put(None)
-
-    async def stream(self):
-        """Async generator that yields tokens as they arrive."""
-        while True:
-            token = await self.queue.get()
-            if token is None:  
-                break
-            yield token
-    def clear(self):
-        """Reset queue and done flag so the handler can be reused."""
-        self.queue = asyncio.Queue()
-        self._done = False
+import os
+import time
+import uuid
+from typing import AsyncIterator, Dict, List, Optional
+
+
+_END = object()
+
+
+class TokenSubscription:
+    """
+    One listener of a TokenChannel with its own bounded buffer.
+
+    With `backpressure` the producer waits while this buffer is full (used
+    for the client that asked the question), but no longer than
+    `stall_seconds`, in case the reader never starts; otherwise a listener
+    that falls `max_buffer` tokens behind is dropped so it cannot hold memory.
+    """
+
+    def __init__(self, channel: "TokenChannel", max_buffer: int, backpressure: bool,
+                 stall_seconds: float = float(os.getenv("TOKEN_STALL_SECONDS", "30"))):
+        self.channel = channel
+        self.max_buffer = max_buffer
+        self.backpressure = backpressure
+        self.stall_seconds = stall_seconds
+        self.closed = False
+        self.lagged = False
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._space = asyncio.Event()
+
+    async def _put(self, token: str) -> bool:
+        """Buffer a token; False if this subscriber is gone or was dropped."""
+        while self._queue.qsize() >= self.max_buffer:
+            if self.closed:
+                return False
+            if not self.backpressure:
+                self.lagged = True
+                return False
+            self._space.clear()
+            try:
+                await asyncio.wait_for(self._space.wait(), self.stall_seconds)
+            except asyncio.TimeoutError:
+                # e.g. the client left before the response started reading
+                self.lagged = True
+                return False
+        if self.closed:
+            return False
+        self._queue.put_nowait(token)
+        return True
+
+    def _end(self) -> None:
+        self._queue.put_nowait(_END)
+
+    def __aiter__(self):
+        return self.stream()
+
+    async def stream(self) -> AsyncIterator[str]:
+        """Tokens until the answer is complete; re-raises the producer's error."""
+        try:
+            while True:
+                token = await self._queue.get()
+                self._space.set()
+                if token is _END:
+                    break
+                yield token
+            error = self.channel.error
+            if error is not None and not self.lagged and not isinstance(error, asyncio.CancelledError):
+                raise error
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self._space.set()
+            self.channel._unsubscribe(self)
+
+
+class TokenChannel:
+    """
+    The token stream of one answer, produced by a single task and fanned out
+    to any number of subscribers (e.g. the HTTP client that asked and a
+    websocket watching live). Late subscribers first receive the text so far.
+
+    When the last subscriber goes away before the answer is complete, the
+    producer task is cancelled, which also cancels its pending retrieval.
+    """
+
+    def __init__(self, chat_id: str, max_buffer: int = int(os.getenv("TOKEN_CHANNEL_BUFFER", "256")),
+                 on_close=None):
+        self.id = uuid.uuid4().hex
+        self.chat_id = chat_id
+        self.max_buffer = max_buffer
+        self.created_at = time.time()
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.tokens = 0
+        self.dropped_subscribers = 0
+        self._parts: List[str] = []
+        self._subscribers: List[TokenSubscription] = []
+        self._task: Optional[asyncio.Task] = None
+        self._on_close = on_close
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def start(self, stream: AsyncIterator[str]) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._pump(stream))
+
+    def subscribe(self, backpressure: bool = False, replay: bool = True) -> TokenSubscription:
+        subscription = TokenSubscription(self, self.max_buffer, backpressure)
+        if replay and self._parts:
+            subscription._queue.put_nowait(self.text)
+        if self.done:
+            subscription._end()
+        else:
+            self._subscribers.append(subscription)
+        return subscription
+
+    async def _pump(self, stream: AsyncIterator[str]) -> None:
+        try:
+            async for token in stream:
+                self._parts.append(token)
+                self.tokens += 1
+                for subscription in list(self._subscribers):
+                    if not await subscription._put(token):
+                        if subscription.lagged:
+                            self.dropped_subscribers += 1
+                        self._unsubscribe(subscription, ended=True)
+        except asyncio.CancelledError:
+            self.error = asyncio.CancelledError("answer cancelled")
+        except Exception as e:
+            self.error = e
+        finally:
+            self._finish()
+
+    def _finish(self) -> None:
+        self.done = True
+        for subscription in self._subscribers:
+            subscription._end()
+        self._subscribers.clear()
+        if self._on_close is not None:
+            self._on_close(self)
+
+    def _unsubscribe(self, subscription: TokenSubscription, ended: bool = False) -> None:
+        if subscription in self._subscribers:
+            self._subscribers.remove(subscription)
+            if ended:
+                subscription._end()
+        if not self._subscribers and not self.done and self._task is not None:
+            # nobody is listening any more: stop generating
+            self._task.cancel()
+
+    def cancel(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    def info(self) -> dict:
+        return {
+            "answer_id": self.id,
+            "chat_id": self.chat_id,
+            "done": self.done,
+            "tokens": self.tokens,
+            "subscribers": len(self._subscribers),
+            "dropped_subscribers": self.dropped_subscribers,
+            "created_at": self.created_at,
+        }
+
+
+class TokenChannelRegistry:
+    """Answers currently being generated, by answer id and by chat_id."""
+
+    def __init__(self, max_buffer: int = int(os.getenv("TOKEN_CHANNEL_BUFFER", "256"))):
+        self.max_buffer = max_buffer
+        self._channels: Dict[str, TokenChannel] = {}
+        self.opened = 0
+        self.cancelled = 0
+
+    def open(self, chat_id: str, stream: AsyncIterator[str]) -> TokenChannel:
+        """Start producing `stream` into a new channel (call from the event loop)."""
+        channel = TokenChannel(chat_id, self.max_buffer, on_close=self._closed)
+        self._channels[channel.id] = channel
+        self.opened += 1
+        channel.start(stream)
+        return channel
+
+    def get(self, answer_id: str) -> Optional[TokenChannel]:
+        return self._channels.get(answer_id)
+
+    def latest(self, chat_id: str) -> Optional[TokenChannel]:
+        """The most recent answer still being generated for chat_id."""
+        live = [c for c in self._channels.values() if c.chat_id == chat_id]
+        return max(live, key=lambda c: c.created_at) if live else None
+
+    def _closed(self, channel: TokenChannel) -> None:
+        # finished answers are dropped right away; their text lives in the chat history
+        self._channels.pop(channel.id, None)
+        if isinstance(channel.error, asyncio.CancelledError):
+            self.cancelled += 1
+
+    def stats(self) -> dict:
+        return {
+            "active": len(self._channels),
+            "opened": self.opened,
+            "cancelled": self.cancelled,
+            "subscribers": sum(c.subscribers for c in self._channels.values()),
+            "buffered_tokens": sum(s._queue.qsize() for c in self._channels.values() for s in c._subscribers),
+        }
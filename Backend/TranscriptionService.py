@@ -0,0 +1,216 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+SAMPLE_RATE = 16000
+
+
+class TranscriptionQueueFull(Exception):
+    """Raised when the transcription queue is full and the caller chose not to wait."""
+
+
+# worker-process state: one Whisper model per process
+_worker_model = None
+
+
+def _init_worker(model_name: str, device: Optional[str]) -> None:
+    global _worker_model
+    from ModelRegistry import ModelRegistry
+    _worker_model = ModelRegistry.get_whisper(model_name, device=device)
+
+
+def _run_transcription(audio: np.ndarray, language: str, prompt: Optional[str]) -> Tuple[str, float, float]:
+    """Worker: returns (text, wall-clock start, inference seconds)."""
+    started_wall = time.time()
+    started = time.perf_counter()
+    result = _worker_model.transcribe(audio, language=language, fp16=False, initial_prompt=prompt or None)
+    return result.get("text", "").strip(), started_wall, time.perf_counter() - started
+
+
+class TranscriptionService:
+    """
+    Whisper inference on a pool of worker processes, each holding one loaded
+    model, so transcription never blocks the server process.
+
+    At most `workers + max_queue` requests are admitted at once. When full,
+    `submit` / `transcribe` either raise TranscriptionQueueFull or wait for
+    a slot, depending on `wait` (default from WHISPER_QUEUE_POLICY). If a
+    worker dies the pool is broken for good, so it is replaced; only the
+    requests it was running fail.
+    """
+
+    _instances: Dict[Tuple[str, Optional[str]], "TranscriptionService"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, model_name: str = "base", device: Optional[str] = None,
+                 workers: int = int(os.getenv("WHISPER_WORKERS", "1")),
+                 max_queue: int = int(os.getenv("WHISPER_MAX_QUEUE", "8")),
+                 wait: bool = os.getenv("WHISPER_QUEUE_POLICY", "reject") == "wait"):
+        self.model_name = model_name
+        self.device = device
+        self.workers = workers
+        self.max_queue = max_queue
+        self.wait = wait
+        self._executor_lock = threading.Lock()
+        self.executor = self._new_executor()
+        self._broken_executor: Optional[ProcessPoolExecutor] = None
+        self.restarts = 0
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._stats_lock = threading.Lock()
+        self._queue_waits: deque = deque(maxlen=1000)
+        self._inference: deque = deque(maxlen=1000)
+        self._rtf: deque = deque(maxlen=1000)
+        self.in_flight = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.audio_seconds = 0.0
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # spawn: CUDA and torch threads do not survive fork
+        return ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker, initargs=(self.model_name, self.device))
+
+    def _replace_broken(self, executor: ProcessPoolExecutor) -> None:
+        """Swap in a fresh pool once `executor` is broken (a worker died)."""
+        with self._executor_lock:
+            if self.executor is not executor:
+                return
+            # the broken pool's manager thread has already terminated its
+            # workers. Shutting it down, or dropping its last reference, from
+            # a callback on that thread would deadlock on its shutdown lock
+            self._broken_executor = executor
+            self.executor = self._new_executor()
+            self.restarts += 1
+
+    @classmethod
+    def shared(cls, model_name: str = "base", device: Optional[str] = None) -> "TranscriptionService":
+        key = (model_name, device)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(model_name, device)
+            return cls._instances[key]
+
+    @classmethod
+    def all_stats(cls) -> dict:
+        with cls._instances_lock:
+            services = dict(cls._instances)
+        return {f"{name}@{device or 'auto'}": service.stats() for (name, device), service in services.items()}
+
+    def _acquire(self, wait: bool, timeout: Optional[float]) -> None:
+        if not self._slots.acquire(blocking=wait, timeout=timeout if wait else None):
+            with self._stats_lock:
+                self.rejected += 1
+            raise TranscriptionQueueFull(
+                f"Transcription queue is full ({self.workers} workers, {self.max_queue} queued)")
+
+    def submit(self, audio: np.ndarray, language: str = "en", prompt: Optional[str] = None,
+               wait: Optional[bool] = None, timeout: Optional[float] = None) -> Future:
+        """
+        Queue 16 kHz mono float32 audio; the future resolves to the text.
+
+        Raises:
+            TranscriptionQueueFull: If no slot is free (immediately, or after `timeout` when waiting)
+        """
+        self._acquire(self.wait if wait is None else wait, timeout)
+        return self._submit_acquired(np.asarray(audio, dtype=np.float32), language, prompt)
+
+    async def transcribe(self, audio: np.ndarray, language: str = "en", prompt: Optional[str] = None,
+                         wait: Optional[bool] = None, timeout: Optional[float] = None) -> str:
+        """Awaitable version of submit(); waiting for a slot does not block the event loop."""
+        wait = self.wait if wait is None else wait
+        deadline = None if timeout is None else time.monotonic() + timeout
+        # poll instead of blocking a thread, so a cancelled caller never holds a slot
+        while not self._slots.acquire(blocking=False):
+            if not wait or (deadline is not None and time.monotonic() >= deadline):
+                with self._stats_lock:
+                    self.rejected += 1
+                raise TranscriptionQueueFull(
+                    f"Transcription queue is full ({self.workers} workers, {self.max_queue} queued)")
+            await asyncio.sleep(0.01)
+        return await asyncio.wrap_future(
+            self._submit_acquired(np.asarray(audio, dtype=np.float32), language, prompt))
+
+    def _submit_acquired(self, audio: np.ndarray, language: str, prompt: Optional[str]) -> Future:
+        submitted_at = time.time()
+        duration = len(audio) / SAMPLE_RATE
+        result: Future = Future()
+        executor = self.executor
+        try:
+            try:
+                inner = executor.submit(_run_transcription, audio, language, prompt)
+            except BrokenProcessPool:
+                self._replace_broken(executor)
+                executor = self.executor
+                inner = executor.submit(_run_transcription, audio, language, prompt)
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._stats_lock:
+            self.submitted += 1
+            self.in_flight += 1
+
+        def done(inner: Future) -> None:
+            self._slots.release()
+            if not inner.cancelled() and isinstance(inner.exception(), BrokenProcessPool):
+                self._replace_broken(executor)
+            with self._stats_lock:
+                self.in_flight -= 1
+                if inner.cancelled() or inner.exception() is not None:
+                    self.failed += 1
+                else:
+                    text, started_at, inference = inner.result()
+                    self.completed += 1
+                    self.audio_seconds += duration
+                    self._queue_waits.append(max(started_at - submitted_at, 0.0))
+                    self._inference.append(inference)
+                    if duration > 0:
+                        self._rtf.append(inference / duration)
+            if inner.cancelled():
+                result.cancel()
+            elif inner.exception() is not None:
+                result.set_exception(inner.exception())
+            else:
+                result.set_result(inner.result()[0])
+
+        inner.add_done_callback(done)
+        return result
+
+    def stats(self) -> dict:
+        def summary(values: deque, scale: float = 1000.0) -> dict:
+            values = sorted(values)
+            if not values:
+                return {"avg": 0.0, "p50": 0.0, "p95": 0.0}
+            return {
+                "avg": round(scale * sum(values) / len(values), 3),
+                "p50": round(scale * values[len(values) // 2], 3),
+                "p95": round(scale * values[int(0.95 * (len(values) - 1))], 3),
+            }
+
+        with self._stats_lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "policy": "wait" if self.wait else "reject",
+                "in_flight": self.in_flight,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "completed": self.completed,
+                "failed": self.failed,
+                "restarts": self.restarts,
+                "audio_seconds": round(self.audio_seconds, 3),
+                "queue_wait_ms": summary(self._queue_waits),
+                "inference_ms": summary(self._inference),
+                "real_time_factor": summary(self._rtf, scale=1.0),
+            }
@@ -0,0 +1,270 @@
+import math
+import os
+from dataclasses import dataclass
+from typing import Callable, Optional, Tuple
+
+import faiss
+import numpy as np
+
+
+INDEX_KINDS = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+PRECISIONS = ("float32", "float16", "int8")
+
+_SQ_TYPES = {"float16": faiss.ScalarQuantizer.QT_fp16, "int8": faiss.ScalarQuantizer.QT_8bit}
+
+
+@dataclass
+class IndexConfig:
+    """
+    FAISS index selection and search-time knobs for RAGPipeline.
+
+    kind: "auto", "flat", "hnsw", "ivf_flat" or "ivf_pq". With "auto" the kind
+    follows the corpus size through the *_threshold values, and the index is
+    migrated when the corpus crosses one of them.
+    """
+    kind: str = os.getenv("VECTOR_INDEX_KIND", "auto")
+    hnsw_threshold: int = 20_000
+    ivf_threshold: int = 200_000
+    ivfpq_threshold: int = 1_000_000
+    # HNSW
+    hnsw_m: int = 32
+    ef_construction: int = 200
+    ef_search: int = 128
+    # IVF / IVF-PQ
+    nlist: Optional[int] = None
+    nprobe: int = 16
+    pq_m: int = 16
+    pq_nbits: int = 8
+    # retrain IVF (and int8 ranges) once the corpus has grown this many times past its training size
+    retrain_growth: float = 4.0
+    # stored vector precision: "float32", "float16" or "int8" (scalar quantized
+    # per dimension); IVF-PQ is compressed already and ignores it
+    precision: str = os.getenv("VECTOR_PRECISION", "float32")
+    # below float32, search rescore_factor * k candidates and re-rank them by
+    # exact distance to the float32 vectors kept on disk; 0 disables
+    rescore_factor: int = int(os.getenv("VECTOR_RESCORE_FACTOR", "4"))
+
+    def __post_init__(self):
+        if self.kind != "auto" and self.kind not in INDEX_KINDS:
+            raise ValueError(f"Unknown index kind: {self.kind}. Supported: auto, {', '.join(INDEX_KINDS)}")
+        if self.precision not in PRECISIONS:
+            raise ValueError(f"Unknown vector precision: {self.precision}. Supported: {', '.join(PRECISIONS)}")
+
+    def precision_for(self, kind: str) -> str:
+        return "float32" if kind == "ivf_pq" else self.precision
+
+    @property
+    def rescores(self) -> bool:
+        return self.precision != "float32" and self.rescore_factor > 0
+
+    def choose_kind(self, n_vectors: int) -> str:
+        """Index kind to use for a corpus of n_vectors."""
+        if self.kind != "auto":
+            return self.kind
+        if n_vectors < self.hnsw_threshold:
+            return "flat"
+        if n_vectors < self.ivf_threshold:
+            return "hnsw"
+        if n_vectors < self.ivfpq_threshold:
+            return "ivf_flat"
+        return "ivf_pq"
+
+    def nlist_for(self, n_vectors: int) -> int:
+        if self.nlist:
+            return self.nlist
+        return int(min(max(4 * math.sqrt(n_vectors), 16), 65536))
+
+    def can_build(self, kind: str, n_vectors: int) -> bool:
+        """IVF kinds need enough vectors to train their coarse quantizer."""
+        if kind in ("ivf_flat", "ivf_pq"):
+            return n_vectors >= 39 * self.nlist_for(n_vectors)
+        return True
+
+
+def index_kind(index: faiss.Index) -> str:
+    """Classify a FAISS index into one of INDEX_KINDS."""
+    ivf = _try_extract_ivf(index)
+    if ivf is not None:
+        return "ivf_pq" if isinstance(ivf, faiss.IndexIVFPQ) else "ivf_flat"
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    return "flat"
+
+
+def index_precision(index: faiss.Index) -> str:
+    """Precision of the stored vectors: one of PRECISIONS (IVF-PQ counts as float32)."""
+    storage = _try_extract_ivf(index)
+    if storage is None:
+        storage = faiss.downcast_index(index.storage) if isinstance(index, faiss.IndexHNSW) else index
+    if isinstance(storage, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        for precision, qtype in _SQ_TYPES.items():
+            if storage.sq.qtype == qtype:
+                return precision
+    return "float32"
+
+
+def is_lossy(index: faiss.Index) -> bool:
+    """Whether an index cannot give its vectors back exactly (IVF-PQ or reduced precision)."""
+    return index_kind(index) == "ivf_pq" or index_precision(index) != "float32"
+
+
+def vector_bytes(index: faiss.Index) -> int:
+    """Approximate resident bytes of an index's vectors and graph links."""
+    ivf = _try_extract_ivf(index)
+    if ivf is not None:
+        # codes plus the id lists and direct map
+        return index.ntotal * (ivf.code_size + 16)
+    total = index.ntotal * index.d * {"float32": 4, "float16": 2, "int8": 1}[index_precision(index)]
+    if isinstance(index, faiss.IndexHNSW):
+        # about 2 * M neighbours on level 0, 4 bytes each
+        total += index.ntotal * 2 * index.hnsw.nb_neighbors(1) * 4
+    return total
+
+
+def _try_extract_ivf(index: faiss.Index):
+    try:
+        # extract_index_ivf returns the IndexIVF base; downcast so the
+        # IVF-PQ / scalar-quantizer subclasses can be told apart
+        return faiss.downcast_index(faiss.extract_index_ivf(index))
+    except Exception:
+        return None
+
+
+def build_index(kind: str, vectors: np.ndarray, config: IndexConfig) -> faiss.Index:
+    """Build (and train, for IVF kinds and int8) an L2 index of `kind` holding
+    `vectors` at the configured precision."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, d = vectors.shape
+    qtype = _SQ_TYPES.get(config.precision_for(kind))
+    if kind == "flat":
+        index = faiss.IndexFlatL2(d) if qtype is None else faiss.IndexScalarQuantizer(d, qtype)
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(d, config.hnsw_m) if qtype is None else \
+            faiss.IndexHNSWSQ(d, qtype, config.hnsw_m)
+        index.hnsw.efConstruction = config.ef_construction
+    elif kind in ("ivf_flat", "ivf_pq"):
+        nlist = config.nlist_for(n)
+        quantizer = faiss.IndexFlatL2(d)
+        if kind == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, d, nlist) if qtype is None else \
+                faiss.IndexIVFScalarQuantizer(quantizer, d, nlist, qtype)
+        else:
+            if d % config.pq_m:
+                raise ValueError(f"pq_m={config.pq_m} must divide the vector dimension {d}")
+            index = faiss.IndexIVFPQ(quantizer, d, nlist, config.pq_m, config.pq_nbits)
+        index.train(vectors)
+        # keeps reconstruct() available so the index can be migrated later
+        index.make_direct_map()
+    else:
+        raise ValueError(f"Unknown index kind: {kind}")
+    if not index.is_trained:
+        # int8 learns each dimension's range from the vectors
+        index.train(vectors)
+    if n:
+        index.add(vectors)
+    apply_search_params(index, config)
+    return index
+
+
+def apply_search_params(index: faiss.Index, config: IndexConfig,
+                        nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> None:
+    """Set nprobe / efSearch on the index (explicit values override the config)."""
+    ivf = _try_extract_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = nprobe or config.nprobe
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search or config.ef_search
+
+
+def exact_rescore(queries: np.ndarray, positions: np.ndarray, vectors_at: Callable[[np.ndarray], np.ndarray],
+                  k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Re-rank approximate candidates (positions, -1 for none) by exact squared
+    L2 distance to their float32 vectors, fetched with vectors_at(positions);
+    returns the best k per query as FAISS-style (distances, positions).
+    """
+    n = len(queries)
+    distances = np.full((n, k), np.inf, dtype=np.float32)
+    best = np.full((n, k), -1, dtype=np.int64)
+    for row in range(n):
+        candidates = positions[row][positions[row] >= 0]
+        if not len(candidates):
+            continue
+        exact = ((vectors_at(candidates) - queries[row]) ** 2).sum(axis=1)
+        order = np.argsort(exact, kind="stable")[:k]
+        distances[row, :len(order)] = exact[order]
+        best[row, :len(order)] = candidates[order]
+    return distances, best
+
+
+def reconstruct_all(index: faiss.Index) -> np.ndarray:
+    """All stored vectors in position order (lossy for IVF-PQ and reduced precision)."""
+    ivf = _try_extract_ivf(index)
+    if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+        ivf.make_direct_map()
+    if index.ntotal == 0:
+        return np.zeros((0, index.d), dtype=np.float32)
+    return index.reconstruct_n(0, index.ntotal)
+
+
+class IndexManager:
+    """
+    Tracks which kind of index a vectorstore should hold and migrates it
+    (rebuild from the stored vectors) when the corpus crosses a threshold,
+    its precision differs from the configured one, or an IVF or int8 index
+    has outgrown the data it was trained on.
+    """
+
+    def __init__(self, config: Optional[IndexConfig] = None):
+        self.config = config or IndexConfig()
+        self.trained_on = 0
+        self.migrations = 0
+
+    def maybe_migrate(self, index: faiss.Index,
+                      exact_vectors: Optional[Callable[[], np.ndarray]] = None) -> Optional[faiss.Index]:
+        """
+        Return a replacement index if one is due, else None. It is rebuilt
+        from exact_vectors() (all float32 vectors in position order) when
+        given, else from what the index itself stores.
+        """
+        n = index.ntotal
+        current = index_kind(index)
+        target = self.config.choose_kind(n)
+        if not self.config.can_build(target, n):
+            # not enough data to train IVF yet; the next smaller kind serves until then
+            target = "hnsw" if self.config.kind == "auto" else "flat"
+        precision = index_precision(index)
+        retrain = (current in ("ivf_flat", "ivf_pq") or precision == "int8") and target == current and \
+            self.trained_on and n >= self.config.retrain_growth * self.trained_on
+        if target == current and precision == self.config.precision_for(target) and not retrain:
+            if not self.trained_on:
+                self.trained_on = n
+            return None
+        vectors = exact_vectors() if exact_vectors is not None else None
+        if vectors is None or len(vectors) != n:
+            vectors = reconstruct_all(index)
+        new_index = build_index(target, vectors, self.config)
+        self.trained_on = n
+        self.migrations += 1
+        return new_index
+
+    def set_search_params(self, index: faiss.Index, nprobe: Optional[int] = None,
+                          ef_search: Optional[int] = None) -> None:
+        if nprobe:
+            self.config.nprobe = nprobe
+        if ef_search:
+            self.config.ef_search = ef_search
+        apply_search_params(index, self.config)
+
+    def describe(self, index: Optional[faiss.Index]) -> dict:
+        return {
+            "kind": index_kind(index) if index is not None else None,
+            "configured_kind": self.config.kind,
+            "ntotal": index.ntotal if index is not None else 0,
+            "nprobe": self.config.nprobe,
+            "ef_search": self.config.ef_search,
+            "precision": index_precision(index) if index is not None else self.config.precision,
+            "rescore_factor": self.config.rescore_factor if self.config.rescores else 0,
+            "vector_bytes": vector_bytes(index) if index is not None else 0,
+            "migrations": self.migrations,
+        }
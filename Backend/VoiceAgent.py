@@ -1,96 +1,92 @@
-import io
-import os
-import tempfile
+import asyncio
 
 import numpy as np
-import soundfile as sf      
-import librosa              
-import whisper              
+
+from AudioDecode import decode_audio, resample
+from Metrics import span
+from TranscriptionService import TranscriptionService
 
 class VoiceAgent:
-    def __init__(self, model_name: str = "base", device: str | None = None, debug: bool = False):
+    def __init__(self, model_name: str = "base", device: str | None = None, debug: bool = False,
+                 service: TranscriptionService | None = None):
         """
         model_name: tiny/base/small/medium/large
         device: "cuda" or "cpu" or None (auto)
         debug: prints audio shape/sr info
+        service: transcription worker pool (default: the shared one for model_name/device)
         """
         self.debug = debug
-       
-        if device:
-            self.model = whisper.load_model(model_name, device=device)
-        else:
-            self.model = whisper.load_model(model_name)
+        # Whisper runs in the service's worker processes, one model per worker
+        self.service = service or TranscriptionService.shared(model_name, device=device)
 
     def _decode_audio_bytes(self, audio_bytes: bytes, target_sr: int = 16000) -> np.ndarray:
         """
         Returns a 1-D float32 numpy array at target_sr (mono).
-        This tries soundfile on BytesIO first then falls back to writing a temp file.
+        Decoding happens in memory (WAV fast path, soundfile, or an ffmpeg pipe)
+        and resampling uses the shared polyphase filter; no temp files.
         """
-        buf = io.BytesIO(audio_bytes)
-   
-        try:
-            buf.name = "file.wav"
-        except Exception:
-            pass
-
-        try:
-            data, sr = sf.read(buf, dtype="float32")
-        except Exception:
-     
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
-                tmp.write(audio_bytes)
-                tmp_path = tmp.name
-            try:
-                data, sr = sf.read(tmp_path, dtype="float32")
-            finally:
-                try:
-                    os.unlink(tmp_path)
-                except Exception:
-                    pass
-
-    
-        if data.ndim > 1:
-            data = np.mean(data, axis=1)
-
-      
-        if sr != target_sr:
-            data = librosa.resample(data.astype(np.float32), orig_sr=sr, target_sr=target_sr)
-            sr = target_sr
-
-   
-        data = data.astype(np.float32).flatten()
-
-        if self.debug:
-            print(f"[VoiceAgent] decoded audio -> shape={data.shape}, sr={sr}, min={data.min():.5f}, max={data.max():.5f}")
+        with span("audio_decode"):
+            data = decode_audio(audio_bytes, target_sr=target_sr)
+
+        if self.debug and data.size:
+            print(f"[VoiceAgent] decoded audio -> shape={data.shape}, sr={target_sr}, min={data.min():.5f}, max={data.max():.5f}")
 
         return data
 
+    def _prepare_pcm(self, audio: np.ndarray, sample_rate: int) -> np.ndarray:
+        audio = np.asarray(audio, dtype=np.float32).flatten()
+        if sample_rate != 16000:
+            with span("resample"):
+                audio = resample(audio, sample_rate, 16000)
+        return audio
+
+    def transcribe_pcm(self, audio: np.ndarray, sample_rate: int = 16000, language: str = "en",
+                       prompt: str | None = None) -> str:
+        """
+        Transcribe float32 mono samples (e.g. one VAD segment of a stream).
+        prompt: previous transcript, passed to Whisper as initial_prompt for continuity.
+        Blocks the calling thread until a worker has finished.
+        """
+        audio = self._prepare_pcm(audio, sample_rate)
+        if audio.size == 0 or np.allclose(audio, 0.0):
+            return ""
+        with span("transcribe"):
+            return self.service.submit(audio, language=language, prompt=prompt).result()
+
     def transcribe_bytes(self, audio_bytes: bytes, language: str = "en") -> str:
         """
         Main entry: feed raw audio bytes (what you get from websocket) and get transcription.
         Returns transcription text.
         """
-        try:
-            audio = self._decode_audio_bytes(audio_bytes, target_sr=16000)
-           
-            if audio.size == 0 or np.allclose(audio, 0.0):
-                return ""
-
-           
-            result = self.model.transcribe(audio, language=language, fp16=False)
-            return result.get("text", "").strip()
-        except Exception as e:
-       
-            try:
-                with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
-                    tmp.write(audio_bytes)
-                    tmp_path = tmp.name
-                if self.debug:
-                    print("[VoiceAgent] fallback: using temp file for transcription:", tmp_path)
-                result = self.model.transcribe(tmp_path, language=language, fp16=False)
-                return result.get("text", "").strip()
-            finally:
-                try:
-                    os.unlink(tmp_path)
-                except Exception:
-                    pass
+        audio = self._decode_audio_bytes(audio_bytes, target_sr=16000)
+
+        if audio.size == 0 or np.allclose(audio, 0.0):
+            return ""
+
+        with span("transcribe"):
+            return self.service.submit(audio, language=language).result()
+
+    async def atranscribe_pcm(self, audio: np.ndarray, sample_rate: int = 16000, language: str = "en",
+                              prompt: str | None = None) -> str:
+        """Async transcribe_pcm; resampling runs in a thread and inference in the worker pool."""
+        audio = await asyncio.to_thread(self._prepare_pcm, audio, sample_rate)
+        if audio.size == 0 or np.allclose(audio, 0.0):
+            return ""
+        with span("transcribe"):
+            return await self.service.transcribe(audio, language=language, prompt=prompt)
+
+    async def atranscribe_bytes(self, audio_bytes: bytes, language: str = "en") -> str:
+        """
+        Async transcribe_bytes: decoding runs in a thread and inference in the
+        worker pool, so the event loop is never blocked.
+
+        Raises:
+            TranscriptionQueueFull: If the service queue is full (reject policy)
+        """
+        audio = await asyncio.to_thread(self._decode_audio_bytes, audio_bytes, 16000)
+
+        if audio.size == 0 or np.allclose(audio, 0.0):
+            return ""
+
+        with span("transcribe"):
+            return await self.service.transcribe(audio, language=language)
@@ -0,0 +1,208 @@
+import asyncio
+import os
+from collections import deque
+from typing import Awaitable, Callable, List, Optional, Union
+
+import numpy as np
+
+
+class EnergyVAD:
+    """
+    Energy-based voice-activity segmenter for 16-bit mono PCM.
+
+    Audio is cut into `frame_ms` frames; a frame is speech when its RMS is
+    above max(energy_threshold, noise_ratio * noise floor), where the noise
+    floor tracks the RMS of non-speech frames. A segment ends after
+    `min_silence_ms` of silence (or at `max_segment_seconds`) and is
+    returned as float32 samples in [-1, 1] at the input sample rate.
+    """
+
+    def __init__(self, sample_rate: int = 16000, frame_ms: int = 30,
+                 energy_threshold: float = float(os.getenv("VAD_ENERGY_THRESHOLD", "0.01")),
+                 noise_ratio: float = 3.0,
+                 min_speech_ms: int = 150,
+                 min_silence_ms: int = int(os.getenv("VAD_MIN_SILENCE_MS", "400")),
+                 max_segment_seconds: float = 15.0,
+                 pre_roll_ms: int = 150):
+        self.sample_rate = sample_rate
+        self.frame_samples = max(int(sample_rate * frame_ms / 1000), 1)
+        self.energy_threshold = energy_threshold
+        self.noise_ratio = noise_ratio
+        self.min_speech_frames = max(min_speech_ms // frame_ms, 1)
+        self.min_silence_frames = max(min_silence_ms // frame_ms, 1)
+        self.max_segment_frames = max(int(max_segment_seconds * 1000) // frame_ms, 1)
+        self.noise_floor = 0.0
+        self._pending = b""
+        self._pre_roll: deque = deque(maxlen=max(pre_roll_ms // frame_ms, 0))
+        self._segment: List[np.ndarray] = []
+        self._speech_frames = 0
+        self._silence_frames = 0
+        self.in_speech = False
+        self.segments = 0
+        self.speech_seconds = 0.0
+
+    def feed(self, pcm: bytes) -> List[np.ndarray]:
+        """Consume PCM bytes; return the segments completed by them."""
+        data = self._pending + pcm
+        frame_bytes = 2 * self.frame_samples
+        n_frames = len(data) // frame_bytes
+        self._pending = data[n_frames * frame_bytes:]
+        if not n_frames:
+            return []
+        samples = np.frombuffer(data, dtype="<i2", count=n_frames * self.frame_samples)
+        frames = samples.reshape(n_frames, self.frame_samples).astype(np.float32) / 32768.0
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        done = []
+        for frame, energy in zip(frames, rms):
+            segment = self._step(frame, float(energy))
+            if segment is not None:
+                done.append(segment)
+        return done
+
+    def flush(self) -> Optional[np.ndarray]:
+        """End of stream: return the speech collected so far, if any."""
+        segment = self._emit() if self.in_speech else None
+        self._pending = b""
+        self._pre_roll.clear()
+        return segment
+
+    def _step(self, frame: np.ndarray, energy: float) -> Optional[np.ndarray]:
+        is_speech = energy > max(self.energy_threshold, self.noise_ratio * self.noise_floor)
+        if not is_speech:
+            self.noise_floor = 0.95 * self.noise_floor + 0.05 * energy
+        if not self.in_speech:
+            if not is_speech:
+                self._pre_roll.append(frame)
+                return None
+            self.in_speech = True
+            self._segment = list(self._pre_roll)
+            self._pre_roll.clear()
+            self._speech_frames = 0
+            self._silence_frames = 0
+        self._segment.append(frame)
+        if is_speech:
+            self._speech_frames += 1
+            self._silence_frames = 0
+        else:
+            self._silence_frames += 1
+        if self._silence_frames >= self.min_silence_frames:
+            return self._emit()
+        if len(self._segment) >= self.max_segment_frames:
+            # long utterance without a pause: cut it and keep listening
+            segment = self._emit()
+            self.in_speech = True
+            return segment
+        return None
+
+    def _emit(self) -> Optional[np.ndarray]:
+        frames, speech = self._segment, self._speech_frames
+        self._segment = []
+        self._speech_frames = 0
+        self._silence_frames = 0
+        self.in_speech = False
+        if speech < self.min_speech_frames:
+            return None
+        self.segments += 1
+        audio = np.concatenate(frames)
+        self.speech_seconds += len(audio) / self.sample_rate
+        return audio
+
+
+class StreamingTranscriber:
+    """
+    Incremental transcription of a PCM stream: VAD segments are transcribed
+    one at a time, in order, off the event loop while audio keeps arriving.
+    After each segment `on_partial` receives the transcript so far; earlier
+    segments are never re-transcribed, so that text is a stable prefix. A
+    segment that fails (e.g. TranscriptionQueueFull) is skipped and its
+    error passed to `on_error`; later segments carry on.
+
+    At most `max_pending` segments wait for transcription: `feed` then
+    waits for the worker to catch up, so a client sending audio faster
+    than it can be transcribed is slowed down instead of growing the queue.
+
+    `transcribe(audio, prompt)` gets float32 samples at the input rate and
+    the transcript so far (useful as a Whisper initial prompt). It may be a
+    coroutine function; a plain function runs in the default executor.
+    """
+
+    def __init__(self, transcribe: Callable[[np.ndarray, str], Union[str, Awaitable[str]]], sample_rate: int = 16000,
+                 on_partial: Optional[Callable[[str], Awaitable[None]]] = None,
+                 vad: Optional[EnergyVAD] = None,
+                 on_error: Optional[Callable[[Exception], Awaitable[None]]] = None,
+                 max_pending: int = int(os.getenv("VOICE_MAX_PENDING_SEGMENTS", "4"))):
+        self.transcribe = transcribe
+        self.on_partial = on_partial
+        self.on_error = on_error
+        self.failed_segments = 0
+        self.max_pending = max_pending
+        self.stalls = 0
+        self.vad = vad or EnergyVAD(sample_rate=sample_rate)
+        self.texts: List[str] = []
+        self._queue: "asyncio.Queue[Optional[np.ndarray]]" = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+        self._space = asyncio.Event()
+
+    @property
+    def text(self) -> str:
+        return " ".join(self.texts)
+
+    def start(self) -> None:
+        if self._worker is None:
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+            # a cancelled or failed worker must not leave feed waiting for space
+            self._worker.add_done_callback(lambda _: self._space.set())
+
+    async def feed(self, pcm: bytes) -> None:
+        """Queue every segment completed by these PCM bytes for transcription,
+        waiting while `max_pending` segments are already queued."""
+        self.start()
+        for segment in self.vad.feed(pcm):
+            await self._put(segment)
+
+    async def _put(self, segment: np.ndarray) -> None:
+        while self._queue.qsize() >= self.max_pending:
+            if self._worker.done():
+                # nothing will transcribe it; finish() re-raises the worker's error
+                return
+            self.stalls += 1
+            self._space.clear()
+            await self._space.wait()
+        self._queue.put_nowait(segment)
+
+    async def finish(self) -> str:
+        """Transcribe the trailing segment and return the full transcript."""
+        self.start()
+        segment = self.vad.flush()
+        if segment is not None:
+            await self._put(segment)
+        self._queue.put_nowait(None)
+        await self._worker
+        return self.text
+
+    def cancel(self) -> None:
+        if self._worker is not None and not self._worker.done():
+            self._worker.cancel()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            segment = await self._queue.get()
+            self._space.set()
+            if segment is None:
+                return
+            try:
+                if asyncio.iscoroutinefunction(self.transcribe):
+                    text = await self.transcribe(segment, self.text)
+                else:
+                    text = await loop.run_in_executor(None, self.transcribe, segment, self.text)
+            except Exception as e:
+                self.failed_segments += 1
+                if self.on_error is not None:
+                    await self.on_error(e)
+                continue
+            text = (text or "").strip()
+            if text:
+                self.texts.append(text)
+                if self.on_partial is not None:
+                    await self.on_partial(self.text)
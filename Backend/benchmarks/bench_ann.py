@@ -0,0 +1,79 @@
+"""
+Recall-vs-latency report of the ANN index kinds against the flat baseline.
+
+Vectors are drawn from a Gaussian mixture of MiniLM's dimension (384), so
+no model is needed. Recall@k is measured against exact flat search.
+
+    python benchmarks/bench_ann.py --vectors 100000 --queries 500
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+import common  # noqa: F401  (sets up sys.path)
+from VectorIndex import IndexConfig, apply_search_params, build_index
+
+
+def clustered_vectors(n: int, d: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.normal(size=(clusters, d)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    return centers[labels] + 0.35 * rng.normal(size=(n, d)).astype(np.float32)
+
+
+def evaluate(index, queries: np.ndarray, truth: np.ndarray, k: int) -> dict:
+    start = time.perf_counter()
+    latencies = []
+    found = []
+    for q in queries:
+        t0 = time.perf_counter()
+        _, ids = index.search(q[None, :], k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        found.append(ids[0])
+    total = time.perf_counter() - start
+    recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+    return {
+        "recall_at_k": round(float(recall), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 4),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 4),
+        "qps": round(len(queries) / total, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    data = clustered_vectors(args.vectors, args.dim, 256, rng)
+    queries = clustered_vectors(args.queries, args.dim, 256, rng)
+    config = IndexConfig()
+
+    report = {"vectors": args.vectors, "dim": args.dim, "k": args.k, "results": []}
+    flat = build_index("flat", data, config)
+    _, truth = flat.search(queries, args.k)
+
+    sweeps = {"flat": [{}],
+              "hnsw": [{"ef_search": ef} for ef in (16, 32, 64, 128, 256)],
+              "ivf_flat": [{"nprobe": p} for p in (1, 4, 16, 64)],
+              "ivf_pq": [{"nprobe": p} for p in (1, 4, 16, 64)]}
+    for kind, knobs in sweeps.items():
+        start = time.perf_counter()
+        index = flat if kind == "flat" else build_index(kind, data, config)
+        build_seconds = time.perf_counter() - start
+        for knob in knobs:
+            apply_search_params(index, config, **knob)
+            row = {"kind": kind, **knob, "build_seconds": round(build_seconds, 2)}
+            row.update(evaluate(index, queries, truth, args.k))
+            report["results"].append(row)
+            print(json.dumps(row))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Decode + resample cost per second of audio for the in-memory VoiceAgent path.
+
+Builds a WAV clip (16-bit, stereo) at each input rate, then times
+AudioDecode.decode_audio down to 16 kHz. librosa is timed as a reference
+when it is installed.
+
+    python benchmarks/bench_audio.py [--seconds 10] [--rates 8000 44100 48000]
+"""
+import argparse
+import io
+import json
+import time
+import wave
+
+import numpy as np
+
+import common  # noqa: F401  (puts Backend/ on sys.path)
+
+from AudioDecode import decode_audio
+
+
+def make_wav(sample_rate: int, seconds: float, channels: int = 2) -> bytes:
+    rng = np.random.default_rng(0)
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    signal = 0.4 * np.sin(2 * np.pi * 220 * t) + 0.05 * rng.standard_normal(len(t))
+    samples = (np.repeat(signal[:, None], channels, axis=1) * 32767).astype("<i2")
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(samples.tobytes())
+    return buf.getvalue()
+
+
+def time_per_audio_second(fn, data: bytes, seconds: float, repeat: int) -> float:
+    fn(data)  # warm filter banks / imports
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(data)
+    return 1000 * (time.perf_counter() - start) / repeat / seconds
+
+
+def librosa_decode(data: bytes) -> np.ndarray:
+    import librosa
+    import soundfile as sf
+    audio, sr = sf.read(io.BytesIO(data), dtype="float32")
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    return librosa.resample(audio, orig_sr=sr, target_sr=16000)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--rates", type=int, nargs="+", default=[8000, 44100, 48000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    try:
+        import librosa  # noqa: F401
+        import soundfile  # noqa: F401
+        have_librosa = True
+    except ImportError:
+        have_librosa = False
+
+    results = []
+    for rate in args.rates:
+        data = make_wav(rate, args.seconds)
+        row = {
+            "input_rate": rate,
+            "polyphase_ms_per_audio_s": round(time_per_audio_second(decode_audio, data, args.seconds, args.repeat), 3),
+        }
+        if have_librosa:
+            row["librosa_ms_per_audio_s"] = round(
+                time_per_audio_second(librosa_decode, data, args.seconds, args.repeat), 3)
+        results.append(row)
+    print(json.dumps({"seconds": args.seconds, "target_rate": 16000, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
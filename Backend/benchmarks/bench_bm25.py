@@ -0,0 +1,71 @@
+"""
+Per-query latency and recall of the corpus-wide BM25 index + RRF against the
+previous approach (BM25Okapi rebuilt on every query over the 20 dense hits).
+
+Only the candidate-generation stage is measured; the cross-encoder is skipped
+because it is identical for both approaches.
+
+    python benchmarks/bench_bm25.py --docs 20000 --queries 200 [--embeddings hf]
+"""
+import argparse
+import json
+
+from common import get_embeddings, percentile, synthetic_corpus, synthetic_queries, timed
+
+from langchain.schema import Document
+from langchain_community.vectorstores import FAISS
+from rank_bm25 import BM25Okapi
+
+from BM25Index import reciprocal_rank_fusion
+from Rag import RAGPipeline
+
+
+def old_candidates(vectorstore: FAISS, question: str, initial_k: int) -> list[str]:
+    dense_results = vectorstore.similarity_search(question, k=initial_k)
+    tokenized_corpus = [doc.page_content.split(" ") for doc in dense_results]
+    scores = BM25Okapi(tokenized_corpus).get_scores(question.split(" "))
+    ranked = sorted(zip(dense_results, scores), key=lambda x: x[1], reverse=True)
+    return [doc.page_content for doc, _ in ranked]
+
+
+def new_candidates(rag: RAGPipeline, question: str, initial_k: int) -> list[str]:
+    dense_hits = rag._dense_search(question, initial_k)
+    lexical_hits = rag.bm25.search(question, initial_k)
+    fused = reciprocal_rank_fusion([[p for p, _ in dense_hits], [p for p, _ in lexical_hits]])[:initial_k]
+    return [doc.page_content for doc in rag._docs_at(fused)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--initial-k", type=int, default=20)
+    parser.add_argument("--embeddings", choices=["hash", "hf"], default="hash")
+    args = parser.parse_args()
+
+    corpus = synthetic_corpus(args.docs)
+    queries = synthetic_queries(corpus, args.queries)
+
+    rag = RAGPipeline(embeddings=get_embeddings(args.embeddings), chunk_size=100000,
+                      use_embedding_cache=False)
+    _, ingest_seconds = timed(rag.ingest, corpus, batch_size=1024)
+    old_store = rag.vectorstore
+
+    report = {"docs": args.docs, "queries": args.queries, "initial_k": args.initial_k,
+              "embeddings": args.embeddings, "ingest_seconds": round(ingest_seconds, 3)}
+    for name, fn, target in (("old", old_candidates, old_store), ("new", new_candidates, rag)):
+        latencies, hits = [], 0
+        for question, doc_index in queries:
+            candidates, seconds = timed(fn, target, question, args.initial_k)
+            latencies.append(seconds * 1000)
+            hits += corpus[doc_index] in candidates
+        report[name] = {
+            "recall_at_initial_k": round(hits / len(queries), 4),
+            "p50_ms": round(percentile(latencies, 50), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
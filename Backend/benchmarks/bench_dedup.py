@@ -0,0 +1,121 @@
+"""
+Near-duplicate elimination at ingest (MinHashIndex in RAGPipeline.ingest_stream).
+
+Synthetic uploads look like exported reports: every page has body
+paragraphs plus a legal disclaimer and a page banner that repeat with small
+changes (page numbers, dates). Each document is ingested into a pipeline
+with dedup on and one with it off, then one document is uploaded a second
+time to exercise dedup against the existing index. Embedding cost is
+simulated (`--embed-ms` per chunk on top of hashing embeddings, roughly
+MiniLM on one CPU core) unless `--embeddings hf`.
+
+Reports chunks indexed and removed, ingest time and speedup, and how many
+top-k search hits are near-duplicates of a better hit.
+
+    python benchmarks/bench_dedup.py [--docs 20] [--pages 10] [--embed-ms 2]
+"""
+import argparse
+import json
+import random
+import time
+
+from common import FakeReranker, HashingEmbeddings, get_embeddings, synthetic_corpus
+
+from MinHashIndex import MinHashIndex
+from Rag import RAGPipeline
+
+DISCLAIMER = (
+    "This report is provided for information purposes only and does not constitute an offer, "
+    "solicitation or recommendation. The information herein was obtained from sources believed to be "
+    "reliable but its accuracy and completeness are not guaranteed. Past performance is not indicative "
+    "of future results. Recipients should seek independent advice before acting on any of it. "
+    "Distribution is restricted; page {page} of {pages}, generated {date}."
+)
+BANNER = ("Quarterly operations review prepared by the finance and strategy office for the executive "
+          "committee and the board; internal use only, do not forward outside the organisation. Section {page}.")
+
+
+class SlowEmbeddings(HashingEmbeddings):
+    """Hashing embeddings that also charge `ms_per_text` per text, like a real model."""
+
+    def __init__(self, ms_per_text: float):
+        super().__init__()
+        self.ms_per_text = ms_per_text
+
+    def embed_documents(self, texts):
+        time.sleep(self.ms_per_text * len(texts) / 1000)
+        return super().embed_documents(texts)
+
+
+def synthetic_reports(n_docs: int, pages: int, paragraphs: int, seed: int = 0) -> list[list[str]]:
+    """Per document, its pages of text."""
+    rng = random.Random(seed)
+    bodies = iter(synthetic_corpus(n_docs * pages * paragraphs, words_per_doc=80, seed=seed))
+    documents = []
+    for _ in range(n_docs):
+        date = f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        documents.append([
+            "\n\n".join([BANNER.format(page=page + 1)] + [next(bodies) for _ in range(paragraphs)]
+                        + [DISCLAIMER.format(page=page + 1, pages=pages, date=date)])
+            for page in range(pages)])
+    return documents
+
+
+def ingest_all(rag: RAGPipeline, documents: list[list[str]]) -> dict:
+    started = time.perf_counter()
+    chunks = duplicates = 0
+    for number, pages in enumerate(documents):
+        progress = rag.ingest(pages, source=f"report-{number}.pdf", batch_size=64)
+        chunks += progress.chunks_done
+        duplicates += progress.duplicates
+    return {"chunks_indexed": chunks, "duplicates_removed": duplicates,
+            "seconds": round(time.perf_counter() - started, 3)}
+
+
+def duplicate_hits(rag: RAGPipeline, questions: list[str], k: int) -> float:
+    """Share of top-k hits that near-duplicate a better hit of the same query."""
+    duplicates = total = 0
+    for question in questions:
+        seen = MinHashIndex()
+        for doc in rag.query(question, k=k):
+            duplicates += seen.check_and_add(doc.page_content)
+            total += 1
+    return round(duplicates / total, 4) if total else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--paragraphs", type=int, default=3, help="body paragraphs per page")
+    parser.add_argument("--embed-ms", type=float, default=2.0)
+    parser.add_argument("--embeddings", choices=["hash", "hf"], default="hash")
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    documents = synthetic_reports(args.docs, args.pages, args.paragraphs)
+    embeddings = SlowEmbeddings(args.embed_ms) if args.embeddings == "hash" else get_embeddings("hf")
+    report = {"config": vars(args)}
+    pipelines = {}
+    for mode, dedup in (("without_dedup", False), ("with_dedup", True)):
+        rag = RAGPipeline(embeddings=embeddings, use_embedding_cache=False, use_retrieval_cache=False, dedup=dedup)
+        rag.reranker = FakeReranker()
+        report[mode] = ingest_all(rag, documents)
+        pipelines[mode] = rag
+    report["speedup"] = round(report["without_dedup"]["seconds"] / report["with_dedup"]["seconds"], 2)
+    total = report["without_dedup"]["chunks_indexed"]
+    report["chunks_removed_share"] = round(report["with_dedup"]["duplicates_removed"] / total, 4) if total else 0.0
+
+    # the same document again: nothing new should be indexed
+    report["reupload"] = ingest_all(pipelines["with_dedup"], documents[:1])
+
+    report["dedup"] = MinHashIndex.all_stats()
+    questions = ["report accuracy independent advice", "quarterly operations review board",
+                 "past performance future results"]
+    report["duplicate_share_of_top_k"] = {mode: duplicate_hits(rag, questions, args.k)
+                                          for mode, rag in pipelines.items()}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+End-to-end load test of the real FastAPI app, fully offline.
+
+The app from main.py is served by uvicorn on a local port, with every chat
+built around FakeChatModel (deterministic streaming answers), hashing
+embeddings, FakeReranker and a FakeWhisper transcription service, so no API
+key or model download is needed. Then:
+
+  1. ingest: one synthetic .txt document per chat via POST /ingest
+  2. retrieval: in-process query latency over every chat's index
+  3. load: `--questions` /chat requests per chat and one streaming /voice
+     session per voice chat, all running concurrently
+
+Reported as JSON (and written to --out to compare runs): ingestion
+throughput, retrieval latency percentiles, time-to-first-token, tokens/sec
+(answer words after the first token) and RSS growth per chat.
+
+    python benchmarks/bench_e2e.py [--chats 8] [--voice-chats 4] [--docs-per-chat 200] \
+        [--questions 3] [--out results.json]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+# the app reads its storage locations at import time: keep this run's data out of the repo
+_workdir = tempfile.mkdtemp(prefix="bench-e2e-")
+for _name, _sub in (("INDEX_STORE_DIR", "indexes"), ("CHAT_SPILL_DIR", "chat_spill"),
+                    ("EMBEDDING_CACHE_DIR", "embedding_cache")):
+    os.environ.setdefault(_name, os.path.join(_workdir, _sub))
+
+from common import (FakeChatModel, FakeReranker, get_embeddings, install_fake_transcription, percentile,
+                    synthetic_corpus, synthetic_queries, synthetic_speech)
+
+import httpx
+import uvicorn
+import websockets
+
+from ChatBot import ChatBot
+from ModelRegistry import _current_rss
+from Rag import RAGPipeline
+
+
+def summary_ms(values: list[float]) -> dict:
+    return {
+        "count": len(values),
+        "p50": round(1000 * percentile(values, 50), 2),
+        "p95": round(1000 * percentile(values, 95), 2),
+        "p99": round(1000 * percentile(values, 99), 2),
+        "max": round(1000 * max(values), 2) if values else 0.0,
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class AppServer:
+    """uvicorn serving `app` on its own thread and event loop, like a real deployment."""
+
+    def __init__(self, app, port: int):
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+async def ingest(client: httpx.AsyncClient, documents: dict[str, str]) -> dict:
+    started = time.perf_counter()
+    jobs = []
+    for chat_id, text in documents.items():
+        response = await client.post("/ingest", data={"chat_id": chat_id},
+                                     files=[("files", (f"{chat_id}.txt", text.encode(), "text/plain"))])
+        response.raise_for_status()
+        jobs += [job["job_id"] for job in response.json()["jobs"]]
+    finished = {}
+    while len(finished) < len(jobs):
+        for job_id in jobs:
+            if job_id not in finished:
+                job = (await client.get(f"/ingest/{job_id}")).json()
+                if job["status"] in ("done", "failed"):
+                    finished[job_id] = job
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    chunks = sum(job["chunks"] for job in finished.values())
+    megabytes = sum(len(text.encode()) for text in documents.values()) / (1024 * 1024)
+    return {
+        "documents": len(documents),
+        "failed": sum(job["status"] == "failed" for job in finished.values()),
+        "chunks": chunks,
+        "seconds": round(elapsed, 3),
+        "chunks_per_second": round(chunks / elapsed, 1),
+        "mb_per_second": round(megabytes / elapsed, 3),
+    }
+
+
+def retrieval(bots: dict[str, ChatBot], queries: dict[str, list[str]]) -> dict:
+    latencies = []
+    for chat_id, bot in bots.items():
+        for question in queries[chat_id]:
+            started = time.perf_counter()
+            bot.rag_pipeline._retrieve(question)
+            latencies.append(time.perf_counter() - started)
+    return summary_ms(latencies)
+
+
+async def chat_once(client: httpx.AsyncClient, chat_id: str, question: str) -> dict:
+    started = time.perf_counter()
+    first, parts = None, []
+    async with client.stream("POST", "/chat", data={"chat_id": chat_id, "message": question}) as response:
+        async for text in response.aiter_text():
+            if text and first is None:
+                first = time.perf_counter()
+            parts.append(text)
+    return {"started": started, "first": first, "ended": time.perf_counter(), "text": "".join(parts)}
+
+
+async def voice_once(base_ws: str, chat_id: str, pcm: bytes, frame_ms: int, pace: float) -> dict:
+    frame_bytes = 16000 * 2 * frame_ms // 1000
+    url = f"{base_ws}/voice?chat_id={chat_id}&mode=stream&sample_rate=16000"
+    first, parts, partials = None, [], 0
+    async with websockets.connect(url, max_size=None) as ws:
+        async def read():
+            nonlocal first, partials
+            async for raw in ws:
+                event = json.loads(raw)
+                if event["type"] == "partial":
+                    partials += 1
+                elif event["type"] == "token":
+                    if first is None:
+                        first = time.perf_counter()
+                    parts.append(event["text"])
+                elif event["type"] in ("done", "error"):
+                    return event
+
+        reader = asyncio.create_task(read())
+        for offset in range(0, len(pcm), frame_bytes):
+            await ws.send(pcm[offset:offset + frame_bytes])
+            if pace:
+                await asyncio.sleep(pace * frame_ms / 1000)
+        # end of utterance: answer latency counts from here
+        started = time.perf_counter()
+        await ws.send("end")
+        last = await reader
+    return {"started": started, "first": first, "ended": time.perf_counter(),
+            "text": "".join(parts), "partials": partials, "error": last.get("detail") if last else None}
+
+
+def answer_summary(results: list[dict]) -> dict:
+    answered = [r for r in results if r["first"] is not None]
+    ttft = [r["first"] - r["started"] for r in answered]
+    tokens = sum(len(r["text"].split()) for r in answered)
+    streaming = sum(r["ended"] - r["first"] for r in answered)
+    return {
+        "requests": len(results),
+        "answered": len(answered),
+        "ttft_ms": summary_ms(ttft),
+        "total_ms": summary_ms([r["ended"] - r["started"] for r in results]),
+        # the first token is excluded: its latency is TTFT
+        "tokens_per_second": round((tokens - len(answered)) / streaming, 1) if streaming > 0 else 0.0,
+    }
+
+
+async def run(args) -> dict:
+    corpus = synthetic_corpus(args.chats * args.docs_per_chat, words_per_doc=args.words_per_doc)
+    documents = {f"chat-{i}": "\n\n".join(corpus[i * args.docs_per_chat:(i + 1) * args.docs_per_chat])
+                 for i in range(args.chats)}
+    queries = {chat_id: [q for q, _ in synthetic_queries(text.split("\n\n"), args.questions, seed=i)]
+               for i, (chat_id, text) in enumerate(documents.items())}
+
+    llm = FakeChatModel(first_token_ms=args.first_token_ms, token_ms=args.token_ms, answer_words=args.answer_words)
+    embeddings = get_embeddings(args.embeddings)
+
+    def make_chatbot(chat_id: str) -> ChatBot:
+        rag = RAGPipeline(chat_id=chat_id, embeddings=embeddings)
+        rag.reranker = FakeReranker()
+        return ChatBot(chat_id=chat_id, llm=llm, rag_pipeline=rag)
+
+    # rare corpus words, so voice transcripts retrieve like typed questions
+    vocabulary = sorted({w for q in queries.values() for text in q for w in text.split()})
+    install_fake_transcription(vocabulary, real_time_factor=args.whisper_rtf, workers=args.whisper_workers)
+
+    import main
+    main.chatbot_cache.factory = make_chatbot
+    port = free_port()
+    report = {"config": vars(args), "rss_mb": {}}
+    rss_base = _current_rss()
+
+    with AppServer(main.app, port), contextlib.redirect_stdout(io.StringIO()):
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=None) as client:
+            report["ingest"] = await ingest(client, documents)
+            rss_ingested = _current_rss()
+            bots = {chat_id: main.chatbot_cache.get_or_create(chat_id) for chat_id in documents}
+            report["retrieval_ms"] = retrieval(bots, queries)
+
+            pcm = synthetic_speech()
+            voice_chats = list(documents)[:args.voice_chats]
+            started = time.perf_counter()
+            chat_results, voice_results = await asyncio.gather(
+                asyncio.gather(*(chat_once(client, chat_id, question)
+                                 for chat_id, qs in queries.items() for question in qs)),
+                asyncio.gather(*(voice_once(f"ws://127.0.0.1:{port}", chat_id, pcm, args.frame_ms, args.voice_pace)
+                                 for chat_id in voice_chats)),
+            )
+            report["load_seconds"] = round(time.perf_counter() - started, 3)
+            report["chat"] = answer_summary(chat_results)
+            report["voice"] = {**answer_summary(voice_results),
+                               "partials": sum(r["partials"] for r in voice_results),
+                               "errors": [r["error"] for r in voice_results if r["error"]]}
+            report["server"] = {
+                "retrieval": (await client.get("/retrieval/stats")).json(),
+                "transcription": (await client.get("/transcription/stats")).json(),
+                "context": (await client.get("/context/stats")).json(),
+            }
+    rss_end = _current_rss()
+    report["rss_mb"] = {
+        "base": round(rss_base / 2 ** 20, 1),
+        "after_ingest": round(rss_ingested / 2 ** 20, 1),
+        "end": round(rss_end / 2 ** 20, 1),
+        "growth_per_chat": round((rss_end - rss_base) / 2 ** 20 / args.chats, 2),
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=8)
+    parser.add_argument("--voice-chats", type=int, default=4)
+    parser.add_argument("--docs-per-chat", type=int, default=200)
+    parser.add_argument("--words-per-doc", type=int, default=120)
+    parser.add_argument("--questions", type=int, default=3, help="/chat requests per chat")
+    parser.add_argument("--embeddings", choices=["hash", "hf"], default="hash")
+    parser.add_argument("--first-token-ms", type=float, default=200.0)
+    parser.add_argument("--token-ms", type=float, default=5.0)
+    parser.add_argument("--answer-words", type=int, default=40)
+    parser.add_argument("--whisper-rtf", type=float, default=0.1, help="fake Whisper seconds per audio second")
+    parser.add_argument("--whisper-workers", type=int, default=1)
+    parser.add_argument("--frame-ms", type=int, default=20)
+    parser.add_argument("--voice-pace", type=float, default=0.0,
+                        help="1.0 sends audio in real time, 0 as fast as possible")
+    parser.add_argument("--out", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        shutil.rmtree(_workdir, ignore_errors=True)
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
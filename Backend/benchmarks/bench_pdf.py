@@ -0,0 +1,91 @@
+"""
+Pages/sec of PDF text extraction against the number of worker processes.
+
+Generates a multi-hundred-page text PDF (no extra dependencies) and reads it
+through DocumentReader with pdf_workers = 1, 2, 4, ...
+
+    python benchmarks/bench_pdf.py --pages 400 --workers 1 2 4 8
+"""
+import argparse
+import io
+import json
+import os
+import tempfile
+import time
+
+from common import synthetic_corpus
+
+from DocReader import DocumentReader
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\\\", "\\\\\\\\").replace("(", "\\\\(").replace(")", "\\\\)")
+
+
+def generate_pdf(pages: int, lines_per_page: int = 45) -> bytes:
+    """Minimal PDF 1.4 writer: one Helvetica text stream per page."""
+    words = synthetic_corpus(pages * lines_per_page, words_per_doc=12, vocab_size=5000)
+    objects = {1: b"<< /Type /Catalog /Pages 2 0 R >>",
+               3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"}
+    kids = []
+    for p in range(pages):
+        page_id, content_id = 4 + 2 * p, 5 + 2 * p
+        lines = words[p * lines_per_page:(p + 1) * lines_per_page]
+        body = "BT /F1 10 Tf 14 TL 40 800 Td " + " ".join(f"({_escape(line)}) '" for line in lines) + " ET"
+        stream = body.encode("latin-1")
+        objects[content_id] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        objects[page_id] = (b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        kids.append(b"%d 0 R" % page_id)
+    objects[2] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), pages)
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = {}
+    for obj_id in sorted(objects):
+        offsets[obj_id] = out.tell()
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (obj_id, objects[obj_id]))
+    xref = out.tell()
+    size = max(objects) + 1
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % size)
+    for obj_id in range(1, size):
+        out.write(b"%010d 00000 n \n" % offsets[obj_id])
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref))
+    return out.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    data = generate_pdf(args.pages)
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        tmp.write(data)
+        path = tmp.name
+
+    report = {"pages": args.pages, "pdf_bytes": len(data), "cpu_count": os.cpu_count(), "runs": []}
+    try:
+        baseline = None
+        for workers in args.workers:
+            reader = DocumentReader(pdf_workers=workers)
+            if workers > 1:
+                reader.read(path)  # warm the process pool so spawn cost is not measured
+            start = time.perf_counter()
+            texts = reader.read(path)
+            seconds = time.perf_counter() - start
+            baseline = baseline or texts
+            report["runs"].append({
+                "workers": workers,
+                "pages_per_second": round(args.pages / seconds, 1),
+                "seconds": round(seconds, 3),
+                "same_output": texts == baseline,
+            })
+    finally:
+        os.unlink(path)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
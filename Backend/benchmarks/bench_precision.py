@@ -0,0 +1,77 @@
+"""
+Memory and recall of reduced-precision vector storage (IndexConfig.precision)
+against float32, with and without exact rescoring.
+
+Vectors come from bench_ann's Gaussian mixture at MiniLM's dimension (384).
+For every index kind and precision the report gives the resident bytes of
+the index per 100k chunks, recall@k against exact float32 search, and
+queries/sec. With rescoring, rescore_factor * k candidates are re-ranked
+against the float32 copy, which a chat keeps memory-mapped on disk
+(vectors.f32) rather than on the heap; its size is reported separately.
+
+    python benchmarks/bench_precision.py [--vectors 100000] [--kinds flat hnsw] [--rescore-factor 4]
+"""
+import argparse
+import json
+import time
+
+import faiss
+import numpy as np
+
+import common  # noqa: F401  (sets up sys.path)
+from bench_ann import clustered_vectors
+from VectorIndex import IndexConfig, build_index, exact_rescore, vector_bytes
+
+
+def evaluate(index, data: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int,
+             rescore_factor: int) -> dict:
+    start = time.perf_counter()
+    if rescore_factor:
+        _, candidates = index.search(queries, k * rescore_factor)
+        _, found = exact_rescore(queries, candidates, lambda positions: data[positions], k)
+    else:
+        _, found = index.search(queries, k)
+    seconds = time.perf_counter() - start
+    recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+    return {"recall_at_k": round(float(recall), 4), "qps": round(len(queries) / seconds, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--kinds", nargs="+", default=["flat", "hnsw"])
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    data = clustered_vectors(args.vectors, args.dim, 256, rng)
+    queries = clustered_vectors(args.queries, args.dim, 256, rng)
+    _, truth = build_index("flat", data, IndexConfig()).search(queries, args.k)
+    per_100k = 100_000 / args.vectors
+
+    report = {"vectors": args.vectors, "dim": args.dim, "k": args.k,
+              "float32_copy_on_disk_mb_per_100k": round(100_000 * args.dim * 4 / 2 ** 20, 1), "results": []}
+    for kind in args.kinds:
+        for precision in ("float32", "float16", "int8"):
+            config = IndexConfig(kind=kind, precision=precision)
+            start = time.perf_counter()
+            index = build_index(kind, data, config)
+            build_seconds = time.perf_counter() - start
+            for rescore_factor in ([0] if precision == "float32" else [0, args.rescore_factor]):
+                row = {
+                    "kind": kind, "precision": precision, "rescore_factor": rescore_factor,
+                    "build_seconds": round(build_seconds, 2),
+                    "index_mb_per_100k": round(vector_bytes(index) * per_100k / 2 ** 20, 1),
+                    "serialized_mb_per_100k": round(faiss.serialize_index(index).nbytes * per_100k / 2 ** 20, 1),
+                }
+                row.update(evaluate(index, data, queries, truth, args.k, rescore_factor))
+                report["results"].append(row)
+                print(json.dumps(row))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
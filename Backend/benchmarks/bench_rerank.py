@@ -0,0 +1,77 @@
+"""
+Load test of cross-request micro-batching for the cross-encoder reranker.
+
+Each simulated chat scores 20 (query, passage) pairs per query, like
+RAGPipeline.query. "direct" calls model.predict per request (the previous
+behaviour); "batched" goes through a RerankService. Reports queries/sec at
+each concurrency level.
+
+    python benchmarks/bench_rerank.py [--model hf] [--concurrency 1 8 32]
+
+The default fake model charges a fixed per-call overhead plus a per-pair
+cost and holds a lock while "computing", which mimics one CPU-bound device.
+"""
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import synthetic_corpus
+
+from Reranker import RerankService
+
+
+class FakeCrossEncoder:
+    def __init__(self, call_overhead_ms: float = 4.0, per_pair_ms: float = 0.25):
+        self.call_overhead = call_overhead_ms / 1000
+        self.per_pair = per_pair_ms / 1000
+        self._device = threading.Lock()
+
+    def predict(self, pairs, batch_size: int = 32):
+        with self._device:
+            time.sleep(self.call_overhead + self.per_pair * len(pairs))
+        return [float(len(q) - len(p)) for q, p in pairs]
+
+
+def run(predict, requests, concurrency: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(predict, requests))
+    return len(requests) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", choices=["fake", "hf"], default="fake")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--queries-per-level", type=int, default=256)
+    parser.add_argument("--pairs", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.model == "hf":
+        from ModelRegistry import ModelRegistry
+        model = ModelRegistry.get_cross_encoder()
+    else:
+        model = FakeCrossEncoder()
+
+    passages = synthetic_corpus(args.pairs * 4, words_per_doc=60)
+    requests = [[(f"question {i}", passages[(i + j) % len(passages)]) for j in range(args.pairs)]
+                for i in range(args.queries_per_level)]
+
+    service = RerankService(lambda: model)
+    report = {"model": args.model, "pairs_per_query": args.pairs, "levels": {}}
+    for concurrency in args.concurrency:
+        direct_qps = run(model.predict, requests, concurrency)
+        batched_qps = run(service.predict, requests, concurrency)
+        report["levels"][concurrency] = {
+            "direct_qps": round(direct_qps, 1),
+            "batched_qps": round(batched_qps, 1),
+            "speedup": round(batched_qps / direct_qps, 2),
+        }
+    report["service"] = service.stats()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Latency of the IntentRouter paths against always running the agent.
+
+Uses FakeChatModel (fixed first-token latency and per-token delay), so the
+numbers isolate how many LLM round trips each path costs:
+
+  - agent:  AgentExecutor with tools; at least one final_answer tool call
+            before the answer streams
+  - direct: one streaming LLM call over the retrieved context
+  - arithmetic: local safe_eval, no LLM call
+
+    python benchmarks/bench_router.py [--runs 5] [--first-token-ms 300]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from common import FakeChatModel, FakeReranker, HashingEmbeddings, percentile, synthetic_corpus, synthetic_queries
+
+from ChatBot import ChatBot
+from IntentRouter import AGENT, IntentRouter, RouteDecision
+from Rag import RAGPipeline
+
+
+class AgentOnlyRouter(IntentRouter):
+    """The behaviour before routing: every question goes through the agent."""
+
+    def _decide(self, question: str) -> RouteDecision:
+        return RouteDecision(AGENT)
+
+
+async def measure(bot: ChatBot, question: str, session_id: str) -> tuple[float, float]:
+    start = time.perf_counter()
+    first = None
+    async for _ in bot.ask_stream(question, session_id=session_id, k=3):
+        if first is None:
+            first = time.perf_counter() - start
+    total = time.perf_counter() - start
+    return (first if first is not None else total), total
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--first-token-ms", type=float, default=300.0)
+    parser.add_argument("--token-ms", type=float, default=10.0)
+    args = parser.parse_args()
+
+    corpus = synthetic_corpus(500)
+    rag = RAGPipeline(embeddings=HashingEmbeddings(), use_embedding_cache=False, use_retrieval_cache=False)
+    rag.reranker = FakeReranker()
+    rag.ingest(corpus)
+    llm = FakeChatModel(first_token_ms=args.first_token_ms, token_ms=args.token_ms)
+    bots = {
+        "agent_only": ChatBot(llm=llm, rag_pipeline=rag, router=AgentOnlyRouter()),
+        "routed": ChatBot(llm=llm, rag_pipeline=rag, router=IntentRouter()),
+    }
+    questions = {
+        "document": [q for q, _ in synthetic_queries(corpus, args.runs)],
+        "arithmetic": [f"what is {i + 12} * ({i} + 4)?" for i in range(args.runs)],
+    }
+
+    report = {"first_token_ms": args.first_token_ms, "token_ms": args.token_ms, "results": []}
+    for kind, qs in questions.items():
+        for name, bot in bots.items():
+            ttft, total = [], []
+            for i, question in enumerate(qs):
+                first, elapsed = await measure(bot, question, session_id=f"{name}-{kind}-{i}")
+                ttft.append(first)
+                total.append(elapsed)
+            report["results"].append({
+                "questions": kind,
+                "mode": name,
+                "p50_ttft_ms": round(1000 * percentile(ttft, 50), 1),
+                "p50_total_ms": round(1000 * percentile(total, 50), 1),
+            })
+        report["routes"] = bots["routed"].router.stats()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
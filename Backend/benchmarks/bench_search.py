@@ -0,0 +1,69 @@
+"""
+Throughput of batched retrieval (RAGPipeline.search_batch, behind /search)
+against calling query() once per question.
+
+Both run the same hybrid search + rerank over one in-memory index with the
+retrieval cache off. The default reranker is bench_rerank's
+FakeCrossEncoder behind a RerankService (fixed per-call overhead plus a
+per-pair cost), so what batching saves on model calls shows up without a
+model download; `--embeddings hf --reranker hf` uses the real models.
+Also checks that both paths return the same top-k.
+
+    python benchmarks/bench_search.py [--docs 20000] [--queries 512] [--batch-sizes 8 32 128]
+"""
+import argparse
+import json
+import time
+
+from common import get_embeddings, synthetic_corpus, synthetic_queries
+
+from bench_rerank import FakeCrossEncoder
+from Rag import RAGPipeline
+from Reranker import RerankService
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--words-per-doc", type=int, default=80)
+    parser.add_argument("--queries", type=int, default=512)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[8, 32, 128])
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--initial-k", type=int, default=20)
+    parser.add_argument("--embeddings", choices=["hash", "hf"], default="hash")
+    parser.add_argument("--reranker", choices=["fake", "hf"], default="fake")
+    args = parser.parse_args()
+
+    corpus = synthetic_corpus(args.docs, words_per_doc=args.words_per_doc)
+    questions = [q for q, _ in synthetic_queries(corpus, args.queries)]
+    rag = RAGPipeline(embeddings=get_embeddings(args.embeddings), use_embedding_cache=False,
+                      use_retrieval_cache=False)
+    if args.reranker == "fake":
+        rag.reranker = RerankService(lambda: FakeCrossEncoder())
+    rag.ingest(corpus, batch_size=256)
+
+    started = time.perf_counter()
+    looped = [rag.query_with_scores(q, k=args.k, initial_k=args.initial_k) for q in questions]
+    loop_qps = len(questions) / (time.perf_counter() - started)
+
+    report = {"config": vars(args), "index": rag.index_info(), "loop_qps": round(loop_qps, 1), "batched": {}}
+    for batch_size in args.batch_sizes:
+        started = time.perf_counter()
+        batched = []
+        for start in range(0, len(questions), batch_size):
+            batched += rag.search_batch(questions[start:start + batch_size], k=args.k, initial_k=args.initial_k)
+        qps = len(questions) / (time.perf_counter() - started)
+        same = sum([doc.page_content for doc, _ in a] == [hit.document.page_content for hit in b]
+                   for a, b in zip(looped, batched))
+        report["batched"][batch_size] = {
+            "qps": round(qps, 1),
+            "speedup": round(qps / loop_qps, 2),
+            "same_top_k": round(same / len(questions), 4),
+        }
+    if args.reranker == "fake":
+        report["rerank"] = rag.reranker.stats()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+Multi-worker load test: the same offline app (fake_app.py) served by
+`uvicorn --workers N` for each N, all workers sharing one node-local data
+directory (chat registry, per-chat indexes and locks, history store).
+
+For each worker count:
+
+  1. ingest: one synthetic document per chat via POST /ingest; job status is
+     polled on whichever worker answers, so most polls are served from the
+     shared registry rather than the worker running the job
+  2. load: `--concurrency` clients send /chat requests for random chats for
+     `--seconds`; every answer must be non-empty
+  3. after a graceful shutdown, the shared history store must hold both
+     messages of every answered turn (no lost or clobbered writes)
+
+The fake model answers instantly by default, so requests are CPU-bound
+(retrieval, BM25, context building, streaming) and throughput should grow
+with workers up to the number of cores.
+
+    python benchmarks/bench_workers.py [--workers 1,2,4] [--chats 16] [--seconds 20] [--out results.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import percentile, synthetic_corpus, synthetic_queries
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def summary_ms(values: list[float]) -> dict:
+    return {
+        "count": len(values),
+        "p50": round(1000 * percentile(values, 50), 2),
+        "p95": round(1000 * percentile(values, 95), 2),
+        "p99": round(1000 * percentile(values, 99), 2),
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class WorkerServer:
+    """`uvicorn fake_app:app --workers N` in a subprocess with its own data directory."""
+
+    def __init__(self, workers: int, port: int, workdir: str, env: dict):
+        self.workers = workers
+        self.port = port
+        self.env = {
+            **os.environ, **env,
+            "PYTHONPATH": os.pathsep.join([HERE, os.path.dirname(HERE), os.environ.get("PYTHONPATH", "")]),
+            "INDEX_STORE_DIR": os.path.join(workdir, "indexes"),
+            "CHAT_SPILL_DIR": os.path.join(workdir, "chat_spill"),
+            "EMBEDDING_CACHE_DIR": os.path.join(workdir, "embedding_cache"),
+            # keep every message, so the history check can count them
+            "HISTORY_KEEP_MESSAGES": "0",
+        }
+        self.history_path = os.path.join(workdir, "chat_spill", "history.sqlite")
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "fake_app:app", "--host", "127.0.0.1", "--port", str(self.port),
+             "--workers", str(self.workers), "--log-level", "warning"],
+            cwd=HERE, env=self.env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 120
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with {self.process.returncode}")
+            try:
+                if httpx.get(f"http://127.0.0.1:{self.port}/chats", timeout=1).status_code == 200:
+                    return self
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError("uvicorn did not start")
+
+    def __exit__(self, *exc):
+        # SIGINT is a graceful shutdown: every worker runs the lifespan exit and flushes history
+        self.process.send_signal(signal.SIGINT)
+        try:
+            self.process.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+async def ingest(client: httpx.AsyncClient, documents: dict[str, str]) -> dict:
+    started = time.perf_counter()
+    owner = {}
+    for chat_id, text in documents.items():
+        response = await client.post("/ingest", data={"chat_id": chat_id},
+                                     files=[("files", (f"{chat_id}.txt", text.encode(), "text/plain"))])
+        response.raise_for_status()
+        for job in response.json()["jobs"]:
+            owner[job["job_id"]] = response.headers.get("x-worker-pid")
+    finished, polls, cross_worker = {}, 0, 0
+    while len(finished) < len(owner):
+        for job_id in owner:
+            if job_id not in finished:
+                # a new connection per poll, so the kernel may hand it to any worker
+                response = await client.get(f"/ingest/{job_id}", headers={"Connection": "close"})
+                response.raise_for_status()
+                polls += 1
+                cross_worker += response.headers.get("x-worker-pid") != owner[job_id]
+                job = response.json()
+                if job["status"] in ("done", "failed"):
+                    finished[job_id] = job
+        await asyncio.sleep(0.05)
+    return {
+        "documents": len(documents),
+        "failed": sum(job["status"] == "failed" for job in finished.values()),
+        "chunks": sum(job["chunks"] for job in finished.values()),
+        "seconds": round(time.perf_counter() - started, 3),
+        "status_polls": polls,
+        "status_polls_from_other_workers": cross_worker,
+    }
+
+
+async def load(client: httpx.AsyncClient, queries: dict[str, list[str]], concurrency: int,
+               seconds: float) -> dict:
+    latencies, empty, turns, pids = [], 0, {}, {}
+    deadline = time.perf_counter() + seconds
+    rng = random.Random(0)
+    chat_ids = list(queries)
+
+    async def client_loop():
+        nonlocal empty
+        while time.perf_counter() < deadline:
+            chat_id = rng.choice(chat_ids)
+            started = time.perf_counter()
+            async with client.stream("POST", "/chat", data={"chat_id": chat_id,
+                                                            "message": rng.choice(queries[chat_id])}) as response:
+                text = "".join([part async for part in response.aiter_text()])
+                pid = response.headers.get("x-worker-pid")
+            latencies.append(time.perf_counter() - started)
+            pids[pid] = pids.get(pid, 0) + 1
+            if text.strip():
+                turns[chat_id] = turns.get(chat_id, 0) + 1
+            else:
+                empty += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "empty_answers": empty,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "latency_ms": summary_ms(latencies),
+        "requests_per_worker": sorted(pids.values(), reverse=True),
+        "turns": turns,
+    }
+
+
+def stored_messages(path: str) -> dict[str, int]:
+    with sqlite3.connect(path) as conn:
+        return dict(conn.execute("SELECT session_id, COUNT(*) FROM messages GROUP BY session_id"))
+
+
+def history_check(path: str, before: dict[str, int], turns: dict[str, int]) -> dict:
+    """Every answered turn wrote its question and answer, whichever worker served it."""
+    stored = stored_messages(path)
+    mismatched = {chat_id: {"expected": before.get(chat_id, 0) + 2 * n, "stored": stored.get(chat_id, 0)}
+                  for chat_id, n in turns.items() if stored.get(chat_id, 0) != before.get(chat_id, 0) + 2 * n}
+    return {"sessions": len(stored), "messages": sum(stored.values()), "mismatched": mismatched}
+
+
+async def run_workers(workers: int, args, documents: dict[str, str], queries: dict[str, list[str]]) -> dict:
+    workdir = tempfile.mkdtemp(prefix=f"bench-workers-{workers}-")
+    env = {"BENCH_FIRST_TOKEN_MS": str(args.first_token_ms), "BENCH_TOKEN_MS": str(args.token_ms),
+           "BENCH_ANSWER_WORDS": str(args.answer_words)}
+    try:
+        server = WorkerServer(workers, free_port(), workdir, env)
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        with server:
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{server.port}", timeout=None,
+                                         limits=limits) as client:
+                report = {"workers": workers, "ingest": await ingest(client, documents)}
+                registered = (await client.get("/chats")).json()["chats"]
+                report["registered_chats"] = len(registered)
+                # warm every worker's chat cache before measuring
+                await load(client, queries, args.concurrency, args.warmup_seconds)
+                # let the write-behind history flush the warmup turns
+                await asyncio.sleep(2.0)
+                before = stored_messages(server.history_path)
+                report["load"] = await load(client, queries, args.concurrency, args.seconds)
+        report["history"] = history_check(server.history_path, before, report["load"].pop("turns"))
+        return report
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+async def run(args) -> dict:
+    corpus = synthetic_corpus(args.chats * args.docs_per_chat, words_per_doc=args.words_per_doc)
+    documents = {f"chat-{i}": "\n\n".join(corpus[i * args.docs_per_chat:(i + 1) * args.docs_per_chat])
+                 for i in range(args.chats)}
+    queries = {chat_id: [q for q, _ in synthetic_queries(text.split("\n\n"), args.questions, seed=i)]
+               for i, (chat_id, text) in enumerate(documents.items())}
+    report = {"config": vars(args), "cpu_count": os.cpu_count(), "runs": []}
+    for workers in [int(w) for w in args.workers.split(",")]:
+        report["runs"].append(await run_workers(workers, args, documents, queries))
+    base = report["runs"][0]["load"]["requests_per_second"]
+    report["speedup"] = {str(r["workers"]): round(r["load"]["requests_per_second"] / base, 2) if base else 0.0
+                         for r in report["runs"]}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--chats", type=int, default=16)
+    parser.add_argument("--docs-per-chat", type=int, default=100)
+    parser.add_argument("--words-per-doc", type=int, default=120)
+    parser.add_argument("--questions", type=int, default=8, help="distinct questions per chat")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--warmup-seconds", type=float, default=3.0)
+    parser.add_argument("--first-token-ms", type=float, default=0.0)
+    parser.add_argument("--token-ms", type=float, default=0.0)
+    parser.add_argument("--answer-words", type=int, default=40)
+    parser.add_argument("--out", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
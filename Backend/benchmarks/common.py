@@ -0,0 +1,202 @@
+"""Shared helpers for the offline benchmark scripts in this folder."""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import time
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+# benchmarks import the Backend modules the same way main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic bag-of-words embeddings via the hashing trick.
+    Needs no model download, so retrieval can be benchmarked offline.
+    """
+
+    def __init__(self, size: int = 384):
+        self.size = size
+
+    def _embed(self, text: str) -> list[float]:
+        vector = np.zeros(self.size, dtype=np.float32)
+        for token in _WORD_RE.findall(text.lower()):
+            h = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+            vector[h % self.size] += 1.0 if (h >> 32) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic streaming chat model for offline benchmarks. Each call
+    waits `first_token_ms` (network + prefill), then streams the answer one
+    word every `token_ms`. With tools bound it first calls `final_answer`,
+    as the agent prompt asks a real model to, and answers once the tool
+    result is in the scratchpad.
+    """
+
+    first_token_ms: float = 300.0
+    token_ms: float = 10.0
+    answer_words: int = 30
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-benchmark"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    def _answer(self, messages: List[BaseMessage]) -> str:
+        seed = hashlib.blake2b(str(messages[-1].content).encode(), digest_size=8).digest()
+        rng = random.Random(seed)
+        return " ".join(f"word{rng.randrange(1000)}" for _ in range(self.answer_words))
+
+    @staticmethod
+    def _calls_tool(messages: List[BaseMessage], kwargs: dict) -> bool:
+        return bool(kwargs.get("tools")) and not any(isinstance(m, ToolMessage) for m in messages)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        text = self._answer(messages)
+        if self._calls_tool(messages, kwargs):
+            time.sleep(self.first_token_ms / 1000)
+            message = AIMessage(content="", tool_calls=[
+                {"name": "final_answer", "args": {"answer": text}, "id": "call_0"}])
+        else:
+            time.sleep((self.first_token_ms + self.token_ms * self.answer_words) / 1000)
+            message = AIMessage(content=text)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        text = self._answer(messages)
+        await asyncio.sleep(self.first_token_ms / 1000)
+        if self._calls_tool(messages, kwargs):
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[
+                {"name": "final_answer", "args": json.dumps({"answer": text}), "id": "call_0", "index": 0}]))
+            return
+        for i, word in enumerate(text.split(" ")):
+            token = word if i == 0 else " " + word
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+            await asyncio.sleep(self.token_ms / 1000)
+
+
+class FakeReranker:
+    """Stands in for the cross-encoder: scores by word overlap, no model load."""
+
+    def predict(self, pairs) -> List[float]:
+        return [float(len(set(q.split()) & set(p.split()))) for q, p in pairs]
+
+
+def get_embeddings(kind: str):
+    """'hash' for offline HashingEmbeddings, 'hf' for the real shared MiniLM model."""
+    if kind == "hf":
+        from ModelRegistry import ModelRegistry
+        return ModelRegistry.get_embeddings()
+    return HashingEmbeddings()
+
+
+def synthetic_corpus(n_docs: int, words_per_doc: int = 80, vocab_size: int = 20000,
+                     seed: int = 0) -> list[str]:
+    """Documents drawn from a Zipf-like vocabulary, so a few words are very common."""
+    rng = random.Random(seed)
+    vocab = [f"w{i}" for i in range(vocab_size)]
+    weights = [1.0 / (rank + 1) for rank in range(vocab_size)]
+    return [" ".join(rng.choices(vocab, weights=weights, k=words_per_doc)) for _ in range(n_docs)]
+
+
+def synthetic_queries(corpus: list[str], n_queries: int, words_per_query: int = 4,
+                      seed: int = 1) -> list[tuple[str, int]]:
+    """(query, target doc index) pairs built from the rarest words of the target doc."""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(n_queries):
+        target = rng.randrange(len(corpus))
+        words = sorted(set(corpus[target].split()), key=lambda w: -int(w[1:]))
+        queries.append((" ".join(words[:words_per_query]), target))
+    return queries
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    return float(np.percentile(np.asarray(values), q))
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+class FakeWhisper:
+    """
+    Stands in for a loaded Whisper model: takes `real_time_factor` seconds
+    per second of audio and returns `words_per_call` words picked
+    deterministically from the audio samples.
+    """
+
+    def __init__(self, vocabulary: list[str], real_time_factor: float = 0.1, words_per_call: int = 2):
+        self.vocabulary = vocabulary
+        self.real_time_factor = real_time_factor
+        self.words_per_call = words_per_call
+
+    def transcribe(self, audio, language="en", fp16=False, initial_prompt=None) -> dict:
+        audio = np.asarray(audio, dtype=np.float32)
+        time.sleep(self.real_time_factor * len(audio) / 16000)
+        rng = random.Random(hashlib.blake2b(audio.tobytes(), digest_size=8).digest())
+        return {"text": " ".join(rng.choice(self.vocabulary) for _ in range(self.words_per_call))}
+
+
+def install_fake_transcription(vocabulary: list[str], real_time_factor: float = 0.1, workers: int = 1,
+                               model_name: str = "base", device: Optional[str] = None):
+    """
+    Make TranscriptionService.shared(model_name, device) a service whose
+    workers are threads running FakeWhisper, so the real admission queue and
+    stats are exercised without loading Whisper.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    import TranscriptionService as transcription
+
+    service = transcription.TranscriptionService(model_name, device, workers=workers)
+    service.executor.shutdown()
+    service.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fake-whisper")
+    transcription._worker_model = FakeWhisper(vocabulary, real_time_factor)
+    with transcription.TranscriptionService._instances_lock:
+        transcription.TranscriptionService._instances[(model_name, device)] = service
+    return service
+
+
+def synthetic_speech(bursts: int = 3, burst_ms: int = 700, gap_ms: int = 500,
+                     sample_rate: int = 16000, seed: int = 0) -> bytes:
+    """16-bit mono PCM: `bursts` voiced stretches separated by silence, as the VAD sees speech."""
+    rng = np.random.default_rng(seed)
+    gap = np.zeros(sample_rate * gap_ms // 1000, dtype=np.float32)
+    parts = [gap]
+    for _ in range(bursts):
+        t = np.arange(sample_rate * burst_ms // 1000) / sample_rate
+        tone = 0.3 * np.sin(2 * np.pi * rng.uniform(120, 300) * t) + 0.05 * rng.standard_normal(len(t))
+        parts += [tone.astype(np.float32), gap]
+    return (np.concatenate(parts) * 32767).astype("<i2").tobytes()
@@ -0,0 +1,40 @@
+"""
+main.app with offline fakes, importable by uvicorn so it can run with
+several worker processes:
+
+    uvicorn fake_app:app --workers 4
+
+Every chat gets FakeChatModel, hashing embeddings and FakeReranker (see
+bench_e2e.py); the fake model is configured from BENCH_FIRST_TOKEN_MS,
+BENCH_TOKEN_MS and BENCH_ANSWER_WORDS. Responses carry X-Worker-Pid so a
+load test can see which worker served them.
+"""
+import os
+
+from common import FakeChatModel, FakeReranker, get_embeddings
+
+import main
+from ChatBot import ChatBot
+from Rag import RAGPipeline
+
+llm = FakeChatModel(first_token_ms=float(os.getenv("BENCH_FIRST_TOKEN_MS", "0")),
+                    token_ms=float(os.getenv("BENCH_TOKEN_MS", "0")),
+                    answer_words=int(os.getenv("BENCH_ANSWER_WORDS", "40")))
+embeddings = get_embeddings(os.getenv("BENCH_EMBEDDINGS", "hash"))
+
+
+def make_chatbot(chat_id: str) -> ChatBot:
+    rag = RAGPipeline(chat_id=chat_id, embeddings=embeddings)
+    rag.reranker = FakeReranker()
+    return ChatBot(chat_id=chat_id, llm=llm, rag_pipeline=rag)
+
+
+main.chatbot_cache.factory = make_chatbot
+app = main.app
+
+
+@app.middleware("http")
+async def worker_pid_header(request, call_next):
+    response = await call_next(request)
+    response.headers["X-Worker-Pid"] = str(os.getpid())
+    return response
@@ -1,13 +1,45 @@
-from fastapi import FastAPI, Form, File,Query, UploadFile,WebSocket,WebSocketDisconnect,WebSocketException
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, Form, File,Query, Request, UploadFile,WebSocket,WebSocketDisconnect,WebSocketException,HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
 from ChatBot import ChatBot
+from SessionManager import SessionMemoryManager
 import json
 from typing import List, Optional
 import asyncio
 import io
 from VoiceAgent import VoiceAgent
-app = FastAPI()
+from AudioDecode import AudioDecodeError
+from TranscriptionService import TranscriptionQueueFull, TranscriptionService
+from ModelRegistry import ModelRegistry
+from ChatCache import ChatBotCache
+from IngestQueue import IngestionQueue, IngestQueueFull
+from IndexStore import ChatIndexStore
+from MinHashIndex import MinHashIndex
+from Reranker import RerankService
+from EmbeddingCache import EmbeddingCache
+from RetrievalCache import RetrievalCache
+from ContextBuilder import ContextBuilder
+from IntentRouter import IntentRouter
+from Metrics import MetricsRegistry, TraceMiddleware
+from RetrievalExecutor import EventLoopLagMonitor, RetrievalExecutor
+from VoiceStream import StreamingTranscriber
+from Streaming import TokenChannelRegistry
+from contextlib import aclosing, asynccontextmanager
+from pydantic import BaseModel, Field
+
+loop_lag_monitor = EventLoopLagMonitor()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    loop_lag_monitor.start()
+    yield
+    await loop_lag_monitor.stop()
+    # finish saving evicted chats, then commit chat history still queued in the write-behind store
+    chatbot_cache.flush()
+    SessionMemoryManager.store().close()
+
+app = FastAPI(lifespan=lifespan)
 origins = [
     "https://rag-agent-iota.vercel.app", 
      "http://localhost:3000",
@@ -18,19 +50,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id", "X-Answer-Id"],
 )
-chatbot_cache = {}
+# outermost: every request gets a trace id before anything else runs
+app.add_middleware(TraceMiddleware)
+chatbot_cache = ChatBotCache(lambda chat_id: ChatBot(chat_id=chat_id))
 
 def get_or_create_chatbot(chat_id: str) -> ChatBot:
     """
     Get existing ChatBot instance from cache or create a new one.
+    Chats evicted from the bounded cache are reloaded from their spill directory.
     """
     if chat_id not in chatbot_cache:
         print(f"[{chat_id}] Creating new ChatBot instance")
-        chatbot_cache[chat_id] = ChatBot()
     else:
         print(f"[{chat_id}] Using existing ChatBot instance")
-    return chatbot_cache[chat_id]
+    return chatbot_cache.get_or_create(chat_id)
+
+# node-wide chat registry shared by all worker processes (see SharedState)
+chat_store = ChatIndexStore()
+ingest_queue = IngestionQueue(get_or_create_chatbot, registry=chat_store.registry)
 
 async def generate_response(chatbot: ChatBot, chat_id: str, message: str):
     print(f"[{chat_id}] Processing message for chat_id: {chat_id}")
@@ -45,48 +84,274 @@ async def generate_response(chatbot: ChatBot, chat_id: str, message: str):
                 flush=True
         yield token
 
-def file_processing(files: List[UploadFile],chatbot: ChatBot,chat_id:str):
+token_channels = TokenChannelRegistry()
+
+metrics = MetricsRegistry.shared()
+metrics.register_stats("chat_cache", chatbot_cache.stats)
+metrics.register_stats("ingest", ingest_queue.stats)
+metrics.register_stats("dedup", MinHashIndex.all_stats)
+metrics.register_stats("rerank", RerankService.all_stats, instance_label="model")
+metrics.register_stats("embedding_cache", EmbeddingCache.all_stats, instance_label="model")
+metrics.register_stats("retrieval_cache", RetrievalCache.all_stats)
+metrics.register_stats("retrieval_executor", lambda: RetrievalExecutor.shared().stats())
+metrics.register_stats("event_loop", loop_lag_monitor.stats)
+metrics.register_stats("transcription", TranscriptionService.all_stats, instance_label="model")
+metrics.register_stats("streams", token_channels.stats)
+metrics.register_stats("context", lambda: ContextBuilder.shared().stats())
+metrics.register_stats("routes", lambda: IntentRouter.shared().stats())
+
+def open_answer(chatbot: ChatBot, chat_id: str, message: str):
+    """
+    Start generating an answer into its own token channel; the caller and
+    any /chat/{chat_id}/live watchers subscribe to it.
+    """
+    return token_channels.open(chat_id, generate_response(chatbot, chat_id, message))
+
+async def stream_until_disconnect(request: Request, stream, poll_seconds: float = 0.25):
+    """
+    Relay `stream`, cancelling it (and any retrieval it is awaiting) as soon
+    as the HTTP client disconnects, even before the first token is sent.
+    """
+    async def watch():
+        while not await request.is_disconnected():
+            await asyncio.sleep(poll_seconds)
+
+    watcher = asyncio.create_task(watch())
+    iterator = stream.__aiter__()
+    try:
+        while True:
+            next_token = asyncio.ensure_future(iterator.__anext__())
+            await asyncio.wait({next_token, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_token.done():
+                next_token.cancel()
+                await asyncio.gather(next_token, return_exceptions=True)
+                print("Client disconnected, response cancelled")
+                break
+            try:
+                yield next_token.result()
+            except StopAsyncIteration:
+                break
+    finally:
+        watcher.cancel()
+        await stream.aclose()
+
+async def file_processing(files: List[UploadFile],chat_id:str):
+    """
+    Queue uploaded files for background ingestion and return their jobs.
+    Raises HTTPException(429) when the ingestion queue is full.
+    """
+    jobs = []
     for file in files:
         if file.filename:
-            print(f"[{chat_id}] Processing file: {file.filename}")
+            print(f"[{chat_id}] Queueing file: {file.filename}")
+            data = await file.read()
             try:
-                print(file.file)
-                chatbot.read(file.file,filename= file.filename)
-            except Exception as file_error:
-                print(f"[{chat_id}] Error reading file {file.filename}: {file_error}")
+                jobs.append(ingest_queue.submit(chat_id, data, file.filename))
+            except IngestQueueFull as e:
+                raise HTTPException(status_code=429, detail=str(e))
+    return jobs
+
+@app.get("/models")
+async def models_endpoint():
+    """
+    Report every shared model loaded in this process with its load time and memory.
+    """
+    return {"models": ModelRegistry.stats()}
+
+@app.get("/cache/stats")
+async def cache_stats_endpoint():
+    """
+    Hit, miss, eviction and reload counts for the chat and session caches.
+    """
+    return chatbot_cache.stats()
+
+@app.post("/ingest")
+async def ingest_endpoint(
+    chat_id: str = Form(...),
+    files: List[UploadFile] = File(...)
+):
+    """
+    Queue files for background ingestion into a chat's index.
+    Returns the job ids; poll /ingest/{job_id} for status and progress.
+    """
+    jobs = await file_processing(files, chat_id)
+    return {"chat_id": chat_id, "jobs": [job.to_dict() for job in jobs]}
+
+@app.get("/ingest/stats")
+async def ingest_stats_endpoint():
+    return {**ingest_queue.stats(), "dedup": MinHashIndex.all_stats()}
+
+@app.get("/ingest/{job_id}")
+async def ingest_status_endpoint(job_id: str):
+    """
+    Status and progress (0..1) of an ingestion job.
+    """
+    status = ingest_queue.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job id: {job_id}")
+    return status
+
+@app.get("/chats")
+async def chats_endpoint():
+    """
+    Chats with a saved index on this node and their index versions, as seen by every worker.
+    """
+    return {"chats": chat_store.registry.chats()}
+
+@app.get("/rerank/stats")
+async def rerank_stats_endpoint():
+    """
+    Batch size, queue wait and throughput of the shared reranker services.
+    """
+    return RerankService.all_stats()
+
+@app.get("/embedding-cache/stats")
+async def embedding_cache_stats_endpoint():
+    """
+    Hit rate and size of the on-disk chunk embedding caches.
+    """
+    return list(EmbeddingCache.all_stats().values())
+
+@app.get("/retrieval-cache/stats")
+async def retrieval_cache_stats_endpoint():
+    """
+    Hit rate and latency saved by the per-index semantic retrieval caches.
+    """
+    return RetrievalCache.all_stats()
+
+@app.get("/retrieval/stats")
+async def retrieval_stats_endpoint():
+    """
+    Retrieval executor load (active, waiting, cancelled) and event-loop lag.
+    """
+    return {
+        "executor": RetrievalExecutor.shared().stats(),
+        "event_loop_lag": loop_lag_monitor.stats(),
+    }
+
+class SearchRequest(BaseModel):
+    chat_id: str
+    queries: List[str] = Field(..., min_length=1, max_length=256)
+    k: int = Field(5, ge=1, le=100)
+    initial_k: int = Field(20, ge=1, le=200)
+
+@app.post("/search")
+async def search_endpoint(body: SearchRequest):
+    """
+    Retrieval only, no LLM: the ranked chunks of a chat's index for every
+    query, with their dense (FAISS distance), lexical (BM25) and rerank scores.
+    All queries are embedded, searched and reranked as one batch.
+    """
+    if body.chat_id not in chatbot_cache and not chat_store.exists(body.chat_id):
+        raise HTTPException(status_code=404, detail=f"No index for chat {body.chat_id}")
+    chatbot = await asyncio.to_thread(get_or_create_chatbot, body.chat_id)
+    results = await RetrievalExecutor.shared().run(
+        chatbot.rag_pipeline.search_batch, body.queries, k=body.k, initial_k=max(body.initial_k, body.k))
+    return {"chat_id": body.chat_id,
+            "results": [{"query": query, "hits": [hit.to_dict() for hit in hits]}
+                        for query, hits in zip(body.queries, results)]}
+
+@app.get("/context/stats")
+async def context_stats_endpoint():
+    """
+    Prompt context tokens before and after merging, deduping and budget packing.
+    """
+    return ContextBuilder.shared().stats()
+
+@app.get("/transcription/stats")
+async def transcription_stats_endpoint():
+    """
+    Queue wait, inference time and real-time factor of the Whisper worker pools.
+    """
+    return TranscriptionService.all_stats()
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """
+    Stage latency histograms, request counters and every /*/stats value in
+    the Prometheus text format.
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/traces/{trace_id}")
+async def trace_endpoint(trace_id: str):
+    """
+    Timing spans of a recent request, by the X-Trace-Id it was answered with.
+    """
+    spans = metrics.traces.get(trace_id)
+    if spans is None:
+        raise HTTPException(status_code=404, detail=f"Unknown trace id: {trace_id}")
+    return {"trace_id": trace_id, "spans": spans}
+
+@app.get("/chat/{chat_id}/live")
+async def chat_live_endpoint(request: Request, chat_id: str, answer_id: Optional[str] = None):
+    """
+    Watch an answer while it is being generated (text so far, then new
+    tokens). Defaults to the chat's most recent live answer.
+    """
+    channel = token_channels.get(answer_id) if answer_id else token_channels.latest(chat_id)
+    if channel is None or channel.chat_id != chat_id:
+        raise HTTPException(status_code=404, detail=f"No live answer for chat {chat_id}")
+    return StreamingResponse(
+        stream_until_disconnect(request, channel.subscribe().stream()),
+        media_type="text/plain",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Answer-Id": channel.id},
+    )
+
+@app.get("/streams/stats")
+async def streams_stats_endpoint():
+    """
+    Live answer channels, their subscribers and buffered tokens.
+    """
+    return token_channels.stats()
 
 @app.post("/chat")
 async def chat_endpoint(
+    request: Request,
     chat_id: str = Form(...),
     message: str = Form(...),
-    files: Optional[List[UploadFile]] = File(None)
+    files: Optional[List[UploadFile]] = File(None),
+    wait_for_ingest: bool = Form(False)
 ):
     """
     HTTP endpoint for chat functionality.
     Receives chat_id, message, and optional files.
+    Files attached to the message are ingested in the background and awaited
+    before retrieval; with wait_for_ingest=true every pending ingest of the
+    chat_id is awaited as well.
     Returns streaming response.
     """
     print(f"[{chat_id}] Received message: {message}")
     
 
-    chatbot = get_or_create_chatbot(chat_id)
+    chatbot = await asyncio.to_thread(get_or_create_chatbot, chat_id)
     
     try:
   
         if files:
-            file_processing(files,chatbot,chat_id)
+            jobs = await file_processing(files,chat_id)
+            await ingest_queue.wait(jobs)
+        if wait_for_ingest:
+            await ingest_queue.wait_for_chat(chat_id)
 
         
+        channel = open_answer(chatbot, chat_id, message)
+        subscription = channel.subscribe(backpressure=True)
         return StreamingResponse(
-            generate_response(chatbot, chat_id, message),
+            stream_until_disconnect(request, subscription.stream()),
             media_type="text/plain",
+            # stream() may never start if the client is already gone
+            background=BackgroundTask(subscription.close),
             headers={
                 "Cache-Control": "no-cache",
                 "Connection": "keep-alive",
                 "X-Accel-Buffering": "no", 
+                "X-Answer-Id": channel.id,
             }
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"[{chat_id}] Error processing request: {e}")
         
@@ -100,9 +365,85 @@ async def chat_endpoint(
         )
     
 
+async def voice_stream(websocket: WebSocket, chat_id: str, sample_rate: int):
+    """
+    Streaming voice mode. Binary frames carry 16-bit little-endian mono PCM
+    at `sample_rate`; a text frame ends the utterance. Segments found by the
+    VAD are transcribed while the user is still speaking and every update is
+    sent as {"type": "partial", "text": ...}; a segment that cannot be
+    transcribed is reported as {"type": "error", "text": ...} and skipped.
+    Retrieval starts on each stable prefix, so the final query usually hits
+    the warm retrieval cache. Then
+    {"type": "final"}, one {"type": "token"} per answer token and
+    {"type": "done"} follow.
+    """
+    chat_bot = await asyncio.to_thread(get_or_create_chatbot, chat_id)
+    agent = VoiceAgent()
+    prefetch = {"text": None, "task": None}
+
+    async def on_partial(text: str):
+        await websocket.send_text(json.dumps({"type": "partial", "text": text}))
+        if prefetch["task"] is not None and not prefetch["task"].done():
+            prefetch["task"].cancel()
+        prefetch["text"] = text
+        prefetch["task"] = asyncio.create_task(
+            RetrievalExecutor.shared().run(chat_bot.rag_pipeline._retrieve, text))
+
+    async def on_error(error: Exception):
+        await websocket.send_text(json.dumps({"type": "error", "text": str(error)}))
+
+    async def transcribe(audio, prompt):
+        return await agent.atranscribe_pcm(audio, sample_rate, prompt=prompt)
+
+    transcriber = StreamingTranscriber(transcribe, sample_rate=sample_rate, on_partial=on_partial,
+                                       on_error=on_error)
+    transcriber.start()
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if message.get("bytes"):
+                await transcriber.feed(message["bytes"])
+            elif message.get("text") is not None:
+                break
+
+        transcription = await transcriber.finish()
+        await websocket.send_text(json.dumps({"type": "final", "text": transcription}))
+        if prefetch["task"] is not None:
+            if prefetch["text"] == transcription:
+                # same question: let it finish so the answer reuses its results
+                await asyncio.gather(prefetch["task"], return_exceptions=True)
+            else:
+                prefetch["task"].cancel()
+        channel = open_answer(chat_bot, chat_id, transcription)
+        await websocket.send_text(json.dumps({"type": "answer", "answer_id": channel.id}))
+        async with aclosing(channel.subscribe(backpressure=True).stream()) as tokens:
+            async for token in tokens:
+                await websocket.send_text(json.dumps({"type": "token", "text": token}))
+        await websocket.send_text(json.dumps({"type": "done"}))
+    except TranscriptionQueueFull as e:
+        await websocket.send_text(json.dumps({"type": "error", "detail": str(e)}))
+        await websocket.close(code=1013)
+    except WebSocketDisconnect:
+        print("WebSocket disconnected")
+    finally:
+        transcriber.cancel()
+        if prefetch["task"] is not None and not prefetch["task"].done():
+            prefetch["task"].cancel()
+
 @app.websocket("/voice")
-async def voice_endpoint(websocket:WebSocket,chat_id: str=Query(...)):
+async def voice_endpoint(websocket:WebSocket,chat_id: str=Query(...),
+                         mode: str = Query("buffered"), sample_rate: int = Query(16000)):
+    """
+    mode=buffered (default): send the encoded clip as binary frames, then a
+    text frame; answer tokens come back as plain text frames.
+    mode=stream: raw PCM frames with incremental transcripts (see voice_stream).
+    """
     await websocket.accept()
+    if mode == "stream":
+        await voice_stream(websocket, chat_id, sample_rate)
+        return
     buffer=io.BytesIO()
     try:
         while True:
@@ -113,13 +454,23 @@ async def voice_endpoint(websocket:WebSocket,chat_id: str=Query(...)):
                 break
           
         audio_bytes=buffer.getvalue()
-        chat_bot=get_or_create_chatbot(chat_id)
+        chat_bot = await asyncio.to_thread(get_or_create_chatbot, chat_id)
         agent=VoiceAgent()
-        transcription=agent.transcribe_bytes(audio_bytes)
-        async for token in generate_response(chatbot=chat_bot,chat_id=chat_id,message=transcription):
-            await websocket.send_text(token)
+        transcription=await agent.atranscribe_bytes(audio_bytes)
+        channel = open_answer(chat_bot, chat_id, transcription)
+        async with aclosing(channel.subscribe(backpressure=True).stream()) as tokens:
+            async for token in tokens:
+                await websocket.send_text(token)
 
 
+    except TranscriptionQueueFull as e:
+        # 1013: try again later
+        await websocket.send_text(f"Error: {e}")
+        await websocket.close(code=1013)
+    except AudioDecodeError as e:
+        # 1003: unsupported data
+        await websocket.send_text(f"Error: {e}")
+        await websocket.close(code=1003)
     except WebSocketDisconnect:
         print("WebSocket disconnected")
 
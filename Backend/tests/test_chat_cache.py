@@ -0,0 +1,129 @@
+import threading
+import time
+import unittest
+
+from ChatCache import ChatBotCache
+
+
+class FakePipeline:
+    def __init__(self, save_seconds: float = 0.0):
+        self.save_seconds = save_seconds
+        self.generation = 0
+        self.is_loaded = True
+        self.last_used = time.monotonic()
+        self.store = None
+        self.unloads = 0
+        self.saved = threading.Event()
+
+    def unload(self) -> bool:
+        time.sleep(self.save_seconds)
+        self.unloads += 1
+        self.is_loaded = False
+        self.saved.set()
+        return True
+
+
+class FakeChatBot:
+    def __init__(self, chat_id: str, save_seconds: float = 0.0):
+        self.chat_id = chat_id
+        self.rag_pipeline = FakePipeline(save_seconds)
+
+
+class ChatBotCacheTest(unittest.TestCase):
+    def make_cache(self, factory=None, **kwargs):
+        created = []
+
+        def default_factory(chat_id):
+            bot = FakeChatBot(chat_id)
+            created.append(bot)
+            return bot
+
+        cache = ChatBotCache(factory or default_factory, **{"max_entries": 2, "ttl_seconds": 3600,
+                                                            "memory_budget_mb": 1024,
+                                                            "index_idle_seconds": 3600, **kwargs})
+        return cache, created
+
+    def test_hit_returns_same_chatbot(self):
+        cache, created = self.make_cache()
+        self.assertIs(cache.get_or_create("a"), cache.get_or_create("a"))
+        self.assertEqual(len(created), 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_lru_eviction_spills_and_rebuilds(self):
+        cache, created = self.make_cache()
+        a = cache.get_or_create("a")
+        cache.get_or_create("b")
+        cache.get_or_create("c")
+        cache.flush()
+        self.assertNotIn("a", cache)
+        self.assertEqual(a.rag_pipeline.unloads, 1)
+        self.assertEqual(cache.evictions, 1)
+        again = cache.get_or_create("a")
+        self.assertIsNot(again, a)
+        self.assertEqual(len(cache), 2)
+
+    def test_ttl_eviction(self):
+        cache, _ = self.make_cache(ttl_seconds=0.05)
+        a = cache.get_or_create("a")
+        time.sleep(0.1)
+        cache.get_or_create("b")
+        cache.flush()
+        self.assertNotIn("a", cache)
+        self.assertTrue(a.rag_pipeline.saved.is_set())
+
+    def test_eviction_does_not_block_lookups(self):
+        slow = {"a"}
+
+        def factory(chat_id):
+            return FakeChatBot(chat_id, save_seconds=0.5 if chat_id in slow else 0.0)
+
+        cache, _ = self.make_cache(factory=factory, max_entries=1)
+        cache.get_or_create("a")
+        started = time.perf_counter()
+        cache.get_or_create("b")  # evicts "a", whose save takes 0.5s
+        cache.get_or_create("b")
+        self.assertLess(time.perf_counter() - started, 0.25)
+        cache.flush()
+
+    def test_rebuild_waits_for_pending_save(self):
+        def factory(chat_id):
+            return FakeChatBot(chat_id, save_seconds=0.3)
+
+        cache, _ = self.make_cache(factory=factory, max_entries=1)
+        a = cache.get_or_create("a")
+        cache.get_or_create("b")
+        cache.get_or_create("a")
+        # the new "a" is only built after the old one finished saving
+        self.assertTrue(a.rag_pipeline.saved.is_set())
+        cache.flush()
+
+    def test_concurrent_misses_build_once(self):
+        builds = []
+
+        def factory(chat_id):
+            builds.append(chat_id)
+            time.sleep(0.1)
+            return FakeChatBot(chat_id)
+
+        cache, _ = self.make_cache(factory=factory)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_create("a"))) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(builds, ["a"])
+        self.assertTrue(all(r is results[0] for r in results))
+
+    def test_idle_index_unloaded_but_chat_kept(self):
+        cache, _ = self.make_cache(index_idle_seconds=0.0)
+        a = cache.get_or_create("a")
+        cache.get_or_create("b")
+        cache.flush()
+        self.assertIn("a", cache)
+        self.assertEqual(a.rag_pipeline.unloads, 1)
+        self.assertEqual(cache.index_unloads, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+
+from langchain.schema import Document
+
+from ContextBuilder import ContextBuilder, TokenCounter
+
+
+class ApproxTokenCounterTest(unittest.TestCase):
+    def setUp(self):
+        # an unknown encoding takes the same fallback as a missing tiktoken
+        with self.assertLogs(level="WARNING"):
+            self.counter = TokenCounter("no_such_encoding")
+
+    def test_fallback_is_reported(self):
+        self.assertFalse(self.counter.exact)
+        self.assertEqual(self.counter.name, "approx")
+        self.assertIn("no_such_encoding", self.counter.fallback_reason)
+
+    def test_estimate_errs_high(self):
+        # about 4 bytes per BPE token in English; digits and CJK cost more per character
+        self.assertGreaterEqual(self.counter.count("the quick brown fox jumps over the lazy dog"), 15)
+        self.assertGreaterEqual(self.counter.count("1234567890123"), 5)
+        self.assertGreaterEqual(self.counter.count("日本語のテキスト"), 8)
+        self.assertEqual(self.counter.count(""), 0)
+
+    def test_truncate_fits_budget(self):
+        for text in ["word " * 200, "x" * 1000, "日本語" * 100, "a, b; c! " * 80]:
+            for budget in (1, 7, 50):
+                cut = self.counter.truncate(text, budget)
+                self.assertTrue(text.startswith(cut))
+                self.assertLessEqual(self.counter.count(cut), budget)
+        self.assertEqual(self.counter.truncate("short", 10), "short")
+
+
+class ContextBuilderTest(unittest.TestCase):
+    def setUp(self):
+        # an unknown encoding takes the same fallback as a missing tiktoken
+        with self.assertLogs(level="WARNING"):
+            self.counter = TokenCounter("no_such_encoding")
+
+    def doc(self, text, start, source="a.pdf", part=0):
+        return Document(page_content=text, metadata={"source": source, "part": part, "start_index": start})
+
+    def test_overlapping_chunks_merge(self):
+        builder = ContextBuilder(max_tokens=1000, counter=self.counter)
+        text = "alpha beta gamma delta epsilon zeta eta theta"
+        context, report = builder.build([(self.doc(text[:30], 0), 0.9), (self.doc(text[20:], 20), 0.8)])
+        self.assertEqual(context, text)
+        self.assertEqual(report.merged, 1)
+
+    def test_near_duplicates_dropped(self):
+        builder = ContextBuilder(max_tokens=1000, counter=self.counter)
+        text = "the same disclaimer paragraph repeated on every single page of the report"
+        context, report = builder.build([(self.doc(text, 0, part=0), 0.9), (self.doc(text, 0, part=1), 0.5)])
+        self.assertEqual(context, text)
+        self.assertEqual(report.duplicates, 1)
+
+    def test_context_stays_within_budget(self):
+        builder = ContextBuilder(max_tokens=40, counter=self.counter)
+        docs = [(self.doc(f"passage {i} " + "filler words here " * 5, 1000 * i, part=i), 1.0 - i / 10)
+                for i in range(6)]
+        context, report = builder.build(docs)
+        self.assertLessEqual(self.counter.count(context), 40)
+        self.assertGreater(report.dropped_for_budget, 0)
+        stats = builder.stats()
+        self.assertFalse(stats["tokenizer_exact"])
+        self.assertEqual(stats["tokenizer"], "approx")
+
+    def test_oversized_best_passage_is_cut(self):
+        builder = ContextBuilder(max_tokens=10, counter=self.counter)
+        context, report = builder.build([(self.doc("long " * 100, 0), 1.0)])
+        self.assertTrue(context)
+        self.assertLessEqual(self.counter.count(context), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import tempfile
+import unittest
+
+from langchain_core.embeddings import Embeddings
+
+from DocReader import DOCX_AVAILABLE, DocumentReader, TextStream
+from Rag import RAGPipeline
+
+
+class LengthEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [[float(len(t)), 1.0, 0.0, 0.0] for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class TextStreamTest(unittest.TestCase):
+    def test_empty_texts_are_skipped_and_counted(self):
+        stream = TextStream(["a", "", "b", ""], total=4)
+        self.assertEqual(list(stream), ["a", "b"])
+        self.assertEqual(stream.skipped, 2)
+
+    @unittest.skipUnless(DOCX_AVAILABLE, "python-docx is not installed")
+    def test_docx_blank_paragraphs_count_towards_total(self):
+        import docx
+
+        path = os.path.join(tempfile.mkdtemp(), "notes.docx")
+        document = docx.Document()
+        for text in ["first", "", "  ", "second", ""]:
+            document.add_paragraph(text)
+        document.save(path)
+        stream = DocumentReader().iter_read(path)
+        self.assertEqual(list(stream), ["first", "second"])
+        self.assertEqual(2 + stream.skipped, stream.total)
+        self.assertEqual(DocumentReader().read(path), ["first", "second"])
+
+
+class IngestProgressTest(unittest.TestCase):
+    def test_fraction_reaches_one_with_blank_pages(self):
+        rag = RAGPipeline(embeddings=LengthEmbeddings(), use_embedding_cache=False, use_retrieval_cache=False)
+        fractions = []
+        pages = TextStream(["alpha beta " * 20, "", "gamma delta " * 20, "", ""], total=5)
+        progress = rag.ingest_stream(pages, batch_size=1, on_progress=lambda p: fractions.append(p.fraction))
+        self.assertEqual(progress.fraction, 1.0)
+        self.assertEqual(fractions[-1], 1.0)
+        self.assertEqual(fractions, sorted(fractions))
+
+
+if __name__ == "__main__":
+    unittest.main()
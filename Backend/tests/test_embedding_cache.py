@@ -0,0 +1,131 @@
+import multiprocessing
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from EmbeddingCache import CachedEmbeddings, EmbeddingCache, content_key
+
+DIM = 8
+
+
+def vectors_for(tags):
+    return np.array([[tag] * DIM for tag in tags], dtype=np.float32)
+
+
+def keys_for(tags):
+    return [content_key("m", f"text-{tag}") for tag in tags]
+
+
+def _writer(root, start, count):
+    cache = EmbeddingCache("m", root=root, max_mb=0.01)
+    for tag in range(start, start + count):
+        cache.put_many(keys_for([tag]), vectors_for([tag]))
+
+
+class EmbeddingCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def cache(self, **kwargs):
+        return EmbeddingCache("m", root=self.root, **kwargs)
+
+    def assert_vectors(self, cache, tags):
+        found = cache.get_many(keys_for(tags))
+        self.assertEqual(sorted(found), list(range(len(tags))))
+        for i, tag in enumerate(tags):
+            self.assertTrue(np.all(found[i] == tag), f"key {tag} maps to {found[i][0]}")
+
+    def test_round_trip_and_reopen(self):
+        cache = self.cache()
+        cache.put_many(keys_for([1, 2, 3]), vectors_for([1, 2, 3]))
+        self.assert_vectors(cache, [1, 2, 3])
+        self.assert_vectors(self.cache(), [1, 2, 3])
+        self.assertEqual(cache.get_many(keys_for([4])), {})
+
+    def test_duplicate_keys_stored_once(self):
+        cache = self.cache()
+        cache.put_many(keys_for([1, 1, 2]), vectors_for([1, 1, 2]))
+        cache.put_many(keys_for([2]), vectors_for([2]))
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(os.path.getsize(cache._vectors_path), 2 * DIM * 4)
+
+    def test_crash_after_vector_append(self):
+        cache = self.cache()
+        cache.put_many(keys_for([1, 2]), vectors_for([1, 2]))
+        # a writer died after appending vectors but before their keys
+        with open(cache._vectors_path, "ab") as f:
+            f.write(vectors_for([99, 99]).tobytes())
+        other = self.cache()
+        other.put_many(keys_for([3, 4]), vectors_for([3, 4]))
+        self.assert_vectors(other, [1, 2, 3, 4])
+        self.assert_vectors(self.cache(), [1, 2, 3, 4])
+
+    def test_torn_vector_row(self):
+        cache = self.cache()
+        cache.put_many(keys_for([1]), vectors_for([1]))
+        with open(cache._vectors_path, "ab") as f:
+            f.write(vectors_for([99]).tobytes()[:5])
+        other = self.cache()
+        other.put_many(keys_for([2]), vectors_for([2]))
+        self.assert_vectors(self.cache(), [1, 2])
+
+    def test_torn_key_write(self):
+        cache = self.cache()
+        cache.put_many(keys_for([1]), vectors_for([1]))
+        with open(cache._vectors_path, "ab") as f:
+            f.write(vectors_for([99]).tobytes())
+        with open(cache._keys_path, "ab") as f:
+            f.write(keys_for([99])[0][:7])
+        other = self.cache()
+        other.put_many(keys_for([2]), vectors_for([2]))
+        self.assert_vectors(self.cache(), [1, 2])
+        self.assertEqual(self.cache().get_many(keys_for([99])), {})
+
+    def test_compaction_keeps_recently_used(self):
+        row_bytes = DIM * 4
+        cache = self.cache(max_mb=10 * row_bytes / 2 ** 20)
+        cache.put_many(keys_for(range(10)), vectors_for(range(10)))
+        cache.get_many(keys_for([0, 1, 2]))
+        cache.put_many(keys_for([10]), vectors_for([10]))
+        self.assertGreater(cache.evicted, 0)
+        self.assert_vectors(cache, [0, 1, 2, 10])
+        # another instance picks up the compacted files through the generation
+        self.assert_vectors(self.cache(), [0, 1, 2, 10])
+
+    def test_concurrent_writer_and_reader_processes(self):
+        context = multiprocessing.get_context("fork")
+        writers = [context.Process(target=_writer, args=(self.root, start, 200)) for start in (0, 1000)]
+        for w in writers:
+            w.start()
+        reader = self.cache(max_mb=0.01)
+        while any(w.is_alive() for w in writers):
+            tags = list(range(0, 200, 7)) + list(range(1000, 1200, 7))
+            found = reader.get_many(keys_for(tags))
+            for i, vector in found.items():
+                self.assertTrue(np.all(vector == tags[i]))
+        for w in writers:
+            w.join()
+            self.assertEqual(w.exitcode, 0)
+
+    def test_cached_embeddings_only_embeds_misses(self):
+        calls = []
+
+        class Fake:
+            def embed_documents(self, texts):
+                calls.extend(texts)
+                return [[float(len(t))] * DIM for t in texts]
+
+            def embed_query(self, text):
+                return [0.0] * DIM
+
+        cached = CachedEmbeddings(Fake(), self.cache())
+        first = cached.embed_documents(["a", "bb", "a"])
+        second = cached.embed_documents(["bb", "ccc"])
+        self.assertEqual(calls, ["a", "bb", "ccc"])
+        self.assertEqual(first[1], second[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+
+from IntentRouter import AGENT, ARITHMETIC, DIRECT, IntentRouter, UnsafeExpression, extract_expression, safe_eval
+
+
+class SafeEvalTest(unittest.TestCase):
+    def test_arithmetic(self):
+        self.assertEqual(safe_eval("2 + 3 * 4"), 14)
+        self.assertEqual(safe_eval("(2 + 3) * 4"), 20)
+        self.assertEqual(safe_eval("7 // 2 + 7 % 2"), 4)
+        self.assertEqual(safe_eval("-2 ** 2"), -4)
+        self.assertAlmostEqual(safe_eval("1 / 3"), 1 / 3)
+
+    def test_rejects_anything_but_numeric_operators(self):
+        for expression in [
+            "__import__('os').system('true')",
+            "open('/etc/passwd')",
+            "(1).__class__",
+            "x + 1",
+            "[1, 2]",
+            "'a' * 3",
+            "lambda: 1",
+            "1 if 1 else 2",
+            "1 < 2",
+            "True + 1",
+            "1j * 2",
+            "1 << 10",
+            "1 & 3",
+            "~1",
+            "not 1",
+            "(x := 1)",
+            "f'{1}'",
+        ]:
+            with self.subTest(expression=expression), self.assertRaises(UnsafeExpression):
+                safe_eval(expression)
+
+    def test_rejects_syntax_errors(self):
+        for expression in ["1 +", "(1", "", "import os"]:
+            with self.subTest(expression=expression), self.assertRaises(UnsafeExpression):
+                safe_eval(expression)
+
+    def test_rejects_expensive_or_huge_results(self):
+        for expression in [
+            "9 ** 9 ** 9",           # exponent checked before computing
+            "2 ** 65",
+            "10 ** 60 * 10 ** 60",
+            "1e308 * 10",
+            "1e999 - 1e999",
+            "1" * 150,
+            "(-8) ** 0.5",
+        ]:
+            with self.subTest(expression=expression), self.assertRaises(UnsafeExpression):
+                safe_eval(expression)
+
+    def test_rejects_division_by_zero(self):
+        for expression in ["1 / 0", "1 // 0", "1 % 0", "1 / (2 - 2)", "0 ** -1"]:
+            with self.subTest(expression=expression), self.assertRaises(UnsafeExpression):
+                safe_eval(expression)
+
+    def test_size_limits(self):
+        with self.assertRaises(UnsafeExpression):
+            safe_eval("1 + " * 60 + "1")
+        with self.assertRaises(UnsafeExpression):
+            safe_eval("+".join(["1"] * 40))
+        with self.assertRaises(UnsafeExpression):
+            safe_eval("-" * 70 + "1")
+
+
+class IntentRouterTest(unittest.TestCase):
+    def test_routes(self):
+        router = IntentRouter()
+        decision = router.route("What is 12 times 3?")
+        self.assertEqual((decision.route, decision.result), (ARITHMETIC, 36))
+        self.assertEqual(decision.answer, "The answer of 12 * 3 is 36")
+        self.assertEqual(router.route("add 3 and 5").route, AGENT)
+        self.assertEqual(router.route("What is in the report?").route, DIRECT)
+        # the expression parses but the evaluator refuses it: leave it to the tools
+        self.assertEqual(router.route("what is 9 ^ 9 ^ 9").route, AGENT)
+        self.assertEqual(router.route("1 / 0").route, AGENT)
+        self.assertEqual(router.stats(), {ARITHMETIC: 1, DIRECT: 1, AGENT: 3})
+
+    def test_extract_expression(self):
+        self.assertEqual(extract_expression("calculate 1,000 divided by 8"), "1000 / 8")
+        self.assertEqual(extract_expression("2 to the power of 10 ="), "2 ** 10")
+        self.assertIsNone(extract_expression("what is 42"))
+        self.assertIsNone(extract_expression("is 3 - 1 the year?"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from HistoryStore import SQLiteHistoryStore
+from SessionManager import SessionMemoryManager
+
+
+def turn(n):
+    return [HumanMessage(content=f"q{n}"), AIMessage(content=f"a{n}")]
+
+
+def contents(messages):
+    return [m.content for m in messages]
+
+
+class HistoryStoreVersionTest(unittest.TestCase):
+    """Two store instances on one file stand in for two worker processes."""
+
+    def setUp(self):
+        path = os.path.join(tempfile.mkdtemp(), "history.sqlite")
+        self.a = SQLiteHistoryStore(path, flush_seconds=60)
+        self.b = SQLiteHistoryStore(path, flush_seconds=60)
+
+    def tearDown(self):
+        self.a.close()
+        self.b.close()
+
+    def test_writes_are_seen_as_changes_elsewhere_only(self):
+        self.a.append("s", turn(1))
+        self.a.flush()
+        self.assertFalse(self.a.changed_elsewhere("s"))
+        self.assertTrue(self.b.changed_elsewhere("s"))
+        messages, _ = self.b.load("s")
+        self.assertEqual(contents(messages), ["q1", "a1"])
+        self.assertFalse(self.b.changed_elsewhere("s"))
+
+        self.b.append("s", turn(2))
+        self.b.flush()
+        self.assertTrue(self.a.changed_elsewhere("s"))
+        self.assertFalse(self.b.changed_elsewhere("s"))
+
+    def test_interleaved_write_leaves_writer_stale(self):
+        self.a.load("s")
+        self.b.append("s", turn(1))
+        self.b.flush()
+        self.a.append("s", turn(2))
+        self.a.flush()
+        # a bumped on top of b's version, so it must still reload b's turn
+        self.assertTrue(self.a.changed_elsewhere("s"))
+        messages, _ = self.a.load("s")
+        self.assertEqual(contents(messages), ["q1", "a1", "q2", "a2"])
+
+    def test_delete_bumps_version(self):
+        self.a.append("s", turn(1))
+        self.a.flush()
+        self.b.load("s")
+        self.a.delete("s")
+        self.assertTrue(self.b.changed_elsewhere("s"))
+        self.assertEqual(self.b.load("s"), ([], None))
+
+    def test_reads_flush_pending_writes(self):
+        self.a.append("s", turn(1))
+        self.a.set_summary("s", "earlier")
+        messages, summary = self.a.load("s", limit=1)
+        self.assertEqual(contents(messages), ["a1"])
+        self.assertEqual(summary, "earlier")
+
+
+class SessionManagerTest(unittest.TestCase):
+    def setUp(self):
+        path = os.path.join(tempfile.mkdtemp(), "history.sqlite")
+        self.local = SQLiteHistoryStore(path, flush_seconds=60)
+        self.other = SQLiteHistoryStore(path, flush_seconds=60)
+        self.saved = (SQLiteHistoryStore._shared, SessionMemoryManager.version_check_seconds,
+                      dict(SessionMemoryManager.stats))
+        SQLiteHistoryStore._shared = self.local
+        SessionMemoryManager.clear_all()
+
+    def tearDown(self):
+        SessionMemoryManager.clear_all()
+        (SQLiteHistoryStore._shared, SessionMemoryManager.version_check_seconds, stats) = self.saved
+        SessionMemoryManager.stats.update(stats)
+        self.local.close()
+        self.other.close()
+
+    def read(self, session_id, k=10):
+        return contents(asyncio.run(SessionMemoryManager.get_session(session_id, k).aget_messages()))
+
+    def test_get_session_defers_loading_to_first_read(self):
+        self.other.append("s", turn(1))
+        self.other.flush()
+        history = SessionMemoryManager.get_session("s", 10)
+        self.assertEqual(history.cached_messages, [])
+        self.assertEqual(contents(asyncio.run(history.aget_messages())), ["q1", "a1"])
+        self.assertIs(SessionMemoryManager.get_session("s", 10), history)
+
+    def test_write_elsewhere_reloads_after_check_interval(self):
+        SessionMemoryManager.version_check_seconds = 0
+        self.assertEqual(self.read("s"), [])
+        self.other.append("s", turn(1))
+        self.other.flush()
+        stale = SessionMemoryManager.stats["stale"]
+        self.assertEqual(self.read("s"), ["q1", "a1"])
+        self.assertEqual(SessionMemoryManager.stats["stale"], stale + 1)
+
+    def test_version_check_is_throttled(self):
+        SessionMemoryManager.version_check_seconds = 3600
+        self.assertEqual(self.read("s"), [])
+        self.other.append("s", turn(1))
+        self.other.flush()
+        self.assertEqual(self.read("s"), [])
+
+    def test_append_before_first_read_keeps_persisted_turns(self):
+        self.other.append("s", turn(1))
+        self.other.flush()
+        history = SessionMemoryManager.get_session("s", 10)
+        asyncio.run(history.aadd_messages(turn(2)))
+        self.assertEqual(contents(history.messages), ["q1", "a1", "q2", "a2"])
+        self.local.flush()
+        messages, _ = self.other.load("s")
+        self.assertEqual(contents(messages), ["q1", "a1", "q2", "a2"])
+
+    def test_spilled_session_reloads_from_store(self):
+        history = SessionMemoryManager.get_session("s", 10)
+        history.add_messages(turn(1))
+        self.assertTrue(SessionMemoryManager.spill("s"))
+        self.assertEqual(self.read("s"), ["q1", "a1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+import asyncio
+import unittest
+
+from Streaming import TokenChannel, TokenChannelRegistry
+
+
+async def tokens(n, delay=0.0, fail_at=None, state=None):
+    try:
+        for i in range(n):
+            if i == fail_at:
+                raise RuntimeError("model failed")
+            if delay:
+                await asyncio.sleep(delay)
+            else:
+                await asyncio.sleep(0)
+            yield f"t{i} "
+    finally:
+        if state is not None:
+            state["closed"] = True
+
+
+async def read_all(subscription):
+    return "".join([token async for token in subscription])
+
+
+class TokenChannelTest(unittest.TestCase):
+    def run_async(self, coroutine):
+        return asyncio.run(asyncio.wait_for(coroutine, 10))
+
+    def test_fan_out_and_late_replay(self):
+        async def main():
+            channel = TokenChannel("c", max_buffer=64)
+            first = channel.subscribe(backpressure=True)
+            second = channel.subscribe()
+            channel.start(tokens(10, delay=0.005))
+            await asyncio.sleep(0.02)
+            late = channel.subscribe()
+            expected = "".join(f"t{i} " for i in range(10))
+            self.assertEqual(await asyncio.gather(read_all(first), read_all(second), read_all(late)),
+                             [expected] * 3)
+            self.assertEqual(await read_all(channel.subscribe()), expected)
+
+        self.run_async(main())
+
+    def test_backpressure_pauses_the_producer(self):
+        async def main():
+            channel = TokenChannel("c", max_buffer=2)
+            subscription = channel.subscribe(backpressure=True)
+            channel.start(tokens(20))
+            await asyncio.sleep(0.05)
+            # two buffered and one waiting to be put
+            self.assertEqual(channel.tokens, 3)
+            self.assertFalse(channel.done)
+            self.assertEqual(await read_all(subscription), "".join(f"t{i} " for i in range(20)))
+            self.assertEqual(channel.dropped_subscribers, 0)
+
+        self.run_async(main())
+
+    def test_lagging_listener_is_dropped_without_blocking_others(self):
+        async def main():
+            channel = TokenChannel("c", max_buffer=3)
+            reader = channel.subscribe(backpressure=True)
+            idle = channel.subscribe()
+            channel.start(tokens(20))
+            text = await read_all(reader)
+            self.assertEqual(text, "".join(f"t{i} " for i in range(20)))
+            self.assertTrue(idle.lagged)
+            self.assertEqual(channel.dropped_subscribers, 1)
+            # the dropped listener gets what was buffered, then ends without an error
+            self.assertEqual(await read_all(idle), "t0 t1 t2 ")
+
+        self.run_async(main())
+
+    def test_stalled_reader_releases_the_producer(self):
+        async def main():
+            state = {}
+            channel = TokenChannel("c", max_buffer=2)
+            subscription = channel.subscribe(backpressure=True)
+            subscription.stall_seconds = 0.05
+            channel.start(tokens(20, state=state))
+            await asyncio.sleep(0.3)
+            self.assertTrue(subscription.lagged)
+            # it was the only listener, so the answer was cancelled
+            self.assertTrue(channel.done)
+            self.assertIsInstance(channel.error, asyncio.CancelledError)
+            self.assertTrue(state["closed"])
+
+        self.run_async(main())
+
+    def test_last_subscriber_leaving_cancels_the_answer(self):
+        async def main():
+            state = {}
+            registry = TokenChannelRegistry(max_buffer=8)
+            channel = registry.open("c", tokens(1000, delay=0.001, state=state))
+            subscription = channel.subscribe(backpressure=True)
+            async for _ in subscription:
+                break
+            subscription.close()
+            await asyncio.sleep(0.05)
+            self.assertTrue(channel.done)
+            self.assertTrue(state["closed"])
+            self.assertIsNone(registry.get(channel.id))
+            self.assertEqual(registry.stats()["cancelled"], 1)
+            self.assertEqual(registry.stats()["active"], 0)
+
+        self.run_async(main())
+
+    def test_one_of_two_subscribers_leaving_keeps_the_answer(self):
+        async def main():
+            channel = TokenChannel("c", max_buffer=64)
+            staying = channel.subscribe(backpressure=True)
+            leaving = channel.subscribe()
+            channel.start(tokens(10, delay=0.002))
+            leaving.close()
+            self.assertEqual(await read_all(staying), "".join(f"t{i} " for i in range(10)))
+            self.assertIsNone(channel.error)
+
+        self.run_async(main())
+
+    def test_producer_error_reaches_subscribers(self):
+        async def main():
+            registry = TokenChannelRegistry()
+            channel = registry.open("c", tokens(10, fail_at=3))
+            with self.assertRaisesRegex(RuntimeError, "model failed"):
+                await read_all(channel.subscribe(backpressure=True))
+            self.assertEqual(channel.text, "t0 t1 t2 ")
+            self.assertEqual(registry.stats()["cancelled"], 0)
+
+        self.run_async(main())
+
+    def test_latest_answer_per_chat(self):
+        async def main():
+            registry = TokenChannelRegistry()
+            first = registry.open("c", tokens(100, delay=0.001))
+            first.subscribe()
+            await asyncio.sleep(0.002)
+            second = registry.open("c", tokens(100, delay=0.001))
+            second.subscribe()
+            self.assertIs(registry.latest("c"), second)
+            self.assertIsNone(registry.latest("other"))
+            first.cancel()
+            second.cancel()
+
+        self.run_async(main())
+
+
+if __name__ == "__main__":
+    unittest.main()
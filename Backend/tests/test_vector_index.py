@@ -0,0 +1,214 @@
+import unittest
+
+import faiss
+import numpy as np
+
+from VectorIndex import (IndexConfig, IndexManager, build_index, exact_rescore, index_kind, index_precision,
+                         is_lossy, vector_bytes)
+
+D = 32
+
+
+def clustered(n, seed=0, centers=64):
+    rng = np.random.default_rng(seed)
+    means = rng.normal(size=(centers, D)).astype(np.float32) * 4
+    return (means[rng.integers(0, centers, n)] + rng.normal(size=(n, D))).astype(np.float32)
+
+
+def recall(index, vectors, queries, k=10):
+    exact = faiss.IndexFlatL2(D)
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+    _, found = index.search(queries, k)
+    return np.mean([len(set(t) & set(f)) / k for t, f in zip(truth, found)])
+
+
+class IndexKindTest(unittest.TestCase):
+    def test_kinds_are_classified_after_build_and_reload(self):
+        config = IndexConfig(kind="flat", nlist=16, pq_m=8, pq_nbits=4)
+        vectors = clustered(1000)
+        for kind in ("flat", "hnsw", "ivf_flat", "ivf_pq"):
+            with self.subTest(kind=kind):
+                index = build_index(kind, vectors, config)
+                self.assertEqual(index_kind(index), kind)
+                self.assertEqual(index.ntotal, len(vectors))
+                reloaded = faiss.deserialize_index(faiss.serialize_index(index))
+                self.assertEqual(index_kind(reloaded), kind)
+                self.assertEqual(is_lossy(reloaded), kind == "ivf_pq")
+
+    def test_unknown_kind_rejected(self):
+        with self.assertRaises(ValueError):
+            IndexConfig(kind="lsh")
+        with self.assertRaises(ValueError):
+            build_index("lsh", clustered(10), IndexConfig())
+
+    def test_choose_kind_by_corpus_size(self):
+        config = IndexConfig(kind="auto", hnsw_threshold=100, ivf_threshold=1000, ivfpq_threshold=5000)
+        self.assertEqual([config.choose_kind(n) for n in (0, 99, 100, 999, 1000, 4999, 5000)],
+                         ["flat", "flat", "hnsw", "hnsw", "ivf_flat", "ivf_flat", "ivf_pq"])
+
+
+class RecallTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.vectors = clustered(5000)
+        cls.queries = clustered(100, seed=1)
+
+    def test_recall_at_10(self):
+        config = IndexConfig(nlist=32, nprobe=8, pq_m=8, pq_nbits=4)
+        # 4-bit PQ codes alone are coarse
+        minimum = {"flat": 1.0, "hnsw": 0.95, "ivf_flat": 0.85, "ivf_pq": 0.15}
+        for kind, floor in minimum.items():
+            with self.subTest(kind=kind):
+                index = build_index(kind, self.vectors, config)
+                self.assertGreaterEqual(recall(index, self.vectors, self.queries), floor)
+
+    def test_probing_every_list_is_exact(self):
+        index = build_index("ivf_flat", self.vectors, IndexConfig(nlist=64, nprobe=1))
+        self.assertLess(recall(index, self.vectors, self.queries), 0.9)
+        IndexManager(IndexConfig(nlist=64)).set_search_params(index, nprobe=64)
+        self.assertEqual(recall(index, self.vectors, self.queries), 1.0)
+
+
+class MigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.config = IndexConfig(kind="auto", hnsw_threshold=100, ivf_threshold=1000,
+                                  ivfpq_threshold=10 ** 9, nlist=16, retrain_growth=4.0)
+        self.manager = IndexManager(self.config)
+        self.vectors = clustered(5000)
+
+    def grow(self, index, n):
+        index.add(self.vectors[index.ntotal:n])
+        return self.manager.maybe_migrate(index) or index
+
+    def test_migrates_across_thresholds_keeping_positions(self):
+        index = build_index("flat", self.vectors[:50], self.config)
+        self.assertIsNone(self.manager.maybe_migrate(index))
+        index = self.grow(index, 150)
+        self.assertEqual(index_kind(index), "hnsw")
+        index = self.grow(index, 1200)
+        self.assertEqual(index_kind(index), "ivf_flat")
+        self.assertEqual(self.manager.migrations, 2)
+        self.assertEqual(index.ntotal, 1200)
+        # positions survive the rebuild: each stored vector finds itself
+        _, found = index.search(self.vectors[:1200:50], 1)
+        self.assertEqual(found[:, 0].tolist(), list(range(0, 1200, 50)))
+
+    def test_ivf_is_not_rebuilt_every_batch(self):
+        index = build_index("ivf_flat", self.vectors[:1000], self.config)
+        self.assertIsNone(self.manager.maybe_migrate(index))
+        for n in (1100, 1500, 2000, 3000):
+            index.add(self.vectors[index.ntotal:n])
+            self.assertIsNone(self.manager.maybe_migrate(index), n)
+        self.assertEqual(self.manager.migrations, 0)
+
+    def test_ivf_retrained_after_growth(self):
+        index = build_index("ivf_flat", self.vectors[:1000], self.config)
+        self.manager.maybe_migrate(index)
+        index.add(self.vectors[1000:4000])
+        retrained = self.manager.maybe_migrate(index)
+        self.assertIsNotNone(retrained)
+        self.assertEqual(index_kind(retrained), "ivf_flat")
+        self.assertEqual(self.manager.trained_on, 4000)
+
+    def test_hnsw_serves_until_ivf_can_train(self):
+        config = IndexConfig(kind="auto", hnsw_threshold=100, ivf_threshold=200, nlist=64)
+        manager = IndexManager(config)
+        # 39 * 64 vectors are needed to train 64 lists
+        index = manager.maybe_migrate(build_index("flat", self.vectors[:300], config))
+        self.assertEqual(index_kind(index), "hnsw")
+        self.assertIsNone(manager.maybe_migrate(index))
+
+    def test_ivf_pq_rebuilt_from_exact_vectors(self):
+        config = IndexConfig(kind="ivf_pq", nlist=16, pq_m=8, pq_nbits=4)
+        manager = IndexManager(config)
+        vectors = self.vectors[:2000]
+        index = build_index("ivf_pq", vectors[:500], config)
+        manager.maybe_migrate(index)
+        index.add(vectors[500:])
+        calls = []
+
+        def exact():
+            calls.append(1)
+            return vectors
+
+        retrained = manager.maybe_migrate(index, exact)
+        self.assertEqual(calls, [1])
+        self.assertEqual(index_kind(retrained), "ivf_pq")
+        self.assertEqual(retrained.ntotal, 2000)
+
+
+
+class PrecisionTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.vectors = clustered(3000)
+        cls.queries = clustered(100, seed=1)
+
+    def rescored_recall(self, index, factor, k=10):
+        exact = faiss.IndexFlatL2(D)
+        exact.add(self.vectors)
+        _, truth = exact.search(self.queries, k)
+        _, candidates = index.search(self.queries, factor * k)
+        _, found = exact_rescore(self.queries, candidates, lambda positions: self.vectors[positions], k)
+        return np.mean([len(set(t) & set(f)) / k for t, f in zip(truth, found)])
+
+    def test_precision_is_classified(self):
+        for precision in ("float32", "float16", "int8"):
+            config = IndexConfig(precision=precision, nlist=16)
+            for kind in ("flat", "hnsw", "ivf_flat"):
+                with self.subTest(kind=kind, precision=precision):
+                    index = faiss.deserialize_index(faiss.serialize_index(
+                        build_index(kind, self.vectors[:1000], config)))
+                    self.assertEqual(index_kind(index), kind)
+                    self.assertEqual(index_precision(index), precision)
+                    self.assertEqual(is_lossy(index), precision != "float32")
+        with self.assertRaises(ValueError):
+            IndexConfig(precision="int4")
+
+    def test_reduced_precision_saves_memory(self):
+        sizes = {p: vector_bytes(build_index("flat", self.vectors, IndexConfig(precision=p)))
+                 for p in ("float32", "float16", "int8")}
+        self.assertEqual(sizes["float16"] * 2, sizes["float32"])
+        self.assertEqual(sizes["int8"] * 4, sizes["float32"])
+
+    def test_rescoring_restores_recall(self):
+        # 4-bit PQ codes rank coarsely, so 8x candidates recover less of the exact top 10
+        for kind, precision, floor in (("flat", "int8", 0.95), ("hnsw", "float16", 0.95), ("ivf_pq", "float32", 0.6)):
+            with self.subTest(kind=kind, precision=precision):
+                index = build_index(kind, self.vectors,
+                                    IndexConfig(precision=precision, nlist=16, nprobe=16, pq_m=8, pq_nbits=4))
+                rescored = self.rescored_recall(index, factor=8)
+                self.assertGreaterEqual(rescored, floor)
+                self.assertGreaterEqual(rescored, recall(index, self.vectors, self.queries))
+
+    def test_exact_rescore_pads_missing_candidates(self):
+        queries = self.vectors[:2]
+        positions = np.array([[5, 0, -1], [-1, -1, -1]])
+        distances, best = exact_rescore(queries, positions, lambda p: self.vectors[p], k=3)
+        self.assertEqual(best.tolist(), [[0, 5, -1], [-1, -1, -1]])
+        self.assertEqual(distances[0, 0], 0.0)
+        self.assertTrue(np.isinf(distances[1]).all())
+
+    def test_precision_change_migrates_from_exact_vectors(self):
+        index = build_index("flat", self.vectors[:500], IndexConfig(precision="int8"))
+        manager = IndexManager(IndexConfig(kind="flat", precision="float32"))
+        migrated = manager.maybe_migrate(index, lambda: self.vectors[:500])
+        self.assertEqual(index_precision(migrated), "float32")
+        np.testing.assert_array_equal(migrated.reconstruct_n(0, 500), self.vectors[:500])
+        self.assertIsNone(manager.maybe_migrate(migrated))
+
+    def test_int8_retrained_after_growth(self):
+        config = IndexConfig(kind="flat", precision="int8", retrain_growth=4.0)
+        manager = IndexManager(config)
+        index = build_index("flat", self.vectors[:200], config)
+        self.assertIsNone(manager.maybe_migrate(index))
+        index.add(self.vectors[200:600])
+        self.assertIsNone(manager.maybe_migrate(index))
+        index.add(self.vectors[600:1000])
+        retrained = manager.maybe_migrate(index, lambda: self.vectors[:1000])
+        self.assertEqual(index_precision(retrained), "int8")
+        self.assertEqual(manager.trained_on, 1000)
+
+if __name__ == "__main__":
+    unittest.main()
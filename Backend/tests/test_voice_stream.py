@@ -0,0 +1,114 @@
+import asyncio
+import unittest
+
+import numpy as np
+
+from VoiceStream import EnergyVAD, StreamingTranscriber
+
+RATE = 16000
+
+
+def utterances(n, speech_seconds=0.3, pause_seconds=0.6):
+    """PCM with `n` tone bursts separated by silence."""
+    t = np.arange(int(RATE * speech_seconds)) / RATE
+    tone = 0.5 * np.sin(2 * np.pi * 440 * t)
+    silence = np.zeros(int(RATE * pause_seconds))
+    audio = np.concatenate([np.concatenate([tone, silence]) for _ in range(n)])
+    return (audio * 32767).astype("<i2").tobytes()
+
+
+class EnergyVADTest(unittest.TestCase):
+    def test_segments_split_on_pauses(self):
+        vad = EnergyVAD(sample_rate=RATE)
+        pcm = utterances(3)
+        segments = []
+        for start in range(0, len(pcm), 1000):
+            segments += vad.feed(pcm[start:start + 1000])
+        self.assertEqual(len(segments), 3)
+        self.assertIsNone(vad.flush())
+
+
+class StreamingTranscriberTest(unittest.TestCase):
+    def run_async(self, coroutine):
+        return asyncio.run(asyncio.wait_for(coroutine, 10))
+
+    def test_transcribes_in_order(self):
+        async def main():
+            partials = []
+
+            async def transcribe(audio, prompt):
+                return f"s{len(prompt.split())}"
+
+            async def on_partial(text):
+                partials.append(text)
+
+            transcriber = StreamingTranscriber(transcribe, RATE, on_partial=on_partial)
+            await transcriber.feed(utterances(3))
+            self.assertEqual(await transcriber.finish(), "s0 s1 s2")
+            self.assertEqual(partials, ["s0", "s0 s1", "s0 s1 s2"])
+
+        self.run_async(main())
+
+    def test_feed_waits_while_max_pending_segments_are_queued(self):
+        async def main():
+            release = asyncio.Event()
+            started = []
+
+            async def transcribe(audio, prompt):
+                started.append(len(started))
+                await release.wait()
+                return "x"
+
+            transcriber = StreamingTranscriber(transcribe, RATE, max_pending=2)
+            # one segment being transcribed, two queued, the fourth must wait
+            feeding = asyncio.ensure_future(transcriber.feed(utterances(4)))
+            await asyncio.sleep(0.05)
+            self.assertFalse(feeding.done())
+            self.assertEqual(transcriber._queue.qsize(), 2)
+            self.assertGreater(transcriber.stalls, 0)
+            release.set()
+            await feeding
+            self.assertEqual(await transcriber.finish(), "x x x x")
+
+        self.run_async(main())
+
+    def test_cancelled_worker_does_not_block_feed(self):
+        async def main():
+            async def transcribe(audio, prompt):
+                await asyncio.Event().wait()
+
+            transcriber = StreamingTranscriber(transcribe, RATE, max_pending=1)
+            feeding = asyncio.ensure_future(transcriber.feed(utterances(4)))
+            await asyncio.sleep(0.05)
+            self.assertFalse(feeding.done())
+            transcriber.cancel()
+            await feeding
+
+        self.run_async(main())
+
+    def test_failed_segment_is_reported_and_skipped(self):
+        async def main():
+            errors = []
+
+            async def on_error(error):
+                errors.append(str(error))
+
+            calls = {"n": 0}
+
+            def flaky(audio, prompt):
+                calls["n"] += 1
+                if calls["n"] == 1:
+                    raise RuntimeError("queue full")
+                return "ok"
+
+            transcriber = StreamingTranscriber(flaky, RATE, on_error=on_error)
+            await transcriber.feed(utterances(2))
+            self.assertEqual(await transcriber.finish(), "ok")
+            self.assertEqual(errors, ["queue full"])
+            self.assertEqual(transcriber.failed_segments, 1)
+
+        self.run_async(main())
+
+
+if __name__ == "__main__":
+    unittest.main()